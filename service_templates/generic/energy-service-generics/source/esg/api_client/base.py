@@ -12,9 +12,25 @@ from urllib3 import disable_warnings
 
 import requests
 
+# The binary formats are optional.
+try:
+    import msgpack
+except ModuleNotFoundError:
+    msgpack = None
+
+try:
+    import cbor2
+except ModuleNotFoundError:
+    cbor2 = None
+
 
 logger = logging.getLogger(__name__)
 
+BINARY_MEDIA_TYPES = {
+    "msgpack": "application/msgpack",
+    "cbor": "application/cbor",
+}
+
 
 class HttpBaseClient:
     """
@@ -25,7 +41,14 @@ class HttpBaseClient:
     which is appended to `base_url` to compute the final URL.
     """
 
-    def __init__(self, base_url, verify=True, username=None, password=None):
+    def __init__(
+        self,
+        base_url,
+        verify=True,
+        username=None,
+        password=None,
+        binary_format=None,
+    ):
         """
         Set up the session for all requests.
 
@@ -44,9 +67,28 @@ class HttpBaseClient:
         password: str
             The username to use for HTTP basic auth. Only used in combination
             with `username`.
+        binary_format: str
+            If `"msgpack"` or `"cbor"` responses are requested in this
+            format, which the API may or may not support. Use
+            `decode_content` to decode responses in any format and
+            `encode_content` to encode request bodies in this format.
+            Note that the values of messages are not encoded as JSON strings
+            in the binary formats. Requires the `msgpack` or `cbor2`
+            package.
         """
         self.base_url = base_url
         self.verify = verify
+        self.binary_format = binary_format
+        if binary_format is not None:
+            if binary_format not in BINARY_MEDIA_TYPES:
+                raise ValueError(
+                    "Unknown binary format: {}".format(binary_format)
+                )
+            if {"msgpack": msgpack, "cbor": cbor2}[binary_format] is None:
+                raise ValueError(
+                    "Package for binary format {} is not installed."
+                    "".format(binary_format)
+                )
 
         # urllib3 would emit one warning for EVERY made without verification.
         if not self.verify:
@@ -59,6 +101,11 @@ class HttpBaseClient:
             )
 
         self.http = requests.Session()
+        if binary_format is not None:
+            # Fall back to JSON for endpoints without binary formats.
+            self.http.headers["Accept"] = "{}, application/json;q=0.9".format(
+                BINARY_MEDIA_TYPES[binary_format]
+            )
 
         if username is None or password is None:
             self.auth = None
@@ -73,8 +120,10 @@ class HttpBaseClient:
             # what went wrong.
             if response.status_code in [400, 422]:
                 try:
-                    error_detail = json.dumps(response.json(), indent=4)
-                except requests.exceptions.JSONDecodeError:
+                    error_detail = json.dumps(
+                        self.decode_content(response), indent=4
+                    )
+                except ValueError:
                     # Some errors are not JSON, especially those
                     # directly returned by Django in DEBUG model
                     error_detail = response.text
@@ -104,6 +153,42 @@ class HttpBaseClient:
 
         return full_url
 
+    def decode_content(self, response):
+        """
+        Decode the content of `response` according to its content type,
+        i.e. as MessagePack, CBOR or JSON.
+        """
+        content_type = response.headers.get("Content-Type", "")
+        content_type = content_type.split(";")[0].strip()
+        if content_type == BINARY_MEDIA_TYPES["msgpack"]:
+            return msgpack.unpackb(response.content, raw=False)
+        if content_type == BINARY_MEDIA_TYPES["cbor"]:
+            return cbor2.loads(response.content)
+        return response.json()
+
+    def encode_content(self, data):
+        """
+        Encode `data` in `self.binary_format`, or as JSON if not set.
+
+        Returns:
+        --------
+        content: bytes
+            The encoded data, use as `data` argument of `post` or `put`.
+        headers: dict
+            The corresponding `Content-Type` header, use as `headers`
+            argument of `post` or `put`.
+        """
+        if self.binary_format == "msgpack":
+            content = msgpack.packb(data, use_bin_type=True)
+        elif self.binary_format == "cbor":
+            content = cbor2.dumps(data)
+        else:
+            content = json.dumps(data).encode()
+        media_type = BINARY_MEDIA_TYPES.get(
+            self.binary_format, "application/json"
+        )
+        return content, {"Content-Type": media_type}
+
     def get(self, relative_url, *args, **kwargs):
         full_url = self.compute_full_url(relative_url=relative_url)
         response = self.http.get(
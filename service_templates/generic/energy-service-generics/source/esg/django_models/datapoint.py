@@ -5,7 +5,11 @@ The django models corresponding to esg.models.datapoint
 import json
 from datetime import datetime
 
+from django.db import connections
 from django.db import models
+from django.db import router
+from django.db import transaction
+from django.utils import timezone
 
 from timescale.db.models.managers import TimescaleManager
 from timescale.db.models.fields import TimescaleDateTimeField
@@ -25,6 +29,175 @@ from esg.models.datapoint import SetpointMessage
 from esg.models.datapoint import ForecastMessage
 
 
+# Number of messages written per INSERT statement by `bulk_upsert`.
+BULK_UPSERT_BATCH_SIZE = 10000
+
+
+def _msg_field_value(msg, field):
+    """
+    Returns the value of `field` in `msg` (a dict as accepted by
+    `bulk_update_or_create`) or the default of the field if missing.
+    Related objects are replaced by their primary keys.
+    """
+    if field.name in msg:
+        value = msg[field.name]
+    elif field.attname in msg:
+        value = msg[field.attname]
+    else:
+        return field.get_default()
+    if field.is_relation and isinstance(value, models.Model):
+        value = value.pk
+    return value
+
+
+def _is_newer(time, other_time):
+    """
+    Returns True if `time` is later than `other_time`, where None (i.e. no
+    message received yet) is older than any time.
+    """
+    if other_time is None:
+        return time is not None
+    return time is not None and time > other_time
+
+
+def bulk_upsert(
+    model,
+    msgs,
+    unique_fields,
+    only_newer=False,
+    batch_size=BULK_UPSERT_BATCH_SIZE,
+):
+    """
+    Create or update messages with one `INSERT ... ON CONFLICT DO UPDATE`
+    statement per batch. This works on PostgreSQL only.
+
+    Each column is sent as one array and expanded with `unnest`, which keeps
+    the statement short. PostgreSQL sets `xmax` of rows inserted by the
+    statement to 0, which allows counting created and updated messages.
+    Like for the generic implementation, only the fields contained in `msgs`
+    are updated, and the last one wins if `msgs` contains several messages
+    with the same values of `unique_fields`. Fields with `auto_now` are
+    set to the current time.
+
+    Arguments:
+    ----------
+    model : django Model
+        The model for which the data should be written to.
+    msgs : list of dict
+        Each dict containting the fields (as keys) and desired values
+        that should be stored for one object in the DB.
+    unique_fields : list of str
+        Names of the fields of the unique constraint used to match `msgs`
+        with existing messages.
+    only_newer : bool
+        If True, existing messages are only updated if the `time` of the
+        new message is later. The check happens within the statement, i.e.
+        concurrent writers cannot replace a newer message with an older one.
+        Of several messages with the same values of `unique_fields` the
+        newest wins.
+    batch_size : int
+        The maximum number of messages per statement.
+
+    Returns:
+    --------
+    msgs_created : int
+        The number of messages that have been created.
+    msgs_updated : int
+        The number of messages that have been updated. Messages skipped due
+        to `only_newer` are not counted.
+    """
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    auto_now_fields = [
+        field
+        for field in fields
+        if getattr(field, "auto_now", False)
+        or getattr(field, "auto_now_add", False)
+    ]
+    fields_by_name = {field.name: field for field in fields}
+    key_fields = [fields_by_name[name] for name in unique_fields]
+
+    msgs_by_key = {}
+    msg_field_names = set()
+    for msg in msgs:
+        key = tuple(_msg_field_value(msg, field) for field in key_fields)
+        if only_newer and key in msgs_by_key:
+            if _is_newer(msgs_by_key[key].get("time"), msg.get("time")):
+                continue
+        msgs_by_key[key] = msg
+        msg_field_names.update(msg)
+    msgs = list(msgs_by_key.values())
+
+    db_alias = router.db_for_write(model)
+    connection = connections[db_alias]
+    quote_name = connection.ops.quote_name
+    update_fields = [
+        field
+        for field in fields
+        if field.name not in unique_fields
+        and (
+            field.name in msg_field_names
+            or field.attname in msg_field_names
+            or getattr(field, "auto_now", False)
+        )
+    ]
+    if update_fields:
+        conflict_action = "UPDATE SET " + ", ".join(
+            "{0} = EXCLUDED.{0}".format(quote_name(field.column))
+            for field in update_fields
+        )
+    else:
+        # Rows skipped by DO NOTHING are not returned, which is fine as
+        # updated messages are counted as the remainder below.
+        conflict_action = "NOTHING"
+    table = quote_name(model._meta.db_table)
+    if only_newer and update_fields:
+        conflict_action += (
+            " WHERE {table}.time IS NULL OR EXCLUDED.time > {table}.time"
+        ).format(table=table)
+    sql = (
+        "INSERT INTO {table} ({columns}) SELECT * FROM unnest({arrays}) "
+        "ON CONFLICT ({unique_columns}) DO {conflict_action} "
+        "RETURNING (xmax = 0);"
+    ).format(
+        table=table,
+        columns=", ".join(quote_name(field.column) for field in fields),
+        arrays=", ".join(
+            "%s::{}[]".format(field.db_type(connection)) for field in fields
+        ),
+        unique_columns=", ".join(
+            quote_name(field.column) for field in key_fields
+        ),
+        conflict_action=conflict_action,
+    )
+
+    now = timezone.now()
+    msgs_created = 0
+    msgs_updated = 0
+    with transaction.atomic(using=db_alias), connection.cursor() as cursor:
+        for start in range(0, len(msgs), batch_size):
+            batch = msgs[start : start + batch_size]
+            arrays = []
+            for field in fields:
+                if field in auto_now_fields:
+                    values = [now] * len(batch)
+                else:
+                    values = [_msg_field_value(msg, field) for msg in batch]
+                arrays.append(
+                    [field.get_db_prep_save(v, connection) for v in values]
+                )
+            cursor.execute(sql, arrays)
+            rows = cursor.fetchall()
+            created = sum(1 for (inserted,) in rows if inserted)
+            msgs_created += created
+            if only_newer:
+                # Skipped messages are not returned.
+                msgs_updated += len(rows) - created
+            else:
+                msgs_updated += len(batch) - created
+
+    return msgs_created, msgs_updated
+
+
 class DatapointTemplate(DjangoBaseModel):
     """
     Devices are abstracted as a set of datapoints.
@@ -179,6 +352,9 @@ class TimescaleModel(DjangoBaseModel):
         This will not send any signals as this function will likely
         be used only to restore backups.
 
+        On PostgreSQL all messages are written set based by `bulk_upsert`,
+        other databases fall back to matching the messages per datapoint.
+
         Arguments:
         ----------
         model : django Model
@@ -194,6 +370,25 @@ class TimescaleModel(DjangoBaseModel):
         msgs_updated : int
             The number of messages that have been updated.
         """
+        if not msgs:
+            return 0, 0
+        if connections[router.db_for_write(model)].vendor == "postgresql":
+            return bulk_upsert(
+                model=model, msgs=msgs, unique_fields=["datapoint", "time"]
+            )
+        return TimescaleModel.bulk_update_or_create_generic(
+            model=model, msgs=msgs
+        )
+
+    @staticmethod
+    def bulk_update_or_create_generic(model, msgs):
+        """
+        Database independent version of `bulk_update_or_create`, which
+        issues one query per datapoint to find existing messages.
+
+        Arguments and return values are the same as for
+        `bulk_update_or_create`.
+        """
         # Start with searching for msgs that exist already with the same
         # combination of timestamp and datapoint in the database.
         # These messages will be updated.
@@ -262,10 +457,13 @@ class LastMessageModel(DjangoBaseModel):
     @staticmethod
     def bulk_update_or_create(model, msgs):
         """
-        Create or update value/setpoint/schedule messages efficiently in bulks.
+        Store the messages as last messages of their datapoints, unless the
+        stored last message is newer. Hence writing old messages, e.g. while
+        restoring a backup, does not replace more recent live data.
 
-        This will not send any signals as this function will likely
-        be used only to restore backups.
+        On PostgreSQL this happens in a single statement per batch, that
+        checks the time of the stored message while holding the row lock.
+        Other databases fall back to checking the stored messages in Python.
 
         Arguments:
         ----------
@@ -282,56 +480,66 @@ class LastMessageModel(DjangoBaseModel):
         msgs_updated : int
             The number of messages that have been updated.
         """
-        # Start with searching for msgs that exist already with the same
-        # combination of timestamp and datapoint in the database.
-        # These messages will be updated.
-        msgs_by_datapoint = {}
-        msgs_updated = 0
+        if not msgs:
+            return 0, 0
+        if connections[router.db_for_write(model)].vendor == "postgresql":
+            return bulk_upsert(
+                model=model,
+                msgs=msgs,
+                unique_fields=["datapoint"],
+                only_newer=True,
+            )
 
+        datapoint_field = model._meta.get_field("datapoint")
+        msgs_by_datapoint_id = {}
         for msg in msgs:
-            msgs_by_datapoint[msg["datapoint"]] = msg
+            datapoint_id = _msg_field_value(msg, datapoint_field)
+            current_msg = msgs_by_datapoint_id.get(datapoint_id)
+            if current_msg is not None:
+                if _is_newer(current_msg.get("time"), msg.get("time")):
+                    continue
+            msgs_by_datapoint_id[datapoint_id] = msg
 
         existing_msg_objects = model.objects.filter(
-            datapoint__in=msgs_by_datapoint.keys(),
+            datapoint__in=msgs_by_datapoint_id.keys()
         )
-
-        # Now start with updating the existing messages by updating
-        # the corresponding fields.
-        fields_to_update = set()
+        # bulk_update doesn't set auto_now fields.
+        auto_now_fields = [
+            field.name
+            for field in model._meta.concrete_fields
+            if getattr(field, "auto_now", False)
+        ]
+        fields_to_update = set(auto_now_fields)
+        now = timezone.now()
+        objs_to_update = []
         for existing_msg_object in existing_msg_objects:
-            # The messages remaining in msgs_by_datapoint after the loop
+            # The messages remaining in msgs_by_datapoint_id after the loop
             # are those we need to create.
-            new_msg = msgs_by_datapoint.pop(existing_msg_object.datapoint)
+            new_msg = msgs_by_datapoint_id.pop(
+                existing_msg_object.datapoint_id
+            )
+            if not _is_newer(new_msg.get("time"), existing_msg_object.time):
+                continue
             for field in new_msg:
                 if field == "datapoint":
-                    # These have been used to find the message and must thus
-                    # not be updated.
                     continue
                 fields_to_update.add(field)
                 setattr(existing_msg_object, field, new_msg[field])
+            for field in auto_now_fields:
+                setattr(existing_msg_object, field, now)
+            objs_to_update.append(existing_msg_object)
 
-        # Without this if we will get an error like this downstream:
-        # ValueError: Field names must be given to bulk_update().
-        if existing_msg_objects:
-            # Now let's push those updates back to DB. Use bulks of 1000
-            # to prevent the SQL query from becoming too large. See:
-            # https://docs.djangoproject.com/en/3.1/ref/models/querysets/#bulk-update
+        if objs_to_update:
             model.objects.bulk_update(
-                objs=existing_msg_objects,
-                fields=fields_to_update,
-                batch_size=1000,
+                objs=objs_to_update, fields=fields_to_update, batch_size=1000
             )
-            msgs_updated += len(existing_msg_objects)
 
-        msgs_to_create = msgs_by_datapoint.values()
-
-        # Now that we have updated the existing messages and know which ones
-        # are left to create let's to this too.
-        objs_to_create = [model(**msg) for msg in msgs_to_create]
+        objs_to_create = [
+            model(**msg) for msg in msgs_by_datapoint_id.values()
+        ]
         model.objects.bulk_create(objs=objs_to_create, batch_size=1000)
-        msgs_created = len(objs_to_create)
 
-        return msgs_created, msgs_updated
+        return len(objs_to_create), len(objs_to_update)
 
 
 class ValueMessageTemplate(TimescaleModel):
@@ -450,7 +658,11 @@ class ValueMessageTemplate(TimescaleModel):
         """
         for msg in msgs:
             original_value = msg["value"]
+            # Set all three fields, else an update could leave a stale value
+            # in one of the hidden fields.
             msg["value"] = None
+            msg["_value_float"] = None
+            msg["_value_bool"] = None
 
             if isinstance(original_value, bool):
                 msg["_value_bool"] = original_value
@@ -791,6 +1003,15 @@ class ForecastMessageTemplate(TimescaleModel):
         msgs_updated : int
             The number of messages that have been updated.
         """
+        if not msgs:
+            return 0, 0
+        if connections[router.db_for_write(model)].vendor == "postgresql":
+            return bulk_upsert(
+                model=model,
+                msgs=msgs,
+                unique_fields=["datapoint", "time", "product_run"],
+            )
+
         # Start with searching for msgs that exist already with the same
         # combination of timestamp and datapoint in the database.
         # These messages will be updated.
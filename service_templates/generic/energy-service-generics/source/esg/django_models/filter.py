@@ -217,3 +217,47 @@ class TimeBucketParams(BaseModel):
     aggregation: TimeBucketAggregation = Field(
         default="Avg", help_text="The type of temporal aggregation to use.",
     )
+
+
+class ResampleFillMethod(str, Enum):
+    """
+    Defines how buckets without values are filled while resampling.
+    """
+
+    none = "none"
+    locf = "locf"
+    interpolate = "interpolate"
+
+
+class ResampleParams(BaseModel):
+    """
+    Additional query parameters for requests that resample value messages
+    to a regular time grid. This is computed in DB with `time_bucket_gapfill`
+    or with `esg.utils.pandas.resample_dataframe` as fallback. The result
+    should be returned as `ValueDataFrame`.
+    """
+
+    interval: str = Field(
+        ...,
+        example="15 minutes",
+        help_text=(
+            "The interval of the time grid. Must be a valid PostgreSQL "
+            "interval string without month or year components."
+        ),
+    )
+    fill: ResampleFillMethod = Field(
+        default="none",
+        help_text=(
+            "How to fill buckets without values. `locf` carries the last "
+            "observed value forward, `interpolate` interpolates linearly "
+            "and `none` leaves the buckets empty."
+        ),
+    )
+    origin: datetime = Field(
+        None,
+        help_text=(
+            "A point in time the grid is aligned to, i.e. that is a border "
+            "of the buckets. Defaults to the start of the requested time "
+            "range, i.e. `time__gte`."
+        ),
+    )
@@ -113,3 +113,58 @@ def value_dataframe_from_dataframe(pandas_dataframe):
     )
     # raise RuntimeError()
     return value_dataframe
+
+
+def resample_dataframe(dataframe, resample_params, start, end):
+    """
+    Resample numeric values onto a regular time grid.
+
+    This is the counterpart of `time_bucket_gapfill` in TimescaleDB,
+    i.e. computes the average per bucket and fills the gaps. Like the
+    TimescaleDB functions no values are extrapolated.
+
+    Arguments:
+    ----------
+    dataframe : pandas.DataFrame
+        The values to resample with datetimes as index. Non numeric values
+        are ignored.
+    resample_params : esg.django_models.filter.ResampleParams
+        Defines the grid and the fill method.
+    start : datetime
+        The start of the requested time range, the first bucket contains
+        this point in time.
+    end : datetime
+        The (exclusive) end of the requested time range.
+
+    Returns:
+    --------
+    resampled_dataframe : pandas.DataFrame
+        The resampled values with the bucket starts as index.
+    """
+    _check_pandas_available()
+    interval = pd.Timedelta(resample_params.interval)
+    origin = pd.Timestamp(resample_params.origin or start)
+    start = pd.Timestamp(start)
+    end = pd.Timestamp(end)
+    grid_start = origin + ((start - origin) // interval) * interval
+    grid = pd.date_range(start=grid_start, end=end, freq=interval)
+    grid = grid[grid < end]
+
+    numeric_dataframe = dataframe.apply(pd.to_numeric, errors="coerce")
+    numeric_dataframe = numeric_dataframe[
+        (numeric_dataframe.index >= start)
+        & (numeric_dataframe.index < end)
+    ]
+    resampled_dataframe = numeric_dataframe.resample(
+        interval, origin=grid_start
+    ).mean()
+    resampled_dataframe = resampled_dataframe.reindex(grid)
+
+    fill = getattr(resample_params.fill, "value", resample_params.fill)
+    if fill == "locf":
+        resampled_dataframe = resampled_dataframe.ffill()
+    elif fill == "interpolate":
+        resampled_dataframe = resampled_dataframe.interpolate(
+            limit_area="inside"
+        )
+    return resampled_dataframe
@@ -195,3 +195,54 @@ class TestHttpBaseClientComputeDelete(GenericHttpBaseClientHttpMethodsTests):
     """
 
     http_method = "delete"
+
+
+class TestHttpBaseClientBinaryFormats:
+    """
+    Tests for `HttpBaseClient.decode_content` and
+    `HttpBaseClient.encode_content`.
+    """
+
+    def test_msgpack_requested_and_decoded(self, httpserver):
+        msgpack = pytest.importorskip("msgpack")
+        client = HttpBaseClient(
+            base_url=httpserver.url_for("/"), binary_format="msgpack"
+        )
+        expected_data = [{"value": 21.5, "timestamp": 1585092224000}]
+
+        httpserver.expect_request(
+            "/datapoint/1/value/",
+            headers={"Accept": "application/msgpack, application/json;q=0.9"},
+        ).respond_with_data(
+            msgpack.packb(expected_data), content_type="application/msgpack"
+        )
+
+        response = client.get("/datapoint/1/value/")
+        assert client.decode_content(response) == expected_data
+
+    def test_json_decoded_as_fallback(self, httpserver):
+        pytest.importorskip("msgpack")
+        client = HttpBaseClient(
+            base_url=httpserver.url_for("/"), binary_format="msgpack"
+        )
+
+        httpserver.expect_request("/").respond_with_json({"detail": "ok"})
+
+        response = client.get("/")
+        assert client.decode_content(response) == {"detail": "ok"}
+
+    def test_content_encoded_in_binary_format(self):
+        msgpack = pytest.importorskip("msgpack")
+        client = HttpBaseClient(
+            base_url="http://localhost", binary_format="msgpack"
+        )
+        data = {"msgs_by_datapoint_id": {"1": [{"value": None}]}}
+
+        content, headers = client.encode_content(data)
+
+        assert msgpack.unpackb(content) == data
+        assert headers == {"Content-Type": "application/msgpack"}
+
+    def test_unknown_binary_format_rejected(self):
+        with pytest.raises(ValueError):
+            HttpBaseClient(base_url="http://localhost", binary_format="xml")
@@ -12,6 +12,7 @@ try:
 except ModuleNotFoundError:
     pd = None
 
+from esg.django_models.filter import ResampleParams
 from esg.models.datapoint import ValueMessageList
 from esg.models.datapoint import ValueDataFrame
 from esg.test import data as td
@@ -19,6 +20,7 @@ from esg.utils.pandas import series_from_value_message_list
 from esg.utils.pandas import value_message_list_from_series
 from esg.utils.pandas import dataframe_from_value_dataframe
 from esg.utils.pandas import value_dataframe_from_dataframe
+from esg.utils.pandas import resample_dataframe
 
 
 @pytest.fixture(scope="class")
@@ -201,3 +203,80 @@ class TestValueDataframeFromDataframe:
         actual_df_as_jsonable = actual_df_as_pydanitc.jsonable()
 
         assert actual_df_as_jsonable == expected_df_as_jsonable
+
+
+@pytest.mark.skipif(pd is None, reason="requires pandas")
+class TestResampleDataframe:
+    def setup_method(self):
+        self.start = datetime(2022, 1, 1, 0, 0, tzinfo=timezone.utc)
+        self.end = datetime(2022, 1, 1, 1, 0, tzinfo=timezone.utc)
+        self.test_dataframe = pd.DataFrame(
+            index=[
+                datetime(2022, 1, 1, 0, 0, tzinfo=timezone.utc),
+                datetime(2022, 1, 1, 0, 1, tzinfo=timezone.utc),
+                datetime(2022, 1, 1, 0, 30, 1, tzinfo=timezone.utc),
+            ],
+            data={"1": [1.0, 3.0, 6.0], "2": ["A string", "false", None]},
+        )
+        self.expected_index = pd.date_range(
+            start=self.start, periods=4, freq="15min"
+        )
+
+    def resample(self, fill):
+        return resample_dataframe(
+            self.test_dataframe,
+            ResampleParams(interval="15 minutes", fill=fill),
+            start=self.start,
+            end=self.end,
+        )
+
+    def test_no_fill(self):
+        actual_dataframe = self.resample("none")
+
+        pd.testing.assert_index_equal(
+            actual_dataframe.index, self.expected_index, check_names=False
+        )
+        assert actual_dataframe["1"].tolist()[0] == 2.0
+        assert actual_dataframe["1"].isna().tolist() == [
+            False,
+            True,
+            False,
+            True,
+        ]
+        assert actual_dataframe["2"].isna().all()
+
+    def test_locf(self):
+        actual_dataframe = self.resample("locf")
+        assert actual_dataframe["1"].tolist() == [2.0, 2.0, 6.0, 6.0]
+
+    def test_interpolate(self):
+        actual_dataframe = self.resample("interpolate")
+        assert actual_dataframe["1"].tolist()[:3] == [2.0, 4.0, 6.0]
+        assert actual_dataframe["1"].isna().tolist()[3]
+
+    def test_values_before_start_ignored(self):
+        """
+        The grid is aligned to `origin` but only values within the
+        requested time range are averaged.
+        """
+        test_dataframe = pd.DataFrame(
+            index=[
+                datetime(2022, 1, 1, 0, 5, tzinfo=timezone.utc),
+                datetime(2022, 1, 1, 0, 12, tzinfo=timezone.utc),
+            ],
+            data={"1": [100.0, 2.0]},
+        )
+
+        actual_dataframe = resample_dataframe(
+            test_dataframe,
+            ResampleParams(
+                interval="15 minutes", fill="none", origin=self.start
+            ),
+            start=datetime(2022, 1, 1, 0, 10, tzinfo=timezone.utc),
+            end=self.end,
+        )
+
+        pd.testing.assert_index_equal(
+            actual_dataframe.index, self.expected_index, check_names=False
+        )
+        assert actual_dataframe["1"].tolist()[0] == 2.0
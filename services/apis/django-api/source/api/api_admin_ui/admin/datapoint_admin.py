@@ -150,6 +150,8 @@ class DatapointAdmin(AdminWithoutListsOnDelete):
             "short_name",
             "description",
         ]
+        if settings.ACTIVATE_HISTORY_EXTENSION:
+            generic_metadata_fields.append("retention_period")
 
         data_format_specific_fields = []
         if "_numeric" in obj.data_format:
@@ -8,9 +8,95 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 """
 
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connections
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api_main.settings")
 
-application = get_asgi_application()
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    Django's ASGIHandler consumes the iterators of streaming responses in
+    the event loop. These iterators may fetch rows from the DB though (see
+    the CSV/NDJSON export), which is neither allowed nor desirable there.
+    This handler consumes them in a dedicated thread per response instead.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        # Same as the parent implementation.
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            response_headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            response_headers.append(
+                (b"Set-Cookie", c.output(header="").encode("ascii").strip())
+            )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": response_headers,
+            }
+        )
+
+        # A single thread keeps the server side DB cursor in the thread
+        # that has opened it.
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1)
+        parts = iter(response)
+        try:
+            while True:
+                part = await loop.run_in_executor(executor, next, parts, None)
+                if part is None:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": chunk,
+                            "more_body": True,
+                        }
+                    )
+            await send({"type": "http.response.body"})
+        finally:
+            # Django only closes the DB connections of its own threads.
+            await loop.run_in_executor(executor, connections.close_all)
+            executor.shutdown(wait=False)
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+
+# This must be called before anything that uses the ORM is imported.
+django.setup(set_prefix=False)
+django_asgi_application = StreamingASGIHandler()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # NOQA
+from django.conf import settings  # NOQA
+from django.urls import re_path  # NOQA
+
+if settings.ACTIVATE_PUSH_INTERFACE:
+    from api_push_interface.routing import http_urlpatterns
+    from api_push_interface.routing import websocket_urlpatterns
+
+    application = ProtocolTypeRouter(
+        {
+            # Everything that is not a push endpoint is handled by Django.
+            "http": URLRouter(
+                http_urlpatterns + [re_path(r"", django_asgi_application)]
+            ),
+            "websocket": URLRouter(websocket_urlpatterns),
+        }
+    )
+else:
+    application = django_asgi_application
@@ -0,0 +1,292 @@
+"""
+Helpers to maintain and use TimescaleDB continuous aggregates of the
+DatapointValue messages.
+
+The aggregates are configured on the model (see
+`DatapointValue.continuous_aggregates`) and created/updated with the
+`continuous_aggregates` management command. All aggregates are exposed to
+Django by a single view (combining all aggregates with UNION ALL) which
+backs the unmanaged `DatapointValueAggregate` model. As every branch of
+that view carries a constant `bucket_interval` column, PostgreSQL will only
+touch the aggregate that matches the requested interval.
+"""
+import logging
+import re
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from django.db import connection
+
+from ems_utils.timestamp import datetime_from_timestamp
+
+logger = logging.getLogger(__name__)
+
+# The default origin of `time_bucket` for intervals without month or year
+# components. Buckets of all intervals are aligned to this point in time.
+TIME_BUCKET_ORIGIN = datetime(2000, 1, 3, tzinfo=timezone.utc)
+
+# Maps the units we understand in PostgreSQL interval strings to timedelta
+# keyword arguments. Months and years are missing intentionally as these
+# have no fixed length and can thus not be composed from smaller buckets.
+INTERVAL_UNITS = {
+    "microsecond": "microseconds",
+    "microseconds": "microseconds",
+    "us": "microseconds",
+    "millisecond": "milliseconds",
+    "milliseconds": "milliseconds",
+    "ms": "milliseconds",
+    "second": "seconds",
+    "seconds": "seconds",
+    "sec": "seconds",
+    "secs": "seconds",
+    "s": "seconds",
+    "minute": "minutes",
+    "minutes": "minutes",
+    "min": "minutes",
+    "mins": "minutes",
+    "m": "minutes",
+    "hour": "hours",
+    "hours": "hours",
+    "h": "hours",
+    "day": "days",
+    "days": "days",
+    "d": "days",
+    "week": "weeks",
+    "weeks": "weeks",
+    "w": "weeks",
+}
+INTERVAL_PART_RE = re.compile(r"\s*(\d+(?:\.\d+)?)\s*([a-z]+)\s*")
+
+
+def parse_interval(interval):
+    """
+    Parse a (simple) PostgreSQL interval string into a timedelta.
+
+    Arguments:
+    ----------
+    interval : str
+        Something like "15 minutes" or "1 hour 30 minutes".
+
+    Returns:
+    --------
+    interval_td : datetime.timedelta or None
+        The parsed interval. None if the string could not be parsed, e.g.
+        because it contains units with variable length like months.
+    """
+    if not isinstance(interval, str):
+        return None
+    interval = interval.strip().lower()
+    if not interval:
+        return None
+
+    kwargs = {}
+    position = 0
+    while position < len(interval):
+        match = INTERVAL_PART_RE.match(interval, position)
+        if match is None:
+            return None
+        number, unit = match.groups()
+        if unit not in INTERVAL_UNITS:
+            return None
+        kwarg = INTERVAL_UNITS[unit]
+        kwargs[kwarg] = kwargs.get(kwarg, 0) + float(number)
+        position = match.end()
+
+    interval_td = timedelta(**kwargs)
+    if interval_td <= timedelta(0):
+        return None
+    return interval_td
+
+
+def interval_to_slug(interval):
+    """
+    Converts an interval string into something usable in DB object names,
+    e.g. "15 minutes" -> "15_minutes".
+    """
+    return re.sub(r"[^a-z0-9]+", "_", interval.strip().lower()).strip("_")
+
+
+def is_aligned(timestamp, interval_td):
+    """
+    Checks if a timestamp (in milliseconds) is at a bucket border of
+    `time_bucket` for `interval_td`.
+    """
+    dt = datetime_from_timestamp(timestamp)
+    return (dt - TIME_BUCKET_ORIGIN) % interval_td == timedelta(0)
+
+
+def select_continuous_aggregate(interval, aggregate_intervals, timestamps=()):
+    """
+    Select the continuous aggregate that can be used to compute time buckets
+    of `interval`.
+
+    An aggregate can be used if the requested interval is a multiple of the
+    aggregate interval, as the buckets of the aggregate then nest perfectly
+    into the requested buckets. If several aggregates qualify the coarsest
+    one is used as it contains the fewest rows.
+
+    Arguments:
+    ----------
+    interval : str
+        The interval requested by the user, e.g. "1 hour".
+    aggregate_intervals : iterable of str
+        The intervals for which continuous aggregates exist.
+    timestamps : iterable of numbers
+        Timestamps (in milliseconds) that are used as bounds of the query.
+        The aggregate buckets must align with these, as else the first or
+        last bucket would contain values outside of the requested range.
+
+    Returns:
+    --------
+    aggregate_interval : str or None
+        The item of `aggregate_intervals` to use or None if no aggregate
+        can be used and the computation must run on the raw data.
+    """
+    requested_td = parse_interval(interval)
+    if requested_td is None:
+        return None
+
+    candidates = []
+    for aggregate_interval in aggregate_intervals:
+        aggregate_td = parse_interval(aggregate_interval)
+        if aggregate_td is None or aggregate_td > requested_td:
+            continue
+        if requested_td % aggregate_td != timedelta(0):
+            continue
+        if not all(is_aligned(ts, aggregate_td) for ts in timestamps):
+            continue
+        candidates.append((aggregate_td, aggregate_interval))
+
+    if not candidates:
+        return None
+    return max(candidates)[1]
+
+
+def timescale_available():
+    """
+    Returns True if the default DB is a PostgreSQL DB with the TimescaleDB
+    extension installed.
+    """
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_extension WHERE extname = 'timescaledb';"
+        )
+        return cursor.fetchone() is not None
+
+
+def continuous_aggregate_view_name(model, interval):
+    """
+    Returns the name of the materialized view holding the continuous
+    aggregate of `model` for `interval`.
+    """
+    return "%s_agg_%s" % (model._meta.db_table, interval_to_slug(interval))
+
+
+def create_continuous_aggregate_sql(model, interval):
+    """
+    Returns the SQL statements that create the continuous aggregate of
+    `model` for `interval` and the corresponding refresh policy.
+
+    The aggregate is a real time aggregate, i.e. the buckets that have not
+    been materialized yet by the refresh policy are computed from the raw
+    values at query time, such that the newest buckets are never missing.
+    """
+    view_name = continuous_aggregate_view_name(model, interval)
+    policy = model.continuous_aggregates[interval]
+    create_sql = (
+        "CREATE MATERIALIZED VIEW IF NOT EXISTS {view_name} "
+        "WITH (timescaledb.continuous, "
+        "timescaledb.materialized_only = false) AS "
+        "SELECT datapoint_id, "
+        "time_bucket(INTERVAL '{interval}', time) AS bucket, "
+        "avg(_value_float) AS value_avg, "
+        "min(_value_float) AS value_min, "
+        "max(_value_float) AS value_max, "
+        "count(_value_float) AS value_count, "
+        "count(*) AS message_count "
+        "FROM {table} "
+        "GROUP BY datapoint_id, bucket "
+        "WITH NO DATA;"
+    ).format(
+        view_name=view_name, interval=interval, table=model._meta.db_table,
+    )
+    # The buckets newer than the last refresh are only included if computed
+    # from the raw values at query time, which TimescaleDB >= 2.13 doesn't
+    # do by default. Also applies to aggregates created before.
+    real_time_sql = (
+        "ALTER MATERIALIZED VIEW {view_name} "
+        "SET (timescaledb.materialized_only = false);"
+    ).format(view_name=view_name)
+    # Replace the policy to apply changes of the configuration.
+    remove_policy_sql = (
+        "SELECT remove_continuous_aggregate_policy('{view_name}', "
+        "if_not_exists => true);"
+    ).format(view_name=view_name)
+    add_policy_sql = (
+        "SELECT add_continuous_aggregate_policy('{view_name}', "
+        "start_offset => INTERVAL '{start_offset}', "
+        "end_offset => INTERVAL '{end_offset}', "
+        "schedule_interval => INTERVAL '{schedule_interval}');"
+    ).format(view_name=view_name, **policy)
+    return [create_sql, real_time_sql, remove_policy_sql, add_policy_sql]
+
+
+def create_union_view_sql(model, aggregate_model):
+    """
+    Returns the SQL statements that (re)create the view combining all
+    continuous aggregates of `model`, which is read by `aggregate_model`.
+    """
+    selects = []
+    for interval in model.continuous_aggregates:
+        selects.append(
+            "SELECT datapoint_id, bucket AS time, "
+            "'{interval}'::text AS bucket_interval, "
+            "value_avg, value_min, value_max, value_count, message_count "
+            "FROM {view_name}".format(
+                interval=interval,
+                view_name=continuous_aggregate_view_name(model, interval),
+            )
+        )
+    statements = [
+        "DROP VIEW IF EXISTS %s;" % aggregate_model._meta.db_table,
+    ]
+    if selects:
+        statements.append(
+            "CREATE VIEW %s AS %s;"
+            % (aggregate_model._meta.db_table, " UNION ALL ".join(selects))
+        )
+    return statements
+
+
+def existing_continuous_aggregates(model):
+    """
+    Returns the names of the continuous aggregates that exist in DB
+    for `model`.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT view_name FROM timescaledb_information.continuous_aggregates "
+            "WHERE hypertable_name = %s;",
+            [model._meta.db_table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def outdated_continuous_aggregates(model):
+    """
+    Returns the names of the continuous aggregates that exist in DB for
+    `model` but lack the `message_count` column, i.e. have been created
+    with an earlier definition and must be recreated.
+    """
+    view_names = existing_continuous_aggregates(model)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT table_name FROM information_schema.columns "
+            "WHERE table_name = ANY(%s) AND column_name = 'message_count';",
+            [view_names],
+        )
+        up_to_date_view_names = {row[0] for row in cursor.fetchall()}
+    return [v for v in view_names if v not in up_to_date_view_names]
@@ -0,0 +1,158 @@
+"""
+Routing of database queries between the primary DB and read replicas.
+
+Only reads of the message history (and the aggregates computed from it)
+are sent to the replicas, and only if these are executed while serving a
+read only request, i.e. within `replica_reads`. Everything else, especially
+all writes, the reads of the latest messages and reads executed by
+`MqttToDb`, stays on the primary DB. Hence heavy history and aggregate
+queries can't slow down the ingestion of new messages.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+from threading import Lock
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Models which store the message history. Only reads of these may be
+# served by a replica.
+HISTORY_MODELS = {
+    "api_main.datapointvalue",
+    "api_main.datapointvalueaggregate",
+    "api_main.datapointschedule",
+    "api_main.datapointsetpoint",
+}
+
+# The replication lag in seconds. Is zero if the replica has replayed
+# everything it has received, as `pg_last_xact_replay_timestamp` would else
+# report a growing lag while the primary receives no writes.
+REPLICA_LAG_SQL = (
+    "SELECT CASE "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+    "END;"
+)
+
+_replica_reads_allowed = ContextVar("replica_reads_allowed", default=False)
+
+
+def replica_reads(view):
+    """
+    Decorator for views that allows the history reads of GET and HEAD
+    requests to be served by a read replica.
+    """
+
+    @wraps(view)
+    def wrapped_view(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+        token = _replica_reads_allowed.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads_allowed.reset(token)
+
+    return wrapped_view
+
+
+def replica_lag(alias):
+    """
+    Returns the replication lag of the replica DB `alias` in seconds.
+    """
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(REPLICA_LAG_SQL)
+        lag = cursor.fetchone()[0]
+    # NULL if the DB is not a replica (or has not replayed anything yet).
+    if lag is None:
+        return float("inf")
+    return float(lag)
+
+
+class ReadReplicaRouter:
+    """
+    Sends history reads of read only requests to one of the replicas in
+    `settings.DATABASE_REPLICAS`. A replica is only used if its replication
+    lag is below `settings.DATABASE_REPLICA_MAX_LAG` seconds. The lag is
+    checked at most every `settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL`
+    seconds per replica, all other queries fall back to the primary DB.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._usable_by_alias = {}
+        self._checked_at_by_alias = {}
+
+    def replica_usable(self, alias):
+        """
+        Returns True if the lag of replica `alias` is small enough.
+        """
+        now = time.monotonic()
+        with self._lock:
+            checked_at = self._checked_at_by_alias.get(alias)
+            check_interval = settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL
+            if checked_at is not None and now - checked_at < check_interval:
+                return self._usable_by_alias[alias]
+            # Mark as checked before releasing the lock, so concurrent
+            # requests don't flood the replica with lag checks.
+            self._checked_at_by_alias[alias] = now
+            self._usable_by_alias.setdefault(alias, False)
+
+        try:
+            lag = replica_lag(alias)
+            usable = lag <= settings.DATABASE_REPLICA_MAX_LAG
+            if not usable:
+                logger.warning(
+                    "Replica %s lags %s seconds behind. Falling back to "
+                    "primary DB.",
+                    alias,
+                    lag,
+                )
+        except DatabaseError:
+            logger.exception(
+                "Could not check lag of replica %s. Falling back to primary "
+                "DB.",
+                alias,
+            )
+            usable = False
+
+        with self._lock:
+            self._usable_by_alias[alias] = usable
+        return usable
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not _replica_reads_allowed.get():
+            return None
+        if model._meta.label_lower not in HISTORY_MODELS:
+            return None
+        # Reads within a transaction must see the writes of it.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        usable_replicas = [a for a in replicas if self.replica_usable(a)]
+        if not usable_replicas:
+            return None
+        return random.choice(usable_replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema changes from the primary.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
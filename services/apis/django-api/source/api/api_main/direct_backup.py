@@ -0,0 +1,423 @@
+"""
+Backup and restore of the datapoint messages directly from/to the DB.
+
+This is the counterpart of `ems_utils/simple_db_backup.py` for operators
+with access to the DB, used by the `direct_db_backup` management command.
+The messages are exported with `COPY (SELECT ...) TO STDOUT` per message
+type and day, i.e. without serializing every message to JSON, and are
+restored with the set based upsert of `bulk_update_or_create`.
+
+The files are stored in the data directory like these of the REST backup:
+
+datapoint_metadata_<date>.json.bz2
+    The metadata of all datapoints in the format of the REST API. Used to
+    map the datapoint IDs of the backup to the IDs of the restored DB,
+    hence the metadata of both backups is interchangeable.
+<date>/dbcopy_<date>_<message_type>.csv.gz (or .parquet)
+    All messages of one message type and day, with the columns
+    `datapoint_id`, `timestamp` (milliseconds) and `MESSAGE_COLUMNS`.
+    Parquet files require the optional `pyarrow` package.
+"""
+import bz2
+import csv
+import gzip
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from django.db import connections
+from django.db import router
+from django.db import transaction
+
+from api_main.models.connector import Connector
+from api_main.models.datapoint import Datapoint
+from api_main.models.datapoint import DatapointValue
+from api_main.models.datapoint import DatapointLastValue
+from api_main.models.datapoint import DatapointSchedule
+from api_main.models.datapoint import DatapointLastSchedule
+from api_main.models.datapoint import DatapointSetpoint
+from api_main.models.datapoint import DatapointLastSetpoint
+from api_rest_interface.serializers import DatapointSerializer
+from ems_utils.message_format.models import BULK_UPSERT_BATCH_SIZE
+from ems_utils.timestamp import datetime_from_timestamp
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.parquet
+except ImportError:
+    # Not only if missing, pyarrow also fails to import if it has been
+    # built for another major version of numpy.
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# The message models and the corresponding last message models, which are
+# updated while restoring like by the PUT endpoints.
+MESSAGE_MODELS = {
+    "value": (DatapointValue, DatapointLastValue),
+    "schedule": (DatapointSchedule, DatapointLastSchedule),
+    "setpoint": (DatapointSetpoint, DatapointLastSetpoint),
+}
+
+# The columns exported besides `datapoint_id` and `timestamp`. The value
+# is stored in one of the three columns, see `DatapointValueTemplate`.
+MESSAGE_COLUMNS = {
+    "value": ["value", "_value_float", "_value_bool"],
+    "schedule": ["schedule"],
+    "setpoint": ["setpoint"],
+}
+JSON_COLUMNS = {"value", "schedule", "setpoint"}
+
+FILE_EXTENSIONS = {"csv": "csv.gz", "parquet": "parquet"}
+
+# The COPY output is compressed while it is written, the fastest level
+# keeps up with the DB and the disk.
+CSV_COMPRESSLEVEL = 1
+
+COPY_SQL = (
+    "COPY (SELECT datapoint_id, "
+    "floor(extract(epoch FROM time) * 1000)::bigint AS timestamp, {columns} "
+    "FROM {table} WHERE time >= %s AND time < %s "
+    "ORDER BY datapoint_id, time) TO STDOUT WITH (FORMAT csv, HEADER)"
+)
+
+
+def day_bounds(_date):
+    """
+    Returns the start of `_date` and of the next day as datetimes in UTC.
+    """
+    start = datetime(_date.year, _date.month, _date.day, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def message_file_path(data_directory, _date, message_type, file_format):
+    """
+    Returns the path of the file holding the messages of one message
+    type and day, see the module docstring.
+    """
+    return data_directory / str(_date) / "dbcopy_{}_{}.{}".format(
+        _date, message_type, FILE_EXTENSIONS[file_format]
+    )
+
+
+def backup_datapoint_metadata(data_directory):
+    """
+    Store the metadata of all datapoints in the format of the REST backup.
+
+    Arguments:
+    ----------
+    data_directory : pathlib.Path
+        The directory to store the file in.
+
+    Returns:
+    --------
+    out_fnp : pathlib.Path
+        The path of the written file.
+    """
+    datapoints = Datapoint.objects.select_related("connector").order_by("id")
+    datapoint_metadata = DatapointSerializer(datapoints, many=True).data
+    out_fn = "datapoint_metadata_%s.json.bz2" % datetime.utcnow().date()
+    out_fnp = data_directory / out_fn
+    with bz2.open(out_fnp, "wt") as f:
+        json.dump(datapoint_metadata, f, indent=4)
+    logger.info("Stored metadata of %s datapoints.", len(datapoint_metadata))
+    return out_fnp
+
+
+def export_messages(message_type, _date, out_fnp, file_format):
+    """
+    Export all messages of one message type and day with COPY.
+
+    The file is written under a temporary name and renamed when complete.
+
+    Arguments:
+    ----------
+    message_type : str
+        One of the keys of MESSAGE_MODELS.
+    _date : datetime.date
+        The day to export, in UTC.
+    out_fnp : pathlib.Path
+        The path of the file, see `message_file_path`.
+    file_format : str
+        Either "csv" or "parquet".
+    """
+    model = MESSAGE_MODELS[message_type][0]
+    connection = connections[router.db_for_read(model)]
+    tmp_fnp = out_fnp.with_name(out_fnp.name + ".tmp")
+    try:
+        with connection.cursor() as cursor:
+            sql = cursor.mogrify(
+                COPY_SQL.format(
+                    columns=", ".join(MESSAGE_COLUMNS[message_type]),
+                    table=connection.ops.quote_name(model._meta.db_table),
+                ),
+                day_bounds(_date),
+            ).decode()
+            if file_format == "csv":
+                with gzip.open(
+                    tmp_fnp, "wb", compresslevel=CSV_COMPRESSLEVEL
+                ) as f:
+                    cursor.copy_expert(sql, f)
+            else:
+                # pyarrow reads CSV from files, convert it batch by batch.
+                with tempfile.NamedTemporaryFile(
+                    dir=out_fnp.parent, suffix=".csv"
+                ) as csv_file:
+                    cursor.copy_expert(sql, csv_file)
+                    csv_file.flush()
+                    csv_to_parquet(message_type, csv_file.name, tmp_fnp)
+    except BaseException:
+        if tmp_fnp.exists():
+            tmp_fnp.unlink()
+        raise
+    os.replace(tmp_fnp, out_fnp)
+
+
+def csv_to_parquet(message_type, csv_fnp, parquet_fnp):
+    """
+    Convert the output of COPY to a Parquet file.
+    """
+    column_types = {
+        "datapoint_id": pyarrow.int64(),
+        "timestamp": pyarrow.int64(),
+        "_value_float": pyarrow.float64(),
+        "_value_bool": pyarrow.bool_(),
+    }
+    for column in MESSAGE_COLUMNS[message_type]:
+        column_types.setdefault(column, pyarrow.string())
+    reader = pyarrow.csv.open_csv(
+        csv_fnp,
+        convert_options=pyarrow.csv.ConvertOptions(
+            column_types=column_types,
+            true_values=["t"],
+            false_values=["f"],
+            strings_can_be_null=True,
+        ),
+    )
+    with pyarrow.parquet.ParquetWriter(
+        parquet_fnp, reader.schema, compression="zstd"
+    ) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+
+
+def parse_csv_row(row):
+    """
+    Convert a row of a CSV file to the types of the Parquet files, i.e.
+    NULL (an empty field) to None and numbers and bools to Python.
+    """
+    parsed_row = {}
+    for column, value in row.items():
+        if value == "":
+            parsed_row[column] = None
+        elif column in ["datapoint_id", "timestamp"]:
+            parsed_row[column] = int(value)
+        elif column == "_value_float":
+            parsed_row[column] = float(value)
+        elif column == "_value_bool":
+            parsed_row[column] = value == "t"
+        else:
+            parsed_row[column] = value
+    return parsed_row
+
+
+def iter_file_rows(fnp):
+    """
+    Yields the rows of an exported file one by one.
+
+    Arguments:
+    ----------
+    fnp : pathlib.Path
+        A CSV or Parquet file written by `export_messages`.
+
+    Yields:
+    -------
+    row : dict
+        Maps column name to value, JSON columns are not parsed yet.
+    """
+    if fnp.name.endswith(".parquet"):
+        parquet_file = pyarrow.parquet.ParquetFile(fnp)
+        for batch in parquet_file.iter_batches(
+            batch_size=BULK_UPSERT_BATCH_SIZE
+        ):
+            yield from batch.to_pylist()
+    else:
+        with gzip.open(fnp, "rt", newline="") as f:
+            for row in csv.DictReader(f):
+                yield parse_csv_row(row)
+
+
+def row_to_msg(message_type, row, datapoint_id):
+    """
+    Convert an exported row to a msg as expected by bulk_update_or_create.
+
+    Arguments:
+    ----------
+    message_type : str
+        One of the keys of MESSAGE_MODELS.
+    row : dict
+        As yielded by `iter_file_rows`.
+    datapoint_id : int
+        The ID of the datapoint in the restored DB.
+
+    Returns:
+    --------
+    msg : dict
+        With `datapoint_id`, `time` and the message field.
+    """
+    msg = {
+        "datapoint_id": datapoint_id,
+        "time": datetime_from_timestamp(row["timestamp"]),
+    }
+    if message_type == "value":
+        if row["_value_float"] is not None:
+            value = row["_value_float"]
+        elif row["_value_bool"] is not None:
+            value = row["_value_bool"]
+        elif row["value"] is not None:
+            value = json.loads(row["value"])
+        else:
+            value = None
+        msg["value"] = value
+    else:
+        value = row[message_type]
+        msg[message_type] = json.loads(value) if value is not None else None
+    return msg
+
+
+def write_msgs(message_type, msgs):
+    """
+    Write messages and update the last messages in one transaction, like
+    the PUT endpoints do.
+
+    Returns:
+    --------
+    msgs_created : int
+        The number of messages that have been created.
+    msgs_updated : int
+        The number of messages that have been updated.
+    """
+    model, last_model = MESSAGE_MODELS[message_type]
+    # bulk_update_or_create may change the msgs in place.
+    last_msgs = [dict(msg) for msg in msgs]
+    with transaction.atomic(using=router.db_for_write(model)):
+        msg_stats = model.bulk_update_or_create(model=model, msgs=msgs)
+        last_model.bulk_update_or_create(model=last_model, msgs=last_msgs)
+    return msg_stats
+
+
+def restore_messages(message_type, fnp, dp_id_mapping):
+    """
+    Restore the messages of an exported file in batches.
+
+    Arguments:
+    ----------
+    message_type : str
+        One of the keys of MESSAGE_MODELS.
+    fnp : pathlib.Path
+        A CSV or Parquet file written by `export_messages`.
+    dp_id_mapping : dict
+        Maps the datapoint IDs of the backup to the IDs of the restored DB.
+        Messages of datapoints missing here are skipped.
+
+    Returns:
+    --------
+    n_rows : int
+        The number of rows in the file.
+    msgs_created : int
+        The number of messages that have been created.
+    msgs_updated : int
+        The number of messages that have been updated.
+    """
+    n_rows, msgs_created, msgs_updated = 0, 0, 0
+    msgs = []
+    for row in iter_file_rows(fnp):
+        n_rows += 1
+        datapoint_id = dp_id_mapping.get(row["datapoint_id"])
+        if datapoint_id is None:
+            continue
+        msgs.append(row_to_msg(message_type, row, datapoint_id))
+        if len(msgs) >= BULK_UPSERT_BATCH_SIZE:
+            created, updated = write_msgs(message_type, msgs)
+            msgs_created += created
+            msgs_updated += updated
+            msgs = []
+    if msgs:
+        created, updated = write_msgs(message_type, msgs)
+        msgs_created += created
+        msgs_updated += updated
+    return n_rows, msgs_created, msgs_updated
+
+
+def restore_datapoint_metadata(all_datapoint_metadata, force_creation=False):
+    """
+    Update the datapoints with the metadata of the backup and compute the
+    mapping of datapoint IDs, like `restore_datapoint_metadata` of
+    `ems_utils/simple_db_backup.py` does through the REST API.
+
+    Datapoints are matched by the name of the connector and
+    `key_in_connector`. Without `force_creation` only existing datapoints
+    (i.e. those a connector has created) are restored.
+
+    Arguments:
+    ----------
+    all_datapoint_metadata : list of dict
+        The content of a `datapoint_metadata_<date>.json.bz2` file.
+    force_creation : bool
+        If True missing connectors and datapoints are created. This may
+        create datapoints that are unknown to the connectors.
+
+    Returns:
+    --------
+    dp_id_mapping : dict
+        A dict mapping from the datapoint IDs in the backup files to the
+        IDs of the corresponding datapoints in the DB.
+    """
+    dp_id_mapping = {}
+    for datapoint_metadata in all_datapoint_metadata:
+        dp_id_file = datapoint_metadata["id"]
+        serializer = DatapointSerializer(data=datapoint_metadata)
+        if not serializer.is_valid():
+            logger.warning(
+                "Invalid metadata of datapoint %s: %s",
+                dp_id_file,
+                serializer.errors,
+            )
+            continue
+        data = dict(serializer.validated_data)
+        connector_name = data.pop("connector")["name"]
+
+        connector = Connector.objects.filter(name=connector_name).first()
+        if connector is None:
+            if not force_creation:
+                logger.info(
+                    "No connector %s for datapoint %s.",
+                    connector_name,
+                    dp_id_file,
+                )
+                continue
+            connector = Connector(name=connector_name)
+            connector.save()
+
+        datapoint = Datapoint.objects.filter(
+            connector=connector, key_in_connector=data["key_in_connector"]
+        ).first()
+        if datapoint is None:
+            if not force_creation:
+                logger.info("No datapoint found for datapoint %s.", dp_id_file)
+                continue
+            datapoint = Datapoint(connector=connector)
+        for field, value in data.items():
+            setattr(datapoint, field, value)
+        datapoint.save()
+        dp_id_mapping[dp_id_file] = datapoint.id
+
+    logger.info(
+        "Restored metadata for %s of %s datapoints.",
+        len(dp_id_mapping),
+        len(all_datapoint_metadata),
+    )
+    return dp_id_mapping
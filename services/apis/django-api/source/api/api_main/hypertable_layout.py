@@ -0,0 +1,236 @@
+"""
+Helpers to inspect and tune the layout of the message hypertables.
+
+Nearly all history queries select the messages of a single datapoint
+within a time range. With the default layout, chunks hold the messages of
+all datapoints for one time interval. Such a query has to search every
+chunk in the range, although it needs only one datapoint from each.
+Optionally, a hash partitioned space dimension on `datapoint_id` is added,
+which splits each time interval into several chunks. A query for one
+datapoint then only touches the chunks of its partition.
+
+Space partitions can only be added while the hypertable is empty. The
+chunk time interval can be changed anytime, but only affects new chunks.
+Both are configured in `settings.MESSAGE_SPACE_PARTITIONS` and
+`settings.MESSAGE_CHUNK_TIME_INTERVAL` and applied by migration 0009 (for
+new installations) or the `hypertable_layout` management command.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The index every message table should have, i.e. the one the history
+# queries use.
+DATAPOINT_TIME_COLUMNS = ["datapoint_id", "time"]
+
+# Must match the settings of migration 0008.
+ENABLE_COMPRESSION_SQL = (
+    "ALTER TABLE {table} SET (timescaledb.compress, "
+    "timescaledb.compress_segmentby = 'datapoint_id', "
+    "timescaledb.compress_orderby = 'time DESC');"
+)
+
+INDEX_COLUMNS_SQL = (
+    "SELECT i.relname, array_agg(a.attname ORDER BY k.ord) "
+    "FROM pg_index AS x "
+    "JOIN pg_class AS i ON i.oid = x.indexrelid "
+    "CROSS JOIN LATERAL unnest(x.indkey) WITH ORDINALITY AS k(attnum, ord) "
+    "JOIN pg_attribute AS a "
+    "ON a.attrelid = x.indrelid AND a.attnum = k.attnum "
+    "WHERE x.indrelid = %s::regclass "
+    "GROUP BY i.relname ORDER BY i.relname;"
+)
+
+
+def space_dimension(cursor, table):
+    """
+    Returns the number of hash partitions on `datapoint_id` of `table` or
+    None if the hypertable has no such dimension.
+    """
+    cursor.execute(
+        "SELECT num_partitions FROM timescaledb_information.dimensions "
+        "WHERE hypertable_name = %s AND column_name = 'datapoint_id';",
+        [table],
+    )
+    row = cursor.fetchone()
+    return row[0] if row is not None else None
+
+
+def is_empty(cursor, table):
+    cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM %s);" % table)
+    return cursor.fetchone()[0]
+
+
+def add_space_dimension(cursor, table, n_partitions):
+    """
+    Add the space dimension to the empty hypertable `table`.
+
+    TimescaleDB refuses to add dimensions while compression is enabled.
+    As the table is empty there are no compressed chunks, hence compression
+    (and the compression policy) can be removed and restored afterwards.
+    """
+    cursor.execute(
+        "SELECT compression_enabled FROM timescaledb_information.hypertables "
+        "WHERE hypertable_name = %s;",
+        [table],
+    )
+    compression_enabled = cursor.fetchone()[0]
+    compress_after = None
+    if compression_enabled:
+        cursor.execute(
+            "SELECT config->>'compress_after' "
+            "FROM timescaledb_information.jobs "
+            "WHERE proc_name = 'policy_compression' "
+            "AND hypertable_name = %s;",
+            [table],
+        )
+        row = cursor.fetchone()
+        compress_after = row[0] if row is not None else None
+        cursor.execute(
+            "SELECT remove_compression_policy('%s', if_exists => true);"
+            % table
+        )
+        cursor.execute(
+            "ALTER TABLE %s SET (timescaledb.compress = false);" % table
+        )
+
+    cursor.execute(
+        "SELECT add_dimension('%s', 'datapoint_id', "
+        "number_partitions => %s);" % (table, int(n_partitions))
+    )
+
+    if compression_enabled:
+        cursor.execute(ENABLE_COMPRESSION_SQL.format(table=table))
+    if compress_after is not None:
+        cursor.execute(
+            "SELECT add_compression_policy('%s', INTERVAL '%s');"
+            % (table, compress_after)
+        )
+
+
+def apply_layout(cursor, table, n_partitions, chunk_time_interval):
+    """
+    Add the space dimension and set the chunk time interval of `table`.
+
+    Arguments:
+    ----------
+    cursor : django.db cursor
+        A cursor of a TimescaleDB connection.
+    table : str
+        The name of the hypertable.
+    n_partitions : int
+        The number of hash partitions on `datapoint_id`. 0 means no space
+        dimension. Existing dimensions are not changed.
+    chunk_time_interval : str or None
+        A PostgreSQL interval, e.g. "7 days". None keeps the interval.
+
+    Returns:
+    --------
+    applied : bool
+        False if the space dimension could not be added as `table` is not
+        empty.
+    """
+    applied = True
+    if n_partitions and space_dimension(cursor, table) is None:
+        if is_empty(cursor, table):
+            logger.info(
+                "Adding %s space partitions on datapoint_id to %s",
+                n_partitions,
+                table,
+            )
+            add_space_dimension(cursor, table, n_partitions)
+        else:
+            logger.warning(
+                "Cannot add space partitions to %s as it contains data. "
+                "Back up the data, recreate the DB and restore the data.",
+                table,
+            )
+            applied = False
+
+    if chunk_time_interval:
+        logger.info(
+            "Setting chunk time interval of %s to %s",
+            table,
+            chunk_time_interval,
+        )
+        cursor.execute(
+            "SELECT set_chunk_time_interval('%s', INTERVAL '%s');"
+            % (table, chunk_time_interval)
+        )
+    return applied
+
+
+def classify_indexes(index_columns):
+    """
+    Check if an index serves the queries for one datapoint and a time range.
+
+    Arguments:
+    ----------
+    index_columns : dict
+        Maps the name of each index of the table to its list of columns.
+
+    Returns:
+    --------
+    matching : list of str
+        Names of the indexes leading with (datapoint_id, time). The
+        direction doesn't matter, as btree indexes are scanned backwards
+        too.
+    redundant : list of str
+        Names of the indexes on `datapoint_id` alone. Any matching index
+        serves the same queries.
+    """
+    matching = []
+    redundant = []
+    for name, columns in index_columns.items():
+        if columns[:2] == DATAPOINT_TIME_COLUMNS:
+            matching.append(name)
+        elif columns == DATAPOINT_TIME_COLUMNS[:1]:
+            redundant.append(name)
+    if not matching:
+        redundant = []
+    return matching, redundant
+
+
+def audit_indexes(cursor, table, create_missing=False):
+    """
+    Log whether `table` has an index on (datapoint_id, time), and optionally
+    create it if it is missing.
+
+    Returns:
+    --------
+    matching : list of str
+        Names of the indexes on (datapoint_id, time) after the audit.
+    """
+    cursor.execute(INDEX_COLUMNS_SQL, [table])
+    index_columns = {name: list(columns) for name, columns in cursor}
+    matching, redundant = classify_indexes(index_columns)
+
+    if matching:
+        logger.info(
+            "%s: per datapoint queries are served by index %s",
+            table,
+            ", ".join(matching),
+        )
+    elif create_missing:
+        index_name = "%s_datapoint_id_time_idx" % table
+        logger.info("%s: creating missing index %s", table, index_name)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS %s ON %s (datapoint_id, time DESC);"
+            % (index_name, table)
+        )
+        matching = [index_name]
+    else:
+        logger.warning(
+            "%s: no index on (datapoint_id, time), per datapoint queries "
+            "scan the time index of all datapoints.",
+            table,
+        )
+    for name in redundant:
+        logger.info(
+            "%s: index %s is redundant with %s, but is kept as Django "
+            "manages it.",
+            table,
+            name,
+            matching[0],
+        )
+    return matching
@@ -0,0 +1,128 @@
+import logging
+import random
+import time
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db import transaction
+
+from api_main.models.connector import Connector
+from api_main.models.datapoint import Datapoint
+from api_main.models.datapoint import DatapointValue
+from ems_utils.message_format.models import TimescaleModel
+from ems_utils.message_format.models import bulk_upsert
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the runtime of bulk_update_or_create of value messages "
+        "using the set based upsert and the generic per datapoint "
+        "implementation. All changes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--datapoints",
+            type=int,
+            default=20,
+            help="Number of datapoints to generate messages for.",
+        )
+        parser.add_argument(
+            "--messages",
+            type=int,
+            default=5000,
+            help="Number of messages per datapoint.",
+        )
+        parser.add_argument(
+            "--existing-share",
+            type=float,
+            default=0.5,
+            help="Share of messages that exist already, i.e. are updated.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The benchmark requires a PostgreSQL database.")
+
+        for implementation in ["generic", "set_based"]:
+            with transaction.atomic():
+                self.benchmark(implementation, options)
+                transaction.set_rollback(True)
+
+    def benchmark(self, implementation, options):
+        """
+        Write messages of which some exist already with `implementation`
+        and log the runtime.
+        """
+        # bulk_create sends no signals, i.e. nothing is published on MQTT.
+        connector = Connector(name="benchmark_bulk_update_or_create")
+        connector.set_mqtt_topics()
+        Connector.objects.bulk_create([connector])
+        datapoints = Datapoint.objects.bulk_create(
+            [
+                Datapoint(
+                    connector=connector,
+                    key_in_connector="benchmark_%s" % i,
+                    type="sensor",
+                    data_format="generic_numeric",
+                )
+                for i in range(options["datapoints"])
+            ]
+        )
+        start = datetime(2021, 1, 1, tzinfo=timezone.utc)
+        rng = random.Random(0)
+        # Like the messages after DatapointValue.bulk_update_or_create has
+        # moved the values into the hidden fields.
+        msgs = [
+            {
+                "datapoint": datapoint,
+                "time": start + timedelta(minutes=i),
+                "value": None,
+                "_value_float": rng.random() * 30,
+                "_value_bool": None,
+            }
+            for datapoint in datapoints
+            for i in range(options["messages"])
+        ]
+        existing = [
+            dict(msg, _value_float=msg["_value_float"] - 1)
+            for msg in msgs
+            if rng.random() < options["existing_share"]
+        ]
+        bulk_upsert(
+            model=DatapointValue,
+            msgs=existing,
+            unique_fields=["datapoint", "time"],
+        )
+
+        started = time.monotonic()
+        if implementation == "set_based":
+            msgs_created, msgs_updated = bulk_upsert(
+                model=DatapointValue,
+                msgs=msgs,
+                unique_fields=["datapoint", "time"],
+            )
+        else:
+            (
+                msgs_created,
+                msgs_updated,
+            ) = TimescaleModel.bulk_update_or_create_generic(
+                model=DatapointValue, msgs=msgs
+            )
+        runtime = time.monotonic() - started
+
+        logger.info(
+            "%s: created %s and updated %s messages in %.2f s "
+            "(%.0f messages/s)",
+            implementation,
+            msgs_created,
+            msgs_updated,
+            runtime,
+            len(msgs) / runtime,
+        )
@@ -0,0 +1,224 @@
+import json
+import logging
+import random
+import statistics
+import time
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api_main.continuous_aggregates import timescale_available
+from api_main.hypertable_layout import audit_indexes
+
+
+logger = logging.getLogger(__name__)
+
+# Like the query of ViewSetWithDatapointFK.list for a time range.
+QUERY_SQL = (
+    "SELECT time, value, _value_float FROM {table} "
+    "WHERE datapoint_id = %s AND time >= %s AND time < %s ORDER BY time"
+)
+
+
+def relation_names(plan):
+    """
+    Returns the names of all relations (i.e. chunks) scanned by `plan`,
+    a node of a JSON formatted query plan.
+    """
+    names = set()
+    if "Relation Name" in plan:
+        names.add(plan["Relation Name"])
+    for subplan in plan.get("Plans", []):
+        names |= relation_names(subplan)
+    return names
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the query plans and latencies of per datapoint range "
+        "queries with and without space partitions on datapoint_id, using "
+        "generated data in temporary hypertables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--datapoints",
+            type=int,
+            default=200,
+            help="Number of datapoints to generate data for.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Number of days to generate data for.",
+        )
+        parser.add_argument(
+            "--message-interval",
+            default="5 minutes",
+            help="Time between the generated messages of each datapoint.",
+        )
+        parser.add_argument(
+            "--partitions",
+            type=int,
+            default=4,
+            help="Number of space partitions of the partitioned layout.",
+        )
+        parser.add_argument(
+            "--chunk-time-interval",
+            default="1 day",
+            help="Chunk time interval of both layouts.",
+        )
+        parser.add_argument(
+            "--window-days",
+            type=int,
+            default=7,
+            help="Length of the time range of each query in days.",
+        )
+        parser.add_argument(
+            "--queries",
+            type=int,
+            default=50,
+            help="Number of queries per layout.",
+        )
+
+    def handle(self, *args, **options):
+        if not timescale_available():
+            raise CommandError(
+                "The benchmark requires a TimescaleDB database."
+            )
+        if options["window_days"] > options["days"]:
+            raise CommandError("--window-days must not exceed --days.")
+
+        end = datetime.now(tz=timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        start = end - timedelta(days=options["days"])
+        # Identical queries for both layouts.
+        rng = random.Random(0)
+        window = timedelta(days=options["window_days"])
+        queries = []
+        for _ in range(options["queries"]):
+            datapoint_id = rng.randint(1, options["datapoints"])
+            max_offset = (end - start - window).days
+            query_start = start + timedelta(days=rng.randint(0, max_offset))
+            queries.append((datapoint_id, query_start, query_start + window))
+
+        layouts = {
+            "benchmark_layout_time_only": 0,
+            "benchmark_layout_space": options["partitions"],
+        }
+        try:
+            for table, n_partitions in layouts.items():
+                self.create_table(table, n_partitions, start, end, options)
+                self.benchmark_queries(table, queries)
+        finally:
+            with connection.cursor() as cursor:
+                for table in layouts:
+                    cursor.execute("DROP TABLE IF EXISTS %s;" % table)
+
+    def create_table(self, table, n_partitions, start, end, options):
+        """
+        Create a hypertable like the one of DatapointValue and fill it
+        with generated messages.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS %s;" % table)
+            cursor.execute(
+                "CREATE TABLE %s (datapoint_id integer NOT NULL, "
+                "time timestamptz NOT NULL, value jsonb, "
+                "_value_float double precision);" % table
+            )
+            cursor.execute(
+                "SELECT create_hypertable('%s', 'time', "
+                "chunk_time_interval => INTERVAL '%s');"
+                % (table, options["chunk_time_interval"])
+            )
+            if n_partitions:
+                cursor.execute(
+                    "SELECT add_dimension('%s', 'datapoint_id', "
+                    "number_partitions => %s);" % (table, n_partitions)
+                )
+            # Like the unique constraint of the message tables.
+            cursor.execute(
+                "CREATE UNIQUE INDEX %s_datapoint_id_time_key "
+                "ON %s (datapoint_id, time);" % (table, table)
+            )
+
+            started = time.monotonic()
+            cursor.execute(
+                "INSERT INTO {table} "
+                "SELECT d, t, to_jsonb(v), v FROM ("
+                "SELECT d, t, random() * 30 AS v "
+                "FROM generate_series(1, %s) AS d "
+                "CROSS JOIN generate_series(%s::timestamptz, "
+                "%s::timestamptz - INTERVAL '1 microsecond', "
+                "%s::interval) AS t"
+                ") AS generated;".format(table=table),
+                [
+                    options["datapoints"],
+                    start,
+                    end,
+                    options["message_interval"],
+                ],
+            )
+            n_rows = cursor.rowcount
+            cursor.execute("ANALYZE %s;" % table)
+            cursor.execute("SELECT count(*) FROM show_chunks('%s');" % table)
+            n_chunks = cursor.fetchone()[0]
+            logger.info(
+                "%s: inserted %s rows into %s chunks in %.1f s",
+                table,
+                n_rows,
+                n_chunks,
+                time.monotonic() - started,
+            )
+            audit_indexes(cursor, table)
+
+    def benchmark_queries(self, table, queries):
+        """
+        Run `queries` against `table` and log latencies and plan details.
+        """
+        sql = QUERY_SQL.format(table=table)
+        execution_times = []
+        n_chunks = []
+        n_buffers = []
+        with connection.cursor() as cursor:
+            # Warm up the cache, i.e. measure the layout not the disk.
+            for query in queries:
+                cursor.execute(sql, query)
+
+            for query in queries:
+                cursor.execute(
+                    "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, query
+                )
+                explain = cursor.fetchone()[0]
+                if isinstance(explain, str):
+                    explain = json.loads(explain)
+                explain = explain[0]
+                plan = explain["Plan"]
+                execution_times.append(explain["Execution Time"])
+                n_chunks.append(len(relation_names(plan)))
+                n_buffers.append(
+                    plan.get("Shared Hit Blocks", 0)
+                    + plan.get("Shared Read Blocks", 0)
+                )
+
+            cursor.execute("EXPLAIN " + sql, queries[0])
+            plan_text = "\n".join(row[0] for row in cursor.fetchall())
+
+        execution_times.sort()
+        p95_index = min(len(execution_times) - 1, int(len(queries) * 0.95))
+        logger.info(
+            "%s: median %.2f ms, p95 %.2f ms, %.1f chunks and %.0f buffers "
+            "per query. Plan of the first query:\n%s",
+            table,
+            statistics.median(execution_times),
+            execution_times[p95_index],
+            statistics.mean(n_chunks),
+            statistics.mean(n_buffers),
+            plan_text,
+        )
@@ -0,0 +1,95 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api_main.continuous_aggregates import continuous_aggregate_view_name
+from api_main.continuous_aggregates import create_continuous_aggregate_sql
+from api_main.continuous_aggregates import create_union_view_sql
+from api_main.continuous_aggregates import existing_continuous_aggregates
+from api_main.continuous_aggregates import outdated_continuous_aggregates
+from api_main.continuous_aggregates import timescale_available
+from api_main.models.datapoint import DatapointValue
+from api_main.models.datapoint import DatapointValueAggregate
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates/updates the TimescaleDB continuous aggregates defined in "
+        "DatapointValue.continuous_aggregates incl. the refresh policies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help=(
+                "Refresh the aggregates for the full time range. Use this "
+                "after restoring or importing historic data, as the refresh "
+                "policies only consider recent data."
+            ),
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Remove all continuous aggregates and the combining view.",
+        )
+
+    def handle(self, *args, **options):
+        if not timescale_available():
+            raise CommandError(
+                "Continuous aggregates require a TimescaleDB database."
+            )
+
+        model = DatapointValue
+        aggregate_model = DatapointValueAggregate
+        configured_views = {
+            continuous_aggregate_view_name(model, interval): interval
+            for interval in model.continuous_aggregates
+        }
+        if options["drop"]:
+            configured_views = {}
+
+        with connection.cursor() as cursor:
+            # The view depends on the aggregates, hence drop it first.
+            cursor.execute(
+                "DROP VIEW IF EXISTS %s;" % aggregate_model._meta.db_table
+            )
+
+            outdated_views = outdated_continuous_aggregates(model)
+            for view_name in existing_continuous_aggregates(model):
+                if view_name in configured_views:
+                    if view_name not in outdated_views:
+                        continue
+                    logger.warning(
+                        "Recreating outdated continuous aggregate %s. Run "
+                        "with --refresh to materialize the historic data.",
+                        view_name,
+                    )
+                else:
+                    logger.info("Dropping continuous aggregate %s", view_name)
+                cursor.execute("DROP MATERIALIZED VIEW %s;" % view_name)
+
+            for view_name, interval in configured_views.items():
+                logger.info("Creating continuous aggregate %s", view_name)
+                for statement in create_continuous_aggregate_sql(
+                    model, interval
+                ):
+                    cursor.execute(statement)
+
+            if not configured_views:
+                return
+
+            for statement in create_union_view_sql(model, aggregate_model):
+                cursor.execute(statement)
+
+            if options["refresh"]:
+                for view_name in configured_views:
+                    logger.info("Refreshing continuous aggregate %s", view_name)
+                    cursor.execute(
+                        "CALL refresh_continuous_aggregate('%s', NULL, NULL);"
+                        % view_name
+                    )
@@ -0,0 +1,173 @@
+import bz2
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db import router
+
+from api_main import direct_backup
+from api_main.direct_backup import MESSAGE_MODELS
+from api_main.direct_backup import FILE_EXTENSIONS
+from api_main.direct_backup import backup_datapoint_metadata
+from api_main.direct_backup import export_messages
+from api_main.direct_backup import message_file_path
+from api_main.direct_backup import restore_datapoint_metadata
+from api_main.direct_backup import restore_messages
+
+
+logger = logging.getLogger(__name__)
+
+PYARROW_MISSING_MESSAGE = (
+    "Parquet files require pyarrow, which is not installed or can't be "
+    "imported (e.g. if built for another numpy version)."
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Backs up the datapoint metadata and messages directly from the DB "
+        "into CSV or Parquet files with one file per message type and day, "
+        "or restores them. See api_main/direct_backup.py"
+    )
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument(
+            "--backup", action="store_true", help="Backup the data."
+        )
+        group.add_argument(
+            "--restore", action="store_true", help="Restore the data."
+        )
+        parser.add_argument(
+            "--data-directory",
+            type=Path,
+            required=True,
+            help="Path to the existing directory holding the backup files.",
+        )
+        parser.add_argument(
+            "--start-date",
+            type=date.fromisoformat,
+            required=True,
+            help="The first date (in ISO format) to backup or restore.",
+        )
+        parser.add_argument(
+            "--end-date",
+            type=date.fromisoformat,
+            default=datetime.utcnow().date() - timedelta(days=1),
+            help=(
+                "The last date (in ISO format) to backup or restore. "
+                "Defaults to yesterday in UTC."
+            ),
+        )
+        parser.add_argument(
+            "--format",
+            choices=list(FILE_EXTENSIONS),
+            default="csv",
+            help=(
+                "The format of the backup files, gzip compressed CSV "
+                "(default) or Parquet, which requires pyarrow."
+            ),
+        )
+        parser.add_argument(
+            "--force-datapoint-creation",
+            action="store_true",
+            help=(
+                "Create missing connectors and datapoints while restoring. "
+                "The datapoints may be unknown to the connectors."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        data_directory = options["data_directory"].absolute()
+        if not data_directory.is_dir():
+            raise CommandError("%s is not a directory." % data_directory)
+
+        dates = []
+        _date = options["start_date"]
+        while _date <= options["end_date"]:
+            dates.append(_date)
+            _date += timedelta(days=1)
+
+        if options["backup"]:
+            self.backup(data_directory, dates, options["format"])
+        else:
+            self.restore(
+                data_directory, dates, options["force_datapoint_creation"]
+            )
+
+    def backup(self, data_directory, dates, file_format):
+        if file_format == "parquet" and direct_backup.pyarrow is None:
+            raise CommandError(PYARROW_MISSING_MESSAGE)
+        for model, _ in MESSAGE_MODELS.values():
+            if connections[router.db_for_read(model)].vendor != "postgresql":
+                raise CommandError("The backup requires a PostgreSQL DB.")
+
+        backup_datapoint_metadata(data_directory)
+        started = time.monotonic()
+        n_bytes = 0
+        for _date in dates:
+            (data_directory / str(_date)).mkdir(exist_ok=True)
+            for message_type in MESSAGE_MODELS:
+                out_fnp = message_file_path(
+                    data_directory, _date, message_type, file_format
+                )
+                # Files are renamed when complete, i.e. these are complete.
+                if out_fnp.is_file():
+                    logger.info("Skipping existing file %s", out_fnp.name)
+                    continue
+                export_messages(message_type, _date, out_fnp, file_format)
+                n_bytes += out_fnp.stat().st_size
+            logger.info(
+                "Exported messages of %s (%.1f MB/s written).",
+                _date,
+                n_bytes / 1e6 / (time.monotonic() - started),
+            )
+
+    def restore(self, data_directory, dates, force_datapoint_creation):
+        metadata_fnps = data_directory.glob("datapoint_metadata_*.json.bz2")
+        metadata_fnps = sorted(metadata_fnps)
+        if not metadata_fnps:
+            raise CommandError("No datapoint metadata in %s." % data_directory)
+        logger.info("Loading datapoint metadata from: %s", metadata_fnps[-1])
+        with bz2.open(metadata_fnps[-1], "rt") as f:
+            all_datapoint_metadata = json.load(f)
+        all_datapoint_metadata.sort(key=lambda k: k["id"])
+        dp_id_mapping = restore_datapoint_metadata(
+            all_datapoint_metadata, force_creation=force_datapoint_creation
+        )
+
+        started = time.monotonic()
+        n_rows_total, msgs_created_total, msgs_updated_total = 0, 0, 0
+        for _date in dates:
+            for message_type in MESSAGE_MODELS:
+                for file_format in FILE_EXTENSIONS:
+                    fnp = message_file_path(
+                        data_directory, _date, message_type, file_format
+                    )
+                    if not fnp.is_file():
+                        continue
+                    if (
+                        file_format == "parquet"
+                        and direct_backup.pyarrow is None
+                    ):
+                        raise CommandError(PYARROW_MISSING_MESSAGE)
+                    n_rows, msgs_created, msgs_updated = restore_messages(
+                        message_type, fnp, dp_id_mapping
+                    )
+                    n_rows_total += n_rows
+                    msgs_created_total += msgs_created
+                    msgs_updated_total += msgs_updated
+            logger.info(
+                "Restored messages of %s (%.0f rows/s).",
+                _date,
+                n_rows_total / (time.monotonic() - started),
+            )
+        logger.info(
+            "Created %s and updated %s messages in total.",
+            msgs_created_total,
+            msgs_updated_total,
+        )
@@ -0,0 +1,79 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api_main.continuous_aggregates import timescale_available
+from api_main.hypertable_layout import apply_layout
+from api_main.hypertable_layout import audit_indexes
+from api_main.hypertable_layout import space_dimension
+from api_main.storage_policies import MESSAGE_MODELS
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Applies MESSAGE_SPACE_PARTITIONS and MESSAGE_CHUNK_TIME_INTERVAL "
+        "to the message hypertables and audits their indexes for per "
+        "datapoint queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--partitions",
+            type=int,
+            default=settings.MESSAGE_SPACE_PARTITIONS,
+            help=(
+                "Number of hash partitions on datapoint_id. Can only be "
+                "added to empty tables. Defaults to MESSAGE_SPACE_PARTITIONS."
+            ),
+        )
+        parser.add_argument(
+            "--chunk-time-interval",
+            default=settings.MESSAGE_CHUNK_TIME_INTERVAL,
+            help=(
+                "Time interval of new chunks, e.g. '7 days'. Defaults to "
+                "MESSAGE_CHUNK_TIME_INTERVAL."
+            ),
+        )
+        parser.add_argument(
+            "--create-missing-indexes",
+            action="store_true",
+            help="Create the index on (datapoint_id, time) where missing.",
+        )
+        parser.add_argument(
+            "--audit-only",
+            action="store_true",
+            help="Only report the layout and indexes, change nothing.",
+        )
+
+    def handle(self, *args, **options):
+        if not timescale_available():
+            raise CommandError("Hypertables require a TimescaleDB database.")
+
+        with connection.cursor() as cursor:
+            for msg_type, model in MESSAGE_MODELS.items():
+                table = model._meta.db_table
+                if not options["audit_only"]:
+                    apply_layout(
+                        cursor,
+                        table,
+                        n_partitions=options["partitions"],
+                        chunk_time_interval=options["chunk_time_interval"],
+                    )
+                logger.info(
+                    "%s: %s space partitions on datapoint_id",
+                    table,
+                    space_dimension(cursor, table) or "no",
+                )
+                audit_indexes(
+                    cursor,
+                    table,
+                    create_missing=(
+                        options["create_missing_indexes"]
+                        and not options["audit_only"]
+                    ),
+                )
@@ -0,0 +1,120 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api_main.continuous_aggregates import parse_interval
+from api_main.continuous_aggregates import timescale_available
+from api_main.models.datapoint import DatapointValue
+from api_main.storage_policies import MESSAGE_MODELS
+from api_main.storage_policies import compression_policy_sql
+from api_main.storage_policies import datapoint_retention_sql
+from api_main.storage_policies import retention_policy_sql
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates/updates the TimescaleDB compression and retention policies "
+        "of the message hypertables as defined in MESSAGE_COMPRESS_AFTER "
+        "and MESSAGE_DROP_AFTER, and the job applying the retention periods "
+        "of the datapoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--compress-now",
+            action="store_true",
+            help=(
+                "Compress all chunks that are older than the compress after "
+                "interval right away instead of waiting for the policy. "
+                "Use this after restoring or importing historic data."
+            ),
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help=(
+                "Remove all policies and the job. Compressed chunks stay "
+                "compressed."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if not timescale_available():
+            raise CommandError(
+                "Storage policies require a TimescaleDB database."
+            )
+
+        compress_after = settings.MESSAGE_COMPRESS_AFTER
+        drop_after = settings.MESSAGE_DROP_AFTER
+        if options["drop"]:
+            compress_after = {}
+            drop_after = {}
+
+        unknown_msg_types = set(compress_after) | set(drop_after)
+        unknown_msg_types -= set(MESSAGE_MODELS)
+        if unknown_msg_types:
+            raise CommandError(
+                "Unknown message types in storage policy settings: %s"
+                % sorted(unknown_msg_types)
+            )
+        self.warn_if_aggregates_lose_data(drop_after.get("value"))
+
+        with connection.cursor() as cursor:
+            for msg_type, model in MESSAGE_MODELS.items():
+                logger.info(
+                    "Setting storage policies of %s messages: compress "
+                    "after %s, drop after %s",
+                    msg_type,
+                    compress_after.get(msg_type),
+                    drop_after.get(msg_type),
+                )
+                statements = compression_policy_sql(
+                    model, compress_after.get(msg_type)
+                )
+                statements += retention_policy_sql(
+                    model, drop_after.get(msg_type)
+                )
+                for statement in statements:
+                    cursor.execute(statement)
+
+            for statement in datapoint_retention_sql(remove=options["drop"]):
+                cursor.execute(statement)
+
+            if not options["compress_now"]:
+                return
+            for msg_type, model in MESSAGE_MODELS.items():
+                if compress_after.get(msg_type) is None:
+                    continue
+                logger.info("Compressing chunks of %s messages", msg_type)
+                cursor.execute(
+                    "SELECT compress_chunk(c, if_not_compressed => true) "
+                    "FROM show_chunks('%s', older_than => INTERVAL '%s') c;"
+                    % (model._meta.db_table, compress_after[msg_type])
+                )
+
+    def warn_if_aggregates_lose_data(self, drop_after):
+        """
+        Continuous aggregates are recomputed from the raw data on refresh.
+        If the raw data is dropped within the refresh window the dropped
+        buckets are lost in the aggregate too.
+        """
+        drop_after_td = parse_interval(drop_after)
+        if drop_after_td is None:
+            return
+        for interval, policy in DatapointValue.continuous_aggregates.items():
+            start_offset_td = parse_interval(policy["start_offset"])
+            if start_offset_td is None or drop_after_td > start_offset_td:
+                continue
+            logger.warning(
+                "Value messages are dropped after %s, but the continuous "
+                "aggregate for %s is refreshed for the last %s. Buckets "
+                "of dropped messages will vanish from the aggregate.",
+                drop_after,
+                interval,
+                policy["start_offset"],
+            )
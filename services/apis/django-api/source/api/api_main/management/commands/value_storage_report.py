@@ -0,0 +1,124 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api_main.continuous_aggregates import timescale_available
+from api_main.models.datapoint import DatapointValue
+
+
+logger = logging.getLogger(__name__)
+
+# Size of a heap tuple of a narrow (datapoint_id, time, value float) table:
+# 24 bytes header, 4 bytes datapoint_id plus 4 bytes padding to align the
+# timestamp, 8 bytes time, 8 bytes value, plus the 4 bytes line pointer.
+# A numeric row of the current table takes 56 bytes, as it additionally
+# holds the 4 bytes `id` column left over from the Django primary key.
+NARROW_TUPLE_BYTES = 24 + 4 + 4 + 8 + 8 + 4
+
+# Computed on a sample, as scanning all rows takes ages on large tables.
+SAMPLE_SQL = (
+    "SELECT count(*), "
+    "avg(pg_column_size(t.*)) + 4, "
+    "avg(pg_column_size(t.value)), "
+    "count(t._value_float), "
+    "count(t._value_bool), "
+    "count(t.value) "
+    "FROM {table} AS t TABLESAMPLE SYSTEM (%s);"
+)
+
+SIZE_SQL = (
+    "SELECT table_bytes, index_bytes, total_bytes "
+    "FROM hypertable_detailed_size(%s::regclass);"
+)
+
+COMPRESSION_SQL = (
+    "SELECT before_compression_total_bytes, after_compression_total_bytes "
+    "FROM hypertable_compression_stats(%s::regclass);"
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports where the storage of the value messages goes, i.e. the "
+        "share of numeric, bool and JSON values, the bytes per row and "
+        "what a narrow float only table would save."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sample-rows",
+            type=int,
+            default=100000,
+            help="Approximate number of rows to sample. Defaults to 100000.",
+        )
+
+    def handle(self, *args, **options):
+        if not timescale_available():
+            raise CommandError("The report requires a TimescaleDB database.")
+
+        table = DatapointValue._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT approximate_row_count(%s::regclass);", [table]
+            )
+            n_rows = cursor.fetchone()[0]
+            if not n_rows:
+                logger.info("%s holds no rows.", table)
+                return
+
+            sample_percent = min(100.0, options["sample_rows"] / n_rows * 100)
+            cursor.execute(SAMPLE_SQL.format(table=table), [sample_percent])
+            (
+                n_sampled,
+                tuple_bytes,
+                json_bytes,
+                n_float,
+                n_bool,
+                n_json,
+            ) = cursor.fetchone()
+            cursor.execute(SIZE_SQL, [table])
+            table_bytes, index_bytes, total_bytes = cursor.fetchone()
+            cursor.execute(COMPRESSION_SQL, [table])
+            compression = cursor.fetchone()
+
+        if not n_sampled:
+            logger.info("The sample of %s is empty, try more rows.", table)
+            return
+
+        float_share = n_float / n_sampled
+        logger.info(
+            "%s: ~%s rows, %.1f MB heap, %.1f MB indexes, %.1f MB total",
+            table,
+            n_rows,
+            table_bytes / 1e6,
+            index_bytes / 1e6,
+            total_bytes / 1e6,
+        )
+        logger.info(
+            "Values in sample of %s rows: %.1f%% float, %.1f%% bool, "
+            "%.1f%% JSON (%.1f bytes on average)",
+            n_sampled,
+            float_share * 100,
+            n_bool / n_sampled * 100,
+            n_json / n_sampled * 100,
+            json_bytes or 0,
+        )
+        saved_per_row = max(0.0, float(tuple_bytes) - NARROW_TUPLE_BYTES)
+        logger.info(
+            "Uncompressed rows take %.1f bytes, a narrow float only table "
+            "%s bytes. Moving the float values there would save ~%.1f MB "
+            "(%.1f%% of the heap), the indexes stay the same.",
+            tuple_bytes,
+            NARROW_TUPLE_BYTES,
+            saved_per_row * float_share * n_rows / 1e6,
+            saved_per_row / float(tuple_bytes) * float_share * 100,
+        )
+        if compression is not None and compression[0]:
+            logger.info(
+                "Compressed chunks: %.1f MB before, %.1f MB after "
+                "compression (ratio %.1f).",
+                compression[0] / 1e6,
+                compression[1] / 1e6,
+                compression[0] / max(compression[1], 1),
+            )
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_main', '0005_auto_20220413_1928'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatapointValueAggregate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.DateTimeField(help_text='The start of the bucket.')),
+                ('bucket_interval', models.TextField(help_text='The interval of the continuous aggregate.')),
+                ('value_avg', models.FloatField(null=True)),
+                ('value_min', models.FloatField(null=True)),
+                ('value_max', models.FloatField(null=True)),
+                ('value_count', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'api_main_datapointvalue_aggregate',
+                'managed': False,
+            },
+        ),
+    ]
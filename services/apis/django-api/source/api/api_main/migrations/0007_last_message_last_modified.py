@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_main', '0006_datapointvalueaggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datapointlastschedule',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='The time the schedule message has last been written.'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='datapointlastsetpoint',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='The time the setpoint message has last been written.'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='datapointlastvalue',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='The time the value message has last been written.'),
+            preserve_default=False,
+        ),
+    ]
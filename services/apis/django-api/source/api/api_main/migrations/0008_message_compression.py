@@ -0,0 +1,70 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+MESSAGE_TABLES = [
+    "api_main_datapointvalue",
+    "api_main_datapointschedule",
+    "api_main_datapointsetpoint",
+]
+
+
+def is_timescale(schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_extension WHERE extname = 'timescaledb';"
+        )
+        return cursor.fetchone() is not None
+
+
+def enable_compression(apps, schema_editor):
+    """
+    Segmenting by datapoint stores the messages of each datapoint together,
+    which compresses well and lets per datapoint queries skip the others.
+    """
+    if not is_timescale(schema_editor):
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in MESSAGE_TABLES:
+            cursor.execute(
+                "ALTER TABLE %s SET (timescaledb.compress, "
+                "timescaledb.compress_segmentby = 'datapoint_id', "
+                "timescaledb.compress_orderby = 'time DESC');" % table
+            )
+
+
+def disable_compression(apps, schema_editor):
+    if not is_timescale(schema_editor):
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in MESSAGE_TABLES:
+            cursor.execute(
+                "SELECT remove_compression_policy('%s', if_exists => true);"
+                % table
+            )
+            cursor.execute(
+                "SELECT decompress_chunk(c, if_compressed => true) "
+                "FROM show_chunks('%s') c;" % table
+            )
+            cursor.execute(
+                "ALTER TABLE %s SET (timescaledb.compress = false);" % table
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_main', '0007_last_message_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datapoint',
+            name='retention_period',
+            field=models.DurationField(blank=True, default=None, help_text='If set, messages of this datapoint older than this period are deleted. Can only shorten the retention of the message type (TimescaleDB only, see the storage_policies command).', null=True),
+        ),
+        migrations.RunPython(enable_compression, disable_compression),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:10
+
+from django.conf import settings
+from django.db import migrations
+
+from api_main.hypertable_layout import apply_layout
+
+MESSAGE_TABLES = [
+    "api_main_datapointvalue",
+    "api_main_datapointschedule",
+    "api_main_datapointsetpoint",
+]
+
+
+def apply_message_hypertable_layout(apps, schema_editor):
+    """
+    Applies MESSAGE_SPACE_PARTITIONS and MESSAGE_CHUNK_TIME_INTERVAL, which
+    only works out for space partitions if the tables are still empty. Use
+    the `hypertable_layout` command to apply later changes.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_extension WHERE extname = 'timescaledb';"
+        )
+        if cursor.fetchone() is None:
+            return
+        for table in MESSAGE_TABLES:
+            apply_layout(
+                cursor,
+                table,
+                n_partitions=settings.MESSAGE_SPACE_PARTITIONS,
+                chunk_time_interval=settings.MESSAGE_CHUNK_TIME_INTERVAL,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_main', '0008_message_compression'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            apply_message_hypertable_layout, migrations.RunPython.noop
+        ),
+    ]
@@ -6,6 +6,7 @@ import json
 import math
 
 from django.db import models
+from timescale.db.models.managers import TimescaleManager
 
 from .connector import Connector
 from ems_utils.message_format.models import DatapointTemplate
@@ -15,6 +16,7 @@ from ems_utils.message_format.models import DatapointSetpointTemplate
 from ems_utils.message_format.models import DatapointLastSetpointTemplate
 from ems_utils.message_format.models import DatapointScheduleTemplate
 from ems_utils.message_format.models import DatapointLastScheduleTemplate
+from ems_utils.message_format.models import LastMessageModel
 
 
 class Datapoint(DatapointTemplate):
@@ -70,6 +72,16 @@ class Datapoint(DatapointTemplate):
             "mangeing datapoints, i.e. to specify the correct data format."
         ),
     )
+    retention_period = models.DurationField(
+        null=True,
+        blank=True,
+        default=None,
+        help_text=(
+            "If set, messages of this datapoint older than this period are "
+            "deleted. Can only shorten the retention of the message type "
+            "(TimescaleDB only, see the storage_policies command)."
+        ),
+    )
     # Delete this field, the API IS THE origin of meta data.
     exclude = ("origin_id",)
 
@@ -141,6 +153,70 @@ class DatapointValue(DatapointValueTemplate):
         help_text=("The datapoint that the value message belongs to."),
     )
 
+    # Continuous aggregates (TimescaleDB only) maintained for the numeric
+    # values. Keys are the bucket intervals, the values define the refresh
+    # policy. Created/updated by the `continuous_aggregates` management
+    # command, see also `api_main.continuous_aggregates`.
+    continuous_aggregates = {
+        "1 minute": {
+            "start_offset": "1 day",
+            "end_offset": "1 minute",
+            "schedule_interval": "1 minute",
+        },
+        "15 minutes": {
+            "start_offset": "7 days",
+            "end_offset": "15 minutes",
+            "schedule_interval": "5 minutes",
+        },
+        "1 hour": {
+            "start_offset": "30 days",
+            "end_offset": "1 hour",
+            "schedule_interval": "30 minutes",
+        },
+        "1 day": {
+            "start_offset": "90 days",
+            "end_offset": "1 day",
+            "schedule_interval": "1 hour",
+        },
+    }
+
+
+class DatapointValueAggregate(models.Model):
+    """
+    Read only access to the continuous aggregates of DatapointValue.
+
+    This is backed by a DB view (created by the `continuous_aggregates`
+    management command) which holds one row per datapoint, bucket and
+    aggregate interval. Note that the view has no id column, i.e. this
+    model can only be used with `values()` or aggregations.
+    """
+
+    class Meta:
+        managed = False
+        db_table = "api_main_datapointvalue_aggregate"
+
+    objects = models.Manager()
+    timescale = TimescaleManager()
+
+    datapoint = models.ForeignKey(
+        Datapoint,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+        help_text=("The datapoint that the aggregate belongs to."),
+    )
+    time = models.DateTimeField(help_text=("The start of the bucket."))
+    bucket_interval = models.TextField(
+        help_text=("The interval of the continuous aggregate."),
+    )
+    value_avg = models.FloatField(null=True)
+    value_min = models.FloatField(null=True)
+    value_max = models.FloatField(null=True)
+    value_count = models.BigIntegerField()
+    message_count = models.BigIntegerField(
+        help_text=("The number of all value messages in the bucket."),
+    )
+
 
 class DatapointLastValue(DatapointLastValueTemplate):
     """
@@ -173,6 +249,19 @@ class DatapointLastValue(DatapointLastValueTemplate):
 
         models.Model.save(self, *args, **kwargs)
 
+    @staticmethod
+    def bulk_update_or_create(model, msgs):
+        """
+        Handle NaN and Inf/-Inf float values like `save`.
+        """
+        for msg in msgs:
+            v = msg.get("value")
+            if v is not None and isinstance(v, float):
+                if math.isnan(v) or v == float("inf") or v == float("-inf"):
+                    msg["value"] = json.dumps(v)
+
+        return LastMessageModel.bulk_update_or_create(model=model, msgs=msgs)
+
 
 class DatapointSchedule(DatapointScheduleTemplate):
     """
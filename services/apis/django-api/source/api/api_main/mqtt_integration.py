@@ -431,42 +431,6 @@ class MqttToDb:
         """
         return Datapoint.objects.get(id=id)
 
-    @ttl_cache(maxsize=None, ttl=15 * 60)
-    def get_datapoint_last_value_by_id(self, id):
-        """
-        This is a simple wrapper that acts as a cache.
-
-        The ttl ensures that we refreash every 15 Minutes from the DB.
-        """
-        datapoint = self.get_datapoint_by_id(id)
-        return DatapointLastValue.objects.get_or_create(datapoint=datapoint)[0]
-
-    @ttl_cache(maxsize=None, ttl=15 * 60)
-    def get_datapoint_last_schedule_by_id(self, id):
-        """
-        This is a simple wrapper that acts as a cache.
-
-        The ttl ensures that we refreash every 15 Minutes from the DB.
-        """
-        datapoint = self.get_datapoint_by_id(id)
-        object, _ = DatapointLastSchedule.objects.get_or_create(
-            datapoint=datapoint
-        )
-        return object
-
-    @ttl_cache(maxsize=None, ttl=15 * 60)
-    def get_datapoint_last_setpoint_by_id(self, id):
-        """
-        This is a simple wrapper that acts as a cache.
-
-        The ttl ensures that we refreash every 15 Minutes from the DB.
-        """
-        datapoint = self.get_datapoint_by_id(id)
-        object, _ = DatapointLastSetpoint.objects.get_or_create(
-            datapoint=datapoint
-        )
-        return object
-
     def message_handle_worker(self):
         """
         Handle queued mqtt messages by writing to appropriate DB tables.
@@ -567,15 +531,20 @@ class MqttToDb:
                                 "datapoint with id %s and timestamp %s"
                                 % (datapoint.id, timestamp)
                             )
-                    # Store this messages as most recent message. We do not
-                    # expect an replay of old messages via MQTT or similar.
-                    # Hence just save should be fine.
-                    last_value = self.get_datapoint_last_value_by_id(
-                        id=datapoint_id
+                    # Store this messages as most recent message. Several
+                    # worker threads may process messages of the same
+                    # datapoint out of order, hence the newest message must
+                    # win, which is checked within the DB.
+                    DatapointLastValue.bulk_update_or_create(
+                        model=DatapointLastValue,
+                        msgs=[
+                            {
+                                "datapoint": datapoint,
+                                "value": payload["value"],
+                                "time": timestamp,
+                            }
+                        ],
                     )
-                    last_value.value = payload["value"]
-                    last_value.time = timestamp
-                    last_value.save()
                 except Exception:
                     logger.exception(
                         "Exception while writing datapoint value to DB.\n"
@@ -607,12 +576,16 @@ class MqttToDb:
                                 "datapoint with id %s and timestamp %s"
                                 % (datapoint.id, timestamp)
                             )
-                    last_schedule = self.get_datapoint_last_schedule_by_id(
-                        id=datapoint_id
+                    DatapointLastSchedule.bulk_update_or_create(
+                        model=DatapointLastSchedule,
+                        msgs=[
+                            {
+                                "datapoint": datapoint,
+                                "schedule": payload["schedule"],
+                                "time": timestamp,
+                            }
+                        ],
                     )
-                    last_schedule.schedule = payload["schedule"]
-                    last_schedule.time = timestamp
-                    last_schedule.save()
                 except Exception:
                     logger.exception(
                         "Exception while writing datapoint schedule to DB.\n"
@@ -644,12 +617,16 @@ class MqttToDb:
                                 "datapoint with id %s and timestamp %s"
                                 % (datapoint.id, timestamp)
                             )
-                    last_setpoint = self.get_datapoint_last_setpoint_by_id(
-                        id=datapoint_id
+                    DatapointLastSetpoint.bulk_update_or_create(
+                        model=DatapointLastSetpoint,
+                        msgs=[
+                            {
+                                "datapoint": datapoint,
+                                "setpoint": payload["setpoint"],
+                                "time": timestamp,
+                            }
+                        ],
                     )
-                    last_setpoint.setpoint = payload["setpoint"]
-                    last_setpoint.time = timestamp
-                    last_setpoint.save()
                 except Exception:
                     logger.exception(
                         "Exception while writing datapoint setpoint to DB.\n"
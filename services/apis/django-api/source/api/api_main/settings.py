@@ -35,6 +35,10 @@ ACTIVATE_HISTORY_EXTENSION = False
 if (os.getenv("ACTIVATE_HISTORY_EXTENSION") or "FALSE").lower() == "true":
     ACTIVATE_HISTORY_EXTENSION = True
 
+ACTIVATE_PUSH_INTERFACE = False
+if (os.getenv("ACTIVATE_PUSH_INTERFACE") or "FALSE").lower() == "true":
+    ACTIVATE_PUSH_INTERFACE = True
+
 # ------------------------------------------------------------------------------
 # Settings for mqtt_integration.py
 # ------------------------------------------------------------------------------
@@ -43,6 +47,9 @@ if (os.getenv("ACTIVATE_HISTORY_EXTENSION") or "FALSE").lower() == "true":
 MQTT_BROKER_HOST = os.getenv("MQTT_BROKER_HOST")
 MQTT_BROKER_PORT = int(os.getenv("MQTT_BROKER_PORT") or 1883)
 N_MTD_WRITE_THREADS = int(os.getenv("N_MTD_WRITE_THREADS") or 1)
+# The number of messages the push interface queues per client before
+# messages are dropped because the client is too slow.
+PUSH_MAX_QUEUED_MESSAGES = int(os.getenv("PUSH_MAX_QUEUED_MESSAGES") or 1000)
 
 # Settings for connection to MQTT broker.
 MQTT_BROKER = {"host": MQTT_BROKER_HOST, "port": MQTT_BROKER_PORT}
@@ -102,11 +109,13 @@ INSTALLED_APPS = [
     "api_main.apps.ApiMainConfig",
     "api_admin_ui.apps.ApiAdminUiConfig",
     "api_rest_interface.apps.ApiRestInterfaceConfig",
+    "api_push_interface.apps.ApiPushInterfaceConfig",
 ]
 
 MIDDLEWARE = [
     "django_prometheus.middleware.PrometheusBeforeMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "ems_utils.compression.CompressionMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -151,6 +160,17 @@ if os.getenv("DJANGOAPIDB_HOST"):
             "NAME": os.getenv("DJANGOAPIDB_DBNAME") or "bemcom",
         }
     }
+    # Optional streaming replicas of the DB above, used to serve history
+    # reads, see api_main/db_routers.py
+    replica_hosts = os.getenv("DJANGOAPIDB_REPLICA_HOSTS") or ""
+    for i, replica_host in enumerate(replica_hosts.split(",")):
+        if not replica_host.strip():
+            continue
+        DATABASES["replica_%s" % i] = dict(
+            DATABASES["default"],
+            HOST=replica_host.strip(),
+            TEST={"MIRROR": "default"},
+        )
 else:
     DATABASES = {
         "default": {
@@ -159,6 +179,40 @@ else:
         }
     }
 
+# If TRUE time bucket requests for datapoint values are served from the
+# continuous aggregates (TimescaleDB only) where possible. The aggregates must
+# be created with the `continuous_aggregates` management command first.
+USE_CONTINUOUS_AGGREGATES = False
+if (os.getenv("USE_CONTINUOUS_AGGREGATES") or "FALSE").lower() == "true":
+    USE_CONTINUOUS_AGGREGATES = True
+
+# Compression and retention policies of the message hypertables (TimescaleDB
+# only), applied by the `storage_policies` management command. Keys are the
+# message types, values are PostgreSQL intervals or null to disable the
+# policy. Overrides must be JSON strings, e.g. '{"value": "30 days"}'.
+MESSAGE_COMPRESS_AFTER = {
+    "value": "7 days",
+    "schedule": "7 days",
+    "setpoint": "7 days",
+}
+MESSAGE_COMPRESS_AFTER.update(
+    json.loads(os.getenv("MESSAGE_COMPRESS_AFTER") or "{}")
+)
+MESSAGE_DROP_AFTER = {"value": None, "schedule": None, "setpoint": None}
+MESSAGE_DROP_AFTER.update(json.loads(os.getenv("MESSAGE_DROP_AFTER") or "{}"))
+
+# Layout of the message hypertables (TimescaleDB only), see
+# api_main/hypertable_layout.py. Space partitions on the datapoint can only
+# be added while the tables are empty, i.e. before the first start.
+MESSAGE_SPACE_PARTITIONS = int(os.getenv("MESSAGE_SPACE_PARTITIONS") or 0)
+MESSAGE_CHUNK_TIME_INTERVAL = os.getenv("MESSAGE_CHUNK_TIME_INTERVAL") or None
+
+DATABASE_REPLICAS = [a for a in DATABASES if a.startswith("replica_")]
+DATABASE_ROUTERS = ["api_main.db_routers.ReadReplicaRouter"]
+# Replicas lagging more seconds behind the primary DB are not used.
+DATABASE_REPLICA_MAX_LAG = float(os.getenv("DJANGOAPIDB_REPLICA_MAX_LAG") or 5)
+DATABASE_REPLICA_LAG_CHECK_INTERVAL = 5
+
 # This is just here to silence some warnings and make explicit what
 # django < 3.2 has always done. See:
 # https://docs.djangoproject.com/en/3.2/ref/settings/#std:setting-DEFAULT_AUTO_FIELD
@@ -248,6 +302,24 @@ if (os.getenv("HTTPS_ONLY") or "FALSE").lower() == "true":
 # Special settings for REST API
 # ------------------------------------------------------------------------------
 
+# If TRUE the read endpoints for datapoint messages are served by async views
+# that execute the queries in a thread pool. Under ASGI all sync views of a
+# process share a single thread, hence slow history requests would else block
+# all other requests of the process.
+ASYNC_READ_ENDPOINTS = True
+if (os.getenv("ASYNC_READ_ENDPOINTS") or "TRUE").lower() == "false":
+    ASYNC_READ_ENDPOINTS = False
+
+# Responses smaller than this number of bytes are not compressed.
+RESPONSE_COMPRESSION_MIN_SIZE = int(
+    os.getenv("RESPONSE_COMPRESSION_MIN_SIZE") or 1024
+)
+# Compression levels overriding the defaults of the encodings, which are
+# gzip: 6, br: 4 and zstd: 3. Must be a JSON string, e.g. '{"gzip": 9}'
+RESPONSE_COMPRESSION_LEVELS = json.loads(
+    os.getenv("RESPONSE_COMPRESSION_LEVELS") or "{}"
+)
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.BasicAuthentication",
@@ -257,6 +329,10 @@ REST_FRAMEWORK = {
         "api_rest_interface.permissions.DjangoModelPermissionWithViewRestricted"
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        "ems_utils.message_format.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
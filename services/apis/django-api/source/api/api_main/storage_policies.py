@@ -0,0 +1,197 @@
+"""
+Helpers to maintain the TimescaleDB compression and retention policies of
+the message hypertables.
+
+Compression itself is enabled by a migration (segmented by datapoint and
+ordered by time, i.e. the compressed chunks hold the messages of each
+datapoint as one sorted run). The policies that compress and drop chunks
+once these have reached a certain age are configured per message type with
+`settings.MESSAGE_COMPRESS_AFTER` and `settings.MESSAGE_DROP_AFTER` and
+created/updated with the `storage_policies` management command.
+
+Datapoints may shorten the retention of their messages further with
+`Datapoint.retention_period`. As chunks hold the messages of all
+datapoints, these are deleted row wise by a TimescaleDB job instead.
+"""
+from django.db import connection
+from prometheus_client.core import CounterMetricFamily
+from prometheus_client.core import GaugeMetricFamily
+
+from api_main.models.datapoint import Datapoint
+from api_main.models.datapoint import DatapointValue
+from api_main.models.datapoint import DatapointSchedule
+from api_main.models.datapoint import DatapointSetpoint
+
+MESSAGE_MODELS = {
+    "value": DatapointValue,
+    "schedule": DatapointSchedule,
+    "setpoint": DatapointSetpoint,
+}
+
+# Name and schedule of the TimescaleDB job applying
+# `Datapoint.retention_period`.
+DATAPOINT_RETENTION_PROCEDURE = "api_main_apply_datapoint_retention"
+DATAPOINT_RETENTION_SCHEDULE = "1 hour"
+
+# Maps the procedures of the TimescaleDB jobs to the policy label of the
+# Prometheus metrics.
+POLICY_NAMES = {
+    "policy_compression": "compression",
+    "policy_retention": "retention",
+    DATAPOINT_RETENTION_PROCEDURE: "datapoint_retention",
+}
+
+
+def compression_policy_sql(model, compress_after):
+    """
+    Returns the SQL statements that replace the compression policy of
+    `model`. The policy is only removed if `compress_after` is None.
+    """
+    table = model._meta.db_table
+    statements = [
+        "SELECT remove_compression_policy('%s', if_exists => true);" % table
+    ]
+    if compress_after is not None:
+        statements.append(
+            "SELECT add_compression_policy('%s', INTERVAL '%s');"
+            % (table, compress_after)
+        )
+    return statements
+
+
+def retention_policy_sql(model, drop_after):
+    """
+    Returns the SQL statements that replace the retention policy of
+    `model`. The policy is only removed if `drop_after` is None.
+    """
+    table = model._meta.db_table
+    statements = [
+        "SELECT remove_retention_policy('%s', if_exists => true);" % table
+    ]
+    if drop_after is not None:
+        statements.append(
+            "SELECT add_retention_policy('%s', INTERVAL '%s');"
+            % (table, drop_after)
+        )
+    return statements
+
+
+def datapoint_retention_sql(remove=False):
+    """
+    Returns the SQL statements that (re)create the procedure applying
+    `Datapoint.retention_period` and the job that calls it regularly.
+    If `remove` is True the statements remove both instead.
+    """
+    remove_job_sql = (
+        "SELECT delete_job(job_id) FROM timescaledb_information.jobs "
+        "WHERE proc_name = '%s';" % DATAPOINT_RETENTION_PROCEDURE
+    )
+    if remove:
+        return [
+            remove_job_sql,
+            "DROP PROCEDURE IF EXISTS %s;" % DATAPOINT_RETENTION_PROCEDURE,
+        ]
+
+    deletes = []
+    for model in MESSAGE_MODELS.values():
+        deletes.append(
+            "DELETE FROM {table} AS m USING {datapoint_table} AS d "
+            "WHERE m.datapoint_id = d.id "
+            "AND d.retention_period IS NOT NULL "
+            "AND m.time < now() - d.retention_period;".format(
+                table=model._meta.db_table,
+                datapoint_table=Datapoint._meta.db_table,
+            )
+        )
+    create_procedure_sql = (
+        "CREATE OR REPLACE PROCEDURE {name}(job_id int, config jsonb) "
+        "LANGUAGE plpgsql AS $$ BEGIN {deletes} END $$;"
+    ).format(name=DATAPOINT_RETENTION_PROCEDURE, deletes=" ".join(deletes))
+    # Replace the job to apply changes of the schedule.
+    add_job_sql = "SELECT add_job('%s', INTERVAL '%s');" % (
+        DATAPOINT_RETENTION_PROCEDURE,
+        DATAPOINT_RETENTION_SCHEDULE,
+    )
+    return [create_procedure_sql, remove_job_sql, add_job_sql]
+
+
+class StorageMetricsCollector:
+    """
+    Exposes the state of compression and retention of the message
+    hypertables as Prometheus metrics. The state lives in DB, hence this
+    queries it on every scrape, which works with the multiprocess mode too.
+    """
+
+    def collect(self):
+        labels = ["table"]
+        chunks = GaugeMetricFamily(
+            "bemcom_djangoapi_hypertable_chunks",
+            "Number of chunks of the message hypertable.",
+            labels=labels,
+        )
+        compressed_chunks = GaugeMetricFamily(
+            "bemcom_djangoapi_hypertable_compressed_chunks",
+            "Number of compressed chunks of the message hypertable.",
+            labels=labels,
+        )
+        bytes_before = GaugeMetricFamily(
+            "bemcom_djangoapi_hypertable_compressed_chunks_bytes_before",
+            "Size of the compressed chunks before compression.",
+            labels=labels,
+        )
+        bytes_after = GaugeMetricFamily(
+            "bemcom_djangoapi_hypertable_compressed_chunks_bytes_after",
+            "Size of the compressed chunks after compression.",
+            labels=labels,
+        )
+        labels = ["table", "policy"]
+        job_failures = CounterMetricFamily(
+            "bemcom_djangoapi_storage_policy_failures",
+            "Total number of failed runs of the storage policy job.",
+            labels=labels,
+        )
+        job_last_success = GaugeMetricFamily(
+            "bemcom_djangoapi_storage_policy_last_success_timestamp_seconds",
+            "Time of the last successful run of the storage policy job.",
+            labels=labels,
+        )
+
+        with connection.cursor() as cursor:
+            for model in MESSAGE_MODELS.values():
+                table = model._meta.db_table
+                cursor.execute(
+                    "SELECT total_chunks, number_compressed_chunks, "
+                    "before_compression_total_bytes, "
+                    "after_compression_total_bytes "
+                    "FROM hypertable_compression_stats(%s::regclass);",
+                    [table],
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    continue
+                chunks.add_metric([table], row[0] or 0)
+                compressed_chunks.add_metric([table], row[1] or 0)
+                bytes_before.add_metric([table], row[2] or 0)
+                bytes_after.add_metric([table], row[3] or 0)
+
+            cursor.execute(
+                "SELECT j.hypertable_name, j.proc_name, s.total_failures, "
+                "extract(epoch FROM s.last_successful_finish) "
+                "FROM timescaledb_information.jobs AS j "
+                "JOIN timescaledb_information.job_stats AS s "
+                "ON s.job_id = j.job_id "
+                "WHERE j.proc_name = ANY(%s);",
+                [list(POLICY_NAMES)],
+            )
+            for table, proc_name, failures, last_success in cursor.fetchall():
+                labels = [table or "", POLICY_NAMES[proc_name]]
+                job_failures.add_metric(labels, failures or 0)
+                if last_success is not None:
+                    job_last_success.add_metric(labels, float(last_success))
+
+        yield chunks
+        yield compressed_chunks
+        yield bytes_before
+        yield bytes_after
+        yield job_failures
+        yield job_last_success
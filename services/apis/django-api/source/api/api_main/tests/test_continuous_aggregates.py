@@ -0,0 +1,124 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.test import override_settings
+
+from api_main.continuous_aggregates import parse_interval
+from api_main.continuous_aggregates import select_continuous_aggregate
+from api_main.models.datapoint import DatapointValue
+from api_main.models.datapoint import DatapointValueAggregate
+from api_rest_interface.filters import DatapointValueFilter
+
+
+AGGREGATE_INTERVALS = ["1 minute", "15 minutes", "1 hour", "1 day"]
+
+
+class TestParseInterval(TestCase):
+    def test_simple_intervals_parsed(self):
+        self.assertEqual(parse_interval("15 minutes"), timedelta(minutes=15))
+        self.assertEqual(parse_interval("1 hour"), timedelta(hours=1))
+        self.assertEqual(parse_interval("2 days"), timedelta(days=2))
+        self.assertEqual(parse_interval("1 week"), timedelta(weeks=1))
+
+    def test_compound_interval_parsed(self):
+        expected_interval = timedelta(hours=1, minutes=30)
+        actual_interval = parse_interval("1 hour 30 minutes")
+        self.assertEqual(expected_interval, actual_interval)
+
+    def test_variable_length_and_invalid_intervals_rejected(self):
+        self.assertIsNone(parse_interval("1 month"))
+        self.assertIsNone(parse_interval("1 year"))
+        self.assertIsNone(parse_interval("fifteen minutes"))
+        self.assertIsNone(parse_interval("0 minutes"))
+        self.assertIsNone(parse_interval(""))
+        self.assertIsNone(parse_interval(None))
+
+
+class TestSelectContinuousAggregate(TestCase):
+    def test_coarsest_matching_aggregate_selected(self):
+        self.assertEqual(
+            select_continuous_aggregate("1 hour", AGGREGATE_INTERVALS),
+            "1 hour",
+        )
+        self.assertEqual(
+            select_continuous_aggregate("2 hours", AGGREGATE_INTERVALS),
+            "1 hour",
+        )
+        self.assertEqual(
+            select_continuous_aggregate("45 minutes", AGGREGATE_INTERVALS),
+            "15 minutes",
+        )
+        self.assertEqual(
+            select_continuous_aggregate("7 minutes", AGGREGATE_INTERVALS),
+            "1 minute",
+        )
+
+    def test_no_aggregate_for_unsupported_intervals(self):
+        self.assertIsNone(
+            select_continuous_aggregate("30 seconds", AGGREGATE_INTERVALS)
+        )
+        self.assertIsNone(
+            select_continuous_aggregate("90 seconds", AGGREGATE_INTERVALS)
+        )
+        self.assertIsNone(
+            select_continuous_aggregate("1 month", AGGREGATE_INTERVALS)
+        )
+
+    def test_unaligned_timestamps_select_finer_aggregate(self):
+        # 2022-01-01T00:00:00Z, 2022-01-01T10:15:00Z and
+        # 2022-01-01T10:15:30Z.
+        ts_day = 1640995200000
+        ts_quarter = 1641032100000
+        ts_unaligned = 1641032130000
+
+        self.assertEqual(
+            select_continuous_aggregate(
+                "1 day", AGGREGATE_INTERVALS, timestamps=[ts_day]
+            ),
+            "1 day",
+        )
+        self.assertEqual(
+            select_continuous_aggregate(
+                "1 day", AGGREGATE_INTERVALS, timestamps=[ts_day, ts_quarter]
+            ),
+            "15 minutes",
+        )
+        self.assertIsNone(
+            select_continuous_aggregate(
+                "1 day", AGGREGATE_INTERVALS, timestamps=[ts_unaligned]
+            )
+        )
+
+
+class TestDatapointValueFilterRouting(TestCase):
+    def filter(self, query_params):
+        filterset = DatapointValueFilter(
+            data=query_params, queryset=DatapointValue.timescale.all()
+        )
+        self.assertTrue(filterset.is_valid())
+        return filterset.qs
+
+    @override_settings(USE_CONTINUOUS_AGGREGATES=True)
+    def test_time_bucket_served_from_aggregate(self):
+        queryset = self.filter({"interval": "1 hour"})
+        self.assertIs(queryset.model, DatapointValueAggregate)
+        sql = str(queryset.query)
+        self.assertIn("time_bucket", sql)
+        self.assertIn("value_count", sql)
+
+    @override_settings(USE_CONTINUOUS_AGGREGATES=True)
+    def test_raw_values_used_for_inexact_bounds(self):
+        queryset = self.filter(
+            {"interval": "1 hour", "timestamp__lte": 1640995200000}
+        )
+        self.assertIs(queryset.model, DatapointValue)
+
+    @override_settings(USE_CONTINUOUS_AGGREGATES=True)
+    def test_raw_values_used_without_interval(self):
+        queryset = self.filter({"timestamp__gte": 1640995200000})
+        self.assertIs(queryset.model, DatapointValue)
+
+    @override_settings(USE_CONTINUOUS_AGGREGATES=False)
+    def test_raw_values_used_if_deactivated(self):
+        queryset = self.filter({"interval": "1 hour"})
+        self.assertIs(queryset.model, DatapointValue)
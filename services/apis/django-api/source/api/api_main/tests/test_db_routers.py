@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+from django.db import DatabaseError
+from django.test import RequestFactory
+from django.test import SimpleTestCase
+from django.test import override_settings
+
+from api_main.db_routers import ReadReplicaRouter
+from api_main.db_routers import replica_reads
+from api_main.models.datapoint import DatapointValue
+from api_main.models.datapoint import DatapointLastValue
+
+
+@override_settings(
+    DATABASE_REPLICAS=["replica_0"],
+    DATABASE_REPLICA_MAX_LAG=5,
+    DATABASE_REPLICA_LAG_CHECK_INTERVAL=5,
+)
+class TestReadReplicaRouter(SimpleTestCase):
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+        self.request_factory = RequestFactory()
+
+    def db_for_read_in_view(self, model, method="get"):
+        """
+        Returns the DB the router selects for `model` while serving a
+        request with `method` by a view decorated with `replica_reads`.
+        """
+
+        @replica_reads
+        def view(request):
+            return self.router.db_for_read(model)
+
+        request = getattr(self.request_factory, method)("/")
+        return view(request)
+
+    @patch("api_main.db_routers.replica_lag", return_value=0)
+    def test_history_reads_of_read_requests_routed_to_replica(self, _):
+        self.assertEqual(self.db_for_read_in_view(DatapointValue), "replica_0")
+
+    @patch("api_main.db_routers.replica_lag", return_value=0)
+    def test_other_reads_stay_on_primary(self, _):
+        # Not in a read only view, like e.g. in MqttToDb.
+        self.assertIsNone(self.router.db_for_read(DatapointValue))
+        self.assertIsNone(self.db_for_read_in_view(DatapointLastValue))
+        self.assertIsNone(self.db_for_read_in_view(DatapointValue, "put"))
+        self.assertEqual(self.router.db_for_write(DatapointValue), "default")
+
+    @patch("api_main.db_routers.replica_lag", return_value=60)
+    def test_lagging_replica_not_used(self, _):
+        self.assertIsNone(self.db_for_read_in_view(DatapointValue))
+
+    @patch("api_main.db_routers.replica_lag", side_effect=DatabaseError)
+    def test_unreachable_replica_not_used(self, _):
+        self.assertIsNone(self.db_for_read_in_view(DatapointValue))
+
+    @patch("api_main.db_routers.replica_lag", return_value=0)
+    def test_lag_checked_only_once_per_interval(self, replica_lag):
+        self.db_for_read_in_view(DatapointValue)
+        self.db_for_read_in_view(DatapointValue)
+
+        self.assertEqual(replica_lag.call_count, 1)
@@ -0,0 +1,102 @@
+import gzip
+import tempfile
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from api_main import direct_backup
+from api_main.direct_backup import iter_file_rows
+from api_main.direct_backup import message_file_path
+from api_main.direct_backup import row_to_msg
+from ems_utils.timestamp import datetime_from_timestamp
+
+
+# Like the output of COPY ... WITH (FORMAT csv, HEADER) of the value table.
+# NULL is an empty field, the JSON column holds the text of the jsonb.
+VALUE_CSV = (
+    "datapoint_id,timestamp,value,_value_float,_value_bool\n"
+    "1,1640995200000,,21.5,\n"
+    "1,1640995260000,,,t\n"
+    '2,1640995200000,"""on""",,\n'
+    "2,1640995260000,,,\n"
+)
+
+
+class TestExportedFiles(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.fnp = message_file_path(
+            Path(self.tmp_dir.name), date(2022, 1, 1), "value", "csv"
+        )
+        self.fnp.parent.mkdir()
+        with gzip.open(self.fnp, "wt") as f:
+            f.write(VALUE_CSV)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_file_path(self):
+        self.assertEqual(self.fnp.parent.name, "2022-01-01")
+        self.assertEqual(self.fnp.name, "dbcopy_2022-01-01_value.csv.gz")
+
+    def test_value_rows_converted_to_msgs(self):
+        msgs = [
+            row_to_msg("value", row, datapoint_id=row["datapoint_id"] + 10)
+            for row in iter_file_rows(self.fnp)
+        ]
+
+        expected_msgs = [
+            {
+                "datapoint_id": 11,
+                "time": datetime_from_timestamp(1640995200000),
+                "value": 21.5,
+            },
+            {
+                "datapoint_id": 11,
+                "time": datetime_from_timestamp(1640995260000),
+                "value": True,
+            },
+            {
+                "datapoint_id": 12,
+                "time": datetime_from_timestamp(1640995200000),
+                "value": "on",
+            },
+            {
+                "datapoint_id": 12,
+                "time": datetime_from_timestamp(1640995260000),
+                "value": None,
+            },
+        ]
+        self.assertEqual(msgs, expected_msgs)
+
+    def test_schedule_parsed_from_json(self):
+        row = {
+            "datapoint_id": 1,
+            "timestamp": 1640995200000,
+            "schedule": '[{"from_timestamp": null, "value": 21}]',
+        }
+        msg = row_to_msg("schedule", row, datapoint_id=1)
+        self.assertEqual(
+            msg["schedule"], [{"from_timestamp": None, "value": 21}]
+        )
+
+
+class TestDirectDbBackupCommand(SimpleTestCase):
+    def test_parquet_without_pyarrow_rejected(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with mock.patch.object(direct_backup, "pyarrow", None):
+                with self.assertRaisesRegex(CommandError, "require pyarrow"):
+                    call_command(
+                        "direct_db_backup",
+                        "--backup",
+                        "--data-directory",
+                        tmp_dir,
+                        "--start-date",
+                        "2022-01-01",
+                        "--format",
+                        "parquet",
+                    )
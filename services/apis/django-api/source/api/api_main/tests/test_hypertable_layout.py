@@ -0,0 +1,29 @@
+from django.test import SimpleTestCase
+
+from api_main.hypertable_layout import classify_indexes
+
+
+class TestClassifyIndexes(SimpleTestCase):
+    def test_datapoint_time_index_found(self):
+        index_columns = {
+            "value_time_idx": ["time"],
+            "value_datapoint_id_idx": ["datapoint_id"],
+            "value_unique": ["datapoint_id", "time"],
+        }
+
+        matching, redundant = classify_indexes(index_columns)
+
+        self.assertEqual(matching, ["value_unique"])
+        self.assertEqual(redundant, ["value_datapoint_id_idx"])
+
+    def test_other_column_orders_dont_match(self):
+        index_columns = {
+            "value_time_datapoint_idx": ["time", "datapoint_id"],
+            "value_datapoint_id_idx": ["datapoint_id"],
+        }
+
+        matching, redundant = classify_indexes(index_columns)
+
+        self.assertEqual(matching, [])
+        # Not redundant without a matching index.
+        self.assertEqual(redundant, [])
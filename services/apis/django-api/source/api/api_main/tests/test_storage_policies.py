@@ -0,0 +1,40 @@
+from django.test import SimpleTestCase
+
+from api_main.models.datapoint import DatapointValue
+from api_main.storage_policies import DATAPOINT_RETENTION_PROCEDURE
+from api_main.storage_policies import compression_policy_sql
+from api_main.storage_policies import datapoint_retention_sql
+from api_main.storage_policies import retention_policy_sql
+
+
+class TestStoragePolicySql(SimpleTestCase):
+    def test_policies_replaced(self):
+        statements = compression_policy_sql(DatapointValue, "7 days")
+        self.assertEqual(len(statements), 2)
+        self.assertIn("remove_compression_policy", statements[0])
+        self.assertIn("add_compression_policy", statements[1])
+        self.assertIn("INTERVAL '7 days'", statements[1])
+
+        statements = retention_policy_sql(DatapointValue, "5 years")
+        self.assertIn("remove_retention_policy", statements[0])
+        self.assertIn("INTERVAL '5 years'", statements[1])
+
+    def test_disabled_policies_only_removed(self):
+        statements = compression_policy_sql(DatapointValue, None)
+        statements += retention_policy_sql(DatapointValue, None)
+        self.assertEqual(len(statements), 2)
+        self.assertTrue(all("remove_" in s for s in statements))
+
+    def test_datapoint_retention_deletes_from_all_message_tables(self):
+        create_procedure_sql = datapoint_retention_sql()[0]
+        self.assertIn(DATAPOINT_RETENTION_PROCEDURE, create_procedure_sql)
+        for table in [
+            "api_main_datapointvalue",
+            "api_main_datapointschedule",
+            "api_main_datapointsetpoint",
+        ]:
+            self.assertIn("DELETE FROM %s " % table, create_procedure_sql)
+
+        statements = datapoint_retention_sql(remove=True)
+        self.assertIn("delete_job", statements[0])
+        self.assertIn("DROP PROCEDURE", statements[1])
@@ -0,0 +1,65 @@
+from django.test import SimpleTestCase
+
+from api_main.value_statistics import combine_statistics
+from api_main.value_statistics import select_aggregated
+from ems_utils.timestamp import datetime_from_timestamp
+
+
+class TestCombineStatistics(SimpleTestCase):
+    def test_aggregated_and_raw_parts_combined(self):
+        # 2022-01-01T00:00:00Z
+        ts_start = 1640995200000
+        first_last = {
+            1: (
+                datetime_from_timestamp(ts_start),
+                datetime_from_timestamp(ts_start + 2 * 3600000),
+            )
+        }
+        # The aggregated part has only numeric values.
+        aggregated = {1: (4, 4, 1.0, 5.0, 12.0)}
+        # The raw part has one message with a non numeric value.
+        raw = {1: (3, 2, 0.0, 3.0, 3.0)}
+
+        statistics_by_id = combine_statistics([1], first_last, aggregated, raw)
+
+        expected_statistics = {
+            "count": 7,
+            "first_timestamp": ts_start,
+            "last_timestamp": ts_start + 2 * 3600000,
+            "min": 0.0,
+            "max": 5.0,
+            "mean": 2.5,
+            "message_rate": 3.5,
+        }
+        self.assertEqual(statistics_by_id[1], expected_statistics)
+
+    def test_datapoint_without_messages(self):
+        statistics_by_id = combine_statistics([1], {}, {}, {})
+
+        self.assertEqual(statistics_by_id[1]["count"], 0)
+        self.assertIsNone(statistics_by_id[1]["first_timestamp"])
+        self.assertIsNone(statistics_by_id[1]["mean"])
+        self.assertIsNone(statistics_by_id[1]["message_rate"])
+
+
+class TestSelectAggregated(SimpleTestCase):
+    def test_only_fully_covered_datapoints_selected(self):
+        # 2022-01-01T00:00:00Z
+        ts_start = 1640995200000
+        first_bucket = datetime_from_timestamp(ts_start)
+        cutoff = datetime_from_timestamp(ts_start + 3600000)
+        first_last = {
+            # The first message is in the first bucket.
+            1: (datetime_from_timestamp(ts_start + 60000), cutoff),
+            # The bucket of the first message has not been materialized.
+            2: (datetime_from_timestamp(ts_start - 86400000), cutoff),
+        }
+        aggregate_rows = [
+            (1, first_bucket, cutoff, 5, 4, 1.0, 5.0, 12.0),
+            (2, first_bucket, cutoff, 5, 4, 1.0, 5.0, 12.0),
+        ]
+
+        aggregated, cutoffs = select_aggregated(aggregate_rows, first_last)
+
+        self.assertEqual(aggregated, {1: (5, 4, 1.0, 5.0, 12.0)})
+        self.assertEqual(cutoffs, {1: cutoff})
@@ -0,0 +1,356 @@
+"""
+Statistics of the value messages of datapoints, e.g. to size storage, to
+plan retention or to spot datapoints that stopped receiving messages.
+
+Computing these with COUNT, MIN and MAX requires a scan over all value
+messages of a datapoint, which takes ages on large tables. On TimescaleDB
+the statistics are hence assembled from cheap sources instead:
+  - The first and last timestamp are index lookups.
+  - Count, min, max and mean are combined from the coarsest continuous
+    aggregate. Only the messages since the last bucket of the aggregate
+    are aggregated from the raw data. Datapoints whose history is not
+    fully covered by the aggregate (e.g. as older data has never been
+    materialized) are aggregated from the raw data completely.
+  - The statistics of the whole table are taken from the chunk metadata
+    and `approximate_row_count`.
+Other DBs (e.g. SQLite in tests) compute the exact values the slow way.
+"""
+from django.conf import settings
+from django.db.models import Avg
+from django.db.models import Count
+from django.db.models import Max
+from django.db.models import Min
+
+from api_main.continuous_aggregates import continuous_aggregate_view_name
+from api_main.continuous_aggregates import existing_continuous_aggregates
+from api_main.continuous_aggregates import parse_interval
+from api_main.models.datapoint import DatapointValue
+from api_main.models.datapoint import DatapointValueAggregate
+from ems_utils.timestamp import timestamps_ms
+
+FIRST_AND_LAST_SQL = (
+    "SELECT d.id, "
+    "(SELECT time FROM {table} WHERE datapoint_id = d.id "
+    "ORDER BY time ASC LIMIT 1), "
+    "(SELECT time FROM {table} WHERE datapoint_id = d.id "
+    "ORDER BY time DESC LIMIT 1) "
+    "FROM unnest(%(datapoint_ids)s::bigint[]) AS d(id);"
+)
+
+# The last bucket of each datapoint may still be incomplete (or not be
+# materialized yet), hence it is excluded here and its time returned as
+# cutoff from which on the raw data must be aggregated. The first bucket is
+# returned to check that the aggregate covers the full history.
+AGGREGATE_SQL = (
+    "SELECT datapoint_id, min(time), max(cutoff), "
+    "sum(message_count) FILTER (WHERE time < cutoff), "
+    "sum(value_count) FILTER (WHERE time < cutoff), "
+    "min(value_min) FILTER (WHERE time < cutoff), "
+    "max(value_max) FILTER (WHERE time < cutoff), "
+    "sum(value_avg * value_count) FILTER (WHERE time < cutoff) "
+    "FROM ("
+    "SELECT datapoint_id, time, message_count, value_count, value_min, "
+    "value_max, value_avg, max(time) OVER (PARTITION BY datapoint_id) "
+    "AS cutoff "
+    "FROM {table} "
+    "WHERE bucket_interval = %(interval)s "
+    "AND datapoint_id = ANY(%(datapoint_ids)s)"
+    ") AS buckets GROUP BY datapoint_id;"
+)
+
+RAW_SQL = (
+    "SELECT c.datapoint_id, count(*), count(v._value_float), "
+    "min(v._value_float), max(v._value_float), sum(v._value_float) "
+    "FROM unnest(%(datapoint_ids)s::bigint[], %(cutoffs)s::timestamptz[]) "
+    "AS c(datapoint_id, cutoff) "
+    "JOIN {table} AS v ON v.datapoint_id = c.datapoint_id "
+    "AND (c.cutoff IS NULL OR v.time >= c.cutoff) "
+    "GROUP BY c.datapoint_id;"
+)
+
+TABLE_SQL = (
+    "SELECT approximate_row_count(%(table)s::regclass), "
+    "(SELECT count(*) FROM timescaledb_information.chunks "
+    "WHERE hypertable_name = %(table)s), "
+    "hypertable_size(%(table)s::regclass);"
+)
+
+
+def use_timescale():
+    """
+    Returns True if the statistics can be computed with the TimescaleDB
+    functions, see also `DatapointValueResampleViewSet`.
+    """
+    return "timescale" in settings.DATABASES["default"]["ENGINE"]
+
+
+def coarsest_continuous_aggregate():
+    """
+    Returns the interval of the coarsest continuous aggregate of
+    DatapointValue that exists in DB, or None if there is none.
+    """
+    existing_view_names = existing_continuous_aggregates(DatapointValue)
+    candidates = []
+    for interval in DatapointValue.continuous_aggregates:
+        view_name = continuous_aggregate_view_name(DatapointValue, interval)
+        if view_name in existing_view_names:
+            candidates.append((parse_interval(interval), interval))
+    if not candidates:
+        return None
+    return max(candidates)[1]
+
+
+def combine_statistics(datapoint_ids, first_last, aggregated, raw):
+    """
+    Combine the parts computed from the different sources.
+
+    Arguments:
+    ----------
+    datapoint_ids : list of int
+        The IDs of the datapoints to return statistics for.
+    first_last : dict
+        Maps datapoint ID to a tuple (first_time, last_time).
+    aggregated, raw : dict
+        Map datapoint ID to a tuple (count, numeric_count, min, max, sum),
+        may miss datapoints without messages. `count` is the number of all
+        messages, `numeric_count` the number of numeric values.
+
+    Returns:
+    --------
+    statistics_by_id : dict
+        Maps datapoint ID to a dict with the statistics, see
+        `DatapointValueStatisticsSerializer`.
+    """
+    empty = (0, 0, None, None, None)
+    statistics_by_id = {}
+    for datapoint_id in datapoint_ids:
+        count = 0
+        numeric_count = 0
+        sum_ = 0.0
+        minima = []
+        maxima = []
+        for part in (aggregated, raw):
+            p_count, p_numeric_count, p_min, p_max, p_sum = part.get(
+                datapoint_id, empty
+            )
+            count += p_count or 0
+            numeric_count += p_numeric_count or 0
+            sum_ += p_sum or 0.0
+            if p_min is not None:
+                minima.append(p_min)
+            if p_max is not None:
+                maxima.append(p_max)
+
+        first_time, last_time = first_last.get(datapoint_id, (None, None))
+        first_timestamp, last_timestamp = timestamps_ms(
+            [first_time, last_time]
+        )
+        message_rate = None
+        if count > 1 and last_timestamp > first_timestamp:
+            hours = (last_timestamp - first_timestamp) / 3600000
+            message_rate = count / hours
+
+        statistics_by_id[datapoint_id] = {
+            "count": count,
+            "first_timestamp": first_timestamp,
+            "last_timestamp": last_timestamp,
+            "min": min(minima) if minima else None,
+            "max": max(maxima) if maxima else None,
+            "mean": sum_ / numeric_count if numeric_count else None,
+            "message_rate": message_rate,
+        }
+    return statistics_by_id
+
+
+def select_aggregated(aggregate_rows, first_last):
+    """
+    Select the parts of the continuous aggregate that can be used, i.e. of
+    the datapoints whose history is fully covered by the aggregate.
+
+    Arguments:
+    ----------
+    aggregate_rows : iterable of tuple
+        The rows of `AGGREGATE_SQL`.
+    first_last : dict
+        Maps datapoint ID to a tuple (first_time, last_time).
+
+    Returns:
+    --------
+    aggregated : dict
+        Maps datapoint ID to a tuple (count, numeric_count, min, max, sum)
+        of the messages before the cutoff, see `combine_statistics`.
+    cutoffs : dict
+        Maps datapoint ID to the time from which on the raw data must be
+        aggregated. Datapoints missing here must be aggregated from the
+        raw data completely.
+    """
+    aggregated = {}
+    cutoffs = {}
+    for datapoint_id, first_bucket, cutoff, *part in aggregate_rows:
+        first_time = first_last.get(datapoint_id, (None, None))[0]
+        # Without materialized bucket for the first message (e.g. if the
+        # aggregate has not been refreshed after a restore) the older
+        # messages would be missing.
+        if first_time is None or first_bucket > first_time:
+            continue
+        cutoffs[datapoint_id] = cutoff
+        aggregated[datapoint_id] = tuple(part)
+    return aggregated, cutoffs
+
+
+def value_statistics_in_db(datapoint_ids, numeric_datapoint_ids, connection):
+    """
+    Compute the statistics from indexes and continuous aggregates of
+    TimescaleDB, see the module docstring.
+
+    Arguments:
+    ----------
+    datapoint_ids : list of int
+        The IDs of the datapoints to return statistics for.
+    numeric_datapoint_ids : set of int
+        The subset of `datapoint_ids` with numeric data format. The
+        continuous aggregates cover only the numeric values, hence all
+        other datapoints are aggregated from the raw data.
+    connection : django.db connection
+        The connection to the DB to query.
+
+    Returns:
+    --------
+    statistics_by_id : dict
+        See `combine_statistics`.
+    """
+    table = DatapointValue._meta.db_table
+    interval = coarsest_continuous_aggregate()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            FIRST_AND_LAST_SQL.format(table=table),
+            {"datapoint_ids": datapoint_ids},
+        )
+        first_last = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        aggregated = {}
+        cutoffs = {}
+        if interval is not None and numeric_datapoint_ids:
+            cursor.execute(
+                AGGREGATE_SQL.format(
+                    table=DatapointValueAggregate._meta.db_table
+                ),
+                {
+                    "interval": interval,
+                    "datapoint_ids": list(numeric_datapoint_ids),
+                },
+            )
+            aggregated, cutoffs = select_aggregated(
+                cursor.fetchall(), first_last
+            )
+
+        cursor.execute(
+            RAW_SQL.format(table=table),
+            {
+                "datapoint_ids": datapoint_ids,
+                "cutoffs": [cutoffs.get(i) for i in datapoint_ids],
+            },
+        )
+        raw = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    return combine_statistics(datapoint_ids, first_last, aggregated, raw)
+
+
+def value_statistics_in_python(datapoint_ids, using):
+    """
+    Exact fallback for DBs without TimescaleDB.
+    """
+    rows = (
+        DatapointValue.objects.using(using)
+        .filter(datapoint_id__in=datapoint_ids)
+        .values("datapoint_id")
+        .annotate(
+            count=Count("id"),
+            numeric_count=Count("_value_float"),
+            first_time=Min("time"),
+            last_time=Max("time"),
+            value_min=Min("_value_float"),
+            value_max=Max("_value_float"),
+            value_avg=Avg("_value_float"),
+        )
+    )
+    first_last = {}
+    raw = {}
+    for row in rows:
+        datapoint_id = row["datapoint_id"]
+        first_last[datapoint_id] = (row["first_time"], row["last_time"])
+        value_sum = None
+        if row["value_avg"] is not None:
+            value_sum = row["value_avg"] * row["numeric_count"]
+        raw[datapoint_id] = (
+            row["count"],
+            row["numeric_count"],
+            row["value_min"],
+            row["value_max"],
+            value_sum,
+        )
+    return combine_statistics(datapoint_ids, first_last, {}, raw)
+
+
+def table_statistics(connection):
+    """
+    Returns the statistics of the whole DatapointValue table.
+
+    Returns:
+    --------
+    statistics : dict
+        With the keys `approximate_count` (all value messages), `n_chunks`
+        and `size_bytes`. The latter two are None without TimescaleDB.
+    """
+    table = DatapointValue._meta.db_table
+    if not use_timescale():
+        return {
+            "approximate_count": DatapointValue.objects.using(
+                connection.alias
+            ).count(),
+            "n_chunks": None,
+            "size_bytes": None,
+        }
+
+    with connection.cursor() as cursor:
+        cursor.execute(TABLE_SQL, {"table": table})
+        approximate_count, n_chunks, size_bytes = cursor.fetchone()
+    return {
+        "approximate_count": approximate_count,
+        "n_chunks": n_chunks,
+        "size_bytes": size_bytes,
+    }
+
+
+def value_statistics(datapoints, connection):
+    """
+    Compute the statistics of the value messages of `datapoints`.
+
+    Arguments:
+    ----------
+    datapoints : iterable of Datapoint
+        The datapoints to compute the statistics for.
+    connection : django.db connection
+        The connection to the DB to query, e.g. a read replica.
+
+    Returns:
+    --------
+    statistics_by_id : dict
+        Maps datapoint ID to a dict with the statistics, see
+        `DatapointValueStatisticsSerializer`.
+    """
+    datapoint_ids = []
+    numeric_datapoint_ids = set()
+    for datapoint in datapoints:
+        datapoint_ids.append(datapoint.id)
+        if datapoint.data_format.endswith("_numeric"):
+            numeric_datapoint_ids.add(datapoint.id)
+    if not datapoint_ids:
+        return {}
+
+    if use_timescale():
+        return value_statistics_in_db(
+            datapoint_ids, numeric_datapoint_ids, connection
+        )
+    return value_statistics_in_python(datapoint_ids, connection.alias)
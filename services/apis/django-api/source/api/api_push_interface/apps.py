@@ -0,0 +1,25 @@
+import sys
+import logging
+
+from django.conf import settings
+from django.apps import AppConfig
+
+
+logger = logging.getLogger(__name__)
+
+
+class ApiPushInterfaceConfig(AppConfig):
+    name = "api_push_interface"
+
+    def ready(self):
+
+        if not settings.ACTIVATE_PUSH_INTERFACE:
+            return
+
+        if "runserver" in sys.argv or "gunicorn" in sys.argv[0]:
+            logger.info("Starting up the push interface.")
+
+            from .broker import MqttToPush
+
+            # One instance per process which is shared by all clients.
+            MqttToPush()
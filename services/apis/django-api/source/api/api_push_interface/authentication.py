@@ -0,0 +1,81 @@
+import base64
+import binascii
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import AnonymousUser
+from django.http import QueryDict
+from rest_framework.authtoken.models import Token
+
+
+@database_sync_to_async
+def get_user_for_credentials(authorization, token_key):
+    """
+    Authenticate like the REST interface does, i.e. with basic auth or
+    with a token (keyword `Bearer` or `Token`).
+
+    Arguments:
+    ----------
+    authorization : str or None
+        The value of the Authorization header.
+    token_key : str or None
+        The token provided as query parameter. This is necessary as
+        browsers can't set headers for websocket connections.
+
+    Returns:
+    --------
+    user : User or None
+        The authenticated user, None if the credentials are invalid.
+    """
+    if authorization:
+        keyword, _, credentials = authorization.partition(" ")
+        if keyword.lower() == "basic":
+            try:
+                decoded = base64.b64decode(credentials).decode()
+            except (binascii.Error, UnicodeDecodeError):
+                return None
+            username, _, password = decoded.partition(":")
+            return authenticate(username=username, password=password)
+        if keyword.lower() in ["bearer", "token"]:
+            token_key = credentials.strip()
+
+    if not token_key:
+        return None
+    try:
+        token = Token.objects.select_related("user").get(key=token_key)
+    except Token.DoesNotExist:
+        return None
+    if not token.user.is_active:
+        return None
+    return token.user
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Populates scope["user"] from the Authorization header or the `token`
+    query parameter. Leaves scope["user"] untouched if neither is provided,
+    i.e. the session authentication of Django (e.g. of users logged into
+    the admin UI) still works.
+    """
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope.get("headers") or [])
+        authorization = headers.get(b"authorization", b"").decode()
+        query_params = QueryDict(scope.get("query_string") or b"")
+        token_key = query_params.get("token")
+
+        if authorization or token_key:
+            scope = dict(scope)
+            user = await get_user_for_credentials(authorization, token_key)
+            scope["user"] = user or AnonymousUser()
+
+        return await super().__call__(scope, receive, send)
+
+
+def PushAuthMiddlewareStack(inner):
+    """
+    Session and token authentication for the push interface consumers.
+    """
+    return AuthMiddlewareStack(TokenAuthMiddleware(inner))
@@ -0,0 +1,333 @@
+import json
+import logging
+import socket
+import sys
+from threading import Lock
+
+from django.conf import settings
+from paho.mqtt.client import Client
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+# The messages of all datapoints of all connectors.
+DATAPOINT_MESSAGE_WILDCARD_TOPIC = "+/messages/#"
+MESSAGE_TYPES = ("value", "schedule", "setpoint")
+
+
+def message_to_push_payload(datapoint_id, message_type, payload):
+    """
+    Convert a datapoint message received from the broker into the JSON
+    string that is pushed to the clients.
+
+    The message is formated like on the REST interface, i.e. values are
+    encoded as JSON strings.
+
+    Arguments:
+    ----------
+    datapoint_id : int
+        The id of the datapoint the message belongs to.
+    message_type : str
+        One of `MESSAGE_TYPES`.
+    payload : dict
+        The parsed message as received from the broker.
+
+    Returns:
+    --------
+    push_payload : str
+        Something like:
+        {
+            "datapoint_id": 1,
+            "message_type": "value",
+            "message": {"value": "21.5", "timestamp": 1585092224000}
+        }
+    """
+    if message_type == "value":
+        message = {
+            "value": json.dumps(payload["value"]),
+            "timestamp": payload["timestamp"],
+        }
+    elif message_type == "schedule":
+        schedule = payload["schedule"]
+        for schedule_item in schedule:
+            schedule_item["value"] = json.dumps(schedule_item["value"])
+        message = {"schedule": schedule, "timestamp": payload["timestamp"]}
+    else:
+        setpoint = payload["setpoint"]
+        for setpoint_item in setpoint:
+            setpoint_item["preferred_value"] = json.dumps(
+                setpoint_item["preferred_value"]
+            )
+        message = {"setpoint": setpoint, "timestamp": payload["timestamp"]}
+
+    push_payload = {
+        "datapoint_id": datapoint_id,
+        "message_type": message_type,
+        "message": message,
+    }
+    return json.dumps(push_payload)
+
+
+class Subscription:
+    """
+    The messages requested by one connected client.
+
+    Messages are handed over from the MQTT thread to the event loop serving
+    the client via a bounded queue. If the client consumes messages slower
+    then they arrive, the oldest queued messages are dropped. This keeps the
+    memory usage bounded and ensures that slow clients can't stall the
+    delivery to other clients.
+
+    Attributes:
+    -----------
+    datapoint_ids : set of int
+        The ids of the datapoints the client is interested in.
+    message_types : set of str
+        The message types the client is interested in.
+    queue : asyncio.Queue
+        The messages waiting to be sent to the client.
+    n_dropped : int
+        The number of messages dropped so far.
+    """
+
+    def __init__(self, loop, queue, datapoint_ids, message_types):
+        self.loop = loop
+        self.queue = queue
+        self.datapoint_ids = set(datapoint_ids)
+        self.message_types = set(message_types)
+        self.n_dropped = 0
+
+    def matches(self, datapoint_id, message_type):
+        return (
+            datapoint_id in self.datapoint_ids
+            and message_type in self.message_types
+        )
+
+    def put_threadsafe(self, push_payload):
+        """
+        Schedule delivery of `push_payload`, may be called from any thread.
+        """
+        try:
+            self.loop.call_soon_threadsafe(self._put, push_payload)
+        except RuntimeError:
+            # The loop has been closed, the client is gone anyway.
+            pass
+
+    def _put(self, push_payload):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.n_dropped += 1
+            MqttToPush.prom_dropped_messages_counter.inc()
+            if self.n_dropped == 1:
+                logger.warning(
+                    "Push interface client is too slow. Dropping messages."
+                )
+        self.queue.put_nowait(push_payload)
+
+    async def get(self):
+        """
+        Wait for the next message to send to the client.
+        """
+        return await self.queue.get()
+
+
+class MqttToPush:
+    """
+    This class listens on the MQTT broker for datapoint messages and fans
+    them out to the clients connected to the push interface.
+
+    There should only be one instance of this class per process, that is
+    shared by all clients. Hence every message is received and parsed once,
+    no matter how many clients are connected.
+
+    This class will be instantiated in apps.py of api_push_interface.
+    """
+
+    prom_pushed_messages_counter = Counter(
+        "bemcom_djangoapi_push_messages_sent_total",
+        "Total number of messages the push interface of the BEMCom "
+        "Django-API service has handed over to connected clients.",
+    )
+    prom_dropped_messages_counter = Counter(
+        "bemcom_djangoapi_push_messages_dropped_total",
+        "Total number of messages the push interface of the BEMCom "
+        "Django-API service has dropped because clients were too slow.",
+    )
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Ensure singleton, i.e. only one instance is created.
+        """
+        if not hasattr(cls, "_instance"):
+            # This magically calls __init__ with the correct arguements too.
+            cls._instance = object.__new__(cls)
+        else:
+            logger.warning(
+                "MqttToPush is aldready running. Use "
+                "get_instance method to retrieve the running instance."
+            )
+        return cls._instance
+
+    @classmethod
+    def get_instance(cls):
+        """
+        Return the running instance of the class.
+
+        Returns:
+        --------
+        instance: MqttToPush instance
+            The running instance of the class. Is none of not running yet.
+        """
+        if hasattr(cls, "_instance"):
+            instance = cls._instance
+        else:
+            instance = None
+        return instance
+
+    def __init__(self, mqtt_client=Client):
+        logger.debug("MqttToPush entering __init__")
+
+        self.subscriptions = set()
+        self.subscriptions_lock = Lock()
+
+        # The configuration for connecting to the broker.
+        connect_kwargs = {
+            "host": settings.MQTT_BROKER["host"],
+            "port": settings.MQTT_BROKER["port"],
+        }
+
+        # The private userdata, used by the callbacks.
+        userdata = {"connect_kwargs": connect_kwargs}
+        self.userdata = userdata
+
+        self.client = mqtt_client(userdata=userdata)
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_message
+
+        try:
+            self.client.connect(**connect_kwargs)
+        except (socket.gaierror, OSError):
+            logger.error(
+                "MqttToPush: Cannot connect to MQTT broker: %s."
+                " Aborting startup.",
+                connect_kwargs,
+            )
+            sys.exit(1)
+
+        # Start loop in dedicated thread..
+        self.client.loop_start()
+
+    def disconnect(self):
+        """
+        Shutdown gracefully.
+
+        Disconnect from broker and stop background loop of MQTT client.
+        """
+        self.client.disconnect()
+        self.client.loop_stop()
+        # Remove the instance, so a new one can be created.
+        del self.client
+        del type(self)._instance
+
+    def subscribe(self, loop, queue, datapoint_ids, message_types):
+        """
+        Register a client for receiving messages.
+
+        Arguments:
+        ----------
+        loop : asyncio event loop
+            The loop that serves the client.
+        queue : asyncio.Queue
+            A bounded queue (belonging to `loop`) for the messages.
+        datapoint_ids : iterable of int
+            The ids of the datapoints the client is interested in.
+        message_types : iterable of str
+            Items of `MESSAGE_TYPES` the client is interested in.
+
+        Returns:
+        --------
+        subscription : Subscription
+            Must be handed to `unsubscribe` once the client disconnects.
+        """
+        subscription = Subscription(
+            loop=loop,
+            queue=queue,
+            datapoint_ids=datapoint_ids,
+            message_types=message_types,
+        )
+        with self.subscriptions_lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.subscriptions_lock:
+            self.subscriptions.discard(subscription)
+
+    def on_message(self, client, userdata, msg):
+        """
+        Forward datapoint messages to all matching subscriptions.
+
+        This is called from the thread of the MQTT client and must hence
+        return fast. The message is only parsed if at least one client is
+        interested in it and the resulting JSON string is shared by all
+        clients.
+        """
+        try:
+            topic_parts = msg.topic.split("/")
+            message_type = topic_parts[-1]
+            datapoint_id = int(topic_parts[-2])
+        except (IndexError, ValueError):
+            return
+        if message_type not in MESSAGE_TYPES:
+            return
+
+        with self.subscriptions_lock:
+            subscriptions = [
+                s
+                for s in self.subscriptions
+                if s.matches(datapoint_id, message_type)
+            ]
+        if not subscriptions:
+            return
+
+        try:
+            payload = json.loads(msg.payload)
+            push_payload = message_to_push_payload(
+                datapoint_id=datapoint_id,
+                message_type=message_type,
+                payload=payload,
+            )
+        except Exception:
+            logger.exception(
+                "Could not parse message for push interface. The topic "
+                "was: %s" % msg.topic
+            )
+            return
+
+        for subscription in subscriptions:
+            subscription.put_threadsafe(push_payload)
+        self.prom_pushed_messages_counter.inc(len(subscriptions))
+
+    def on_connect(self, client, userdata, flags, rc):
+        logger.info(
+            "MqttToPush connected to MQTT broker tcp://%s:%s",
+            userdata["connect_kwargs"]["host"],
+            userdata["connect_kwargs"]["port"],
+        )
+        # Subscribe here to restore the subscription after reconnects.
+        client.subscribe(DATAPOINT_MESSAGE_WILDCARD_TOPIC, qos=0)
+
+    @staticmethod
+    def on_disconnect(client, userdata, rc):
+        """
+        Atempt Reconnecting if disconnect was not called from a call to
+        client.disconnect().
+        """
+        if rc != 0:
+            logger.info(
+                "MqttToPush lost connection to MQTT broker with "
+                "code %s. Reconnecting",
+                rc,
+            )
+            client.connect(**userdata["connect_kwargs"])
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import logging
+
+from channels.db import database_sync_to_async
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from django.http import QueryDict
+
+from api_main.models.datapoint import Datapoint
+from .broker import MqttToPush
+
+logger = logging.getLogger(__name__)
+
+
+class PushRequestError(Exception):
+    """
+    Raised if a client can't be subscribed, carries the HTTP status code
+    and an error message like the REST interface would return.
+    """
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class DatapointMessagePushMixin:
+    """
+    Generic code to push datapoint messages to a connected client.
+
+    The client selects the messages with query parameters:
+    - datapoint__id__in: Comma separated list of datapoint ids.
+    - connector__id: The id of a connector, selects all its datapoints.
+    - message_types: Comma separated list of `value`, `schedule` and
+      `setpoint`. Defaults to all message types that are available.
+    Only active datapoints are considered. If neither `datapoint__id__in`
+    nor `connector__id` is given the messages of all active datapoints
+    are pushed.
+
+    Subclasses must implement `send_push_payload`.
+    """
+
+    subscription = None
+    push_task = None
+
+    @staticmethod
+    def get_available_message_types():
+        message_types = ["value"]
+        if settings.ACTIVATE_CONTROL_EXTENSION:
+            message_types += ["schedule", "setpoint"]
+        return message_types
+
+    @staticmethod
+    def get_datapoint_ids(datapoint_ids, connector_id):
+        datapoints = Datapoint.objects.filter(is_active=True)
+        if datapoint_ids is not None:
+            datapoints = datapoints.filter(id__in=datapoint_ids)
+        if connector_id is not None:
+            datapoints = datapoints.filter(connector__id=connector_id)
+        return set(datapoints.values_list("id", flat=True))
+
+    async def subscribe(self):
+        """
+        Check the request of the client and register it at the broker.
+
+        Raises:
+        -------
+        PushRequestError:
+            If the client is not allowed to receive the requested messages
+            or the request is invalid.
+        """
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            raise PushRequestError(
+                401, "Authentication credentials were not provided."
+            )
+
+        query_params = QueryDict(self.scope.get("query_string") or b"")
+        available_message_types = self.get_available_message_types()
+        message_types = available_message_types
+        if query_params.get("message_types"):
+            message_types = query_params["message_types"].split(",")
+        for message_type in message_types:
+            if message_type not in available_message_types:
+                raise PushRequestError(
+                    400,
+                    "message_types must be a comma separated list of: %s"
+                    % ", ".join(available_message_types),
+                )
+
+        try:
+            datapoint_ids = None
+            if query_params.get("datapoint__id__in"):
+                datapoint_ids = [
+                    int(i)
+                    for i in query_params["datapoint__id__in"].split(",")
+                ]
+            connector_id = None
+            if query_params.get("connector__id"):
+                connector_id = int(query_params["connector__id"])
+        except ValueError:
+            raise PushRequestError(
+                400,
+                "datapoint__id__in must be a comma separated list of "
+                "integers and connector__id an integer.",
+            )
+
+        for message_type in message_types:
+            perm = "api_main.view_datapointlast%s" % message_type
+            has_perm = await database_sync_to_async(user.has_perm)(perm)
+            if not has_perm:
+                raise PushRequestError(
+                    403, "You do not have permission to perform this action."
+                )
+
+        broker = MqttToPush.get_instance()
+        if broker is None:
+            raise PushRequestError(503, "The push interface is not running.")
+
+        datapoint_ids = await database_sync_to_async(self.get_datapoint_ids)(
+            datapoint_ids=datapoint_ids, connector_id=connector_id
+        )
+        self.subscription = broker.subscribe(
+            loop=asyncio.get_running_loop(),
+            queue=asyncio.Queue(maxsize=settings.PUSH_MAX_QUEUED_MESSAGES),
+            datapoint_ids=datapoint_ids,
+            message_types=message_types,
+        )
+
+    def start_push(self):
+        """
+        Start forwarding the messages of the subscription to the client.
+        """
+        self.push_task = asyncio.ensure_future(self.push_messages())
+
+    async def push_messages(self):
+        while True:
+            push_payload = await self.subscription.get()
+            await self.send_push_payload(push_payload)
+
+    async def send_push_payload(self, push_payload):
+        raise NotImplementedError()
+
+    async def stop_push(self):
+        """
+        Unregister the client, must be called on disconnect.
+        """
+        if self.push_task is not None:
+            self.push_task.cancel()
+            self.push_task = None
+        if self.subscription is not None:
+            broker = MqttToPush.get_instance()
+            if broker is not None:
+                broker.unsubscribe(self.subscription)
+            self.subscription = None
+
+
+class DatapointMessageWebsocketConsumer(
+    DatapointMessagePushMixin, AsyncWebsocketConsumer
+):
+    """
+    Pushes datapoint messages to the client via a websocket. Each message
+    is a JSON object with the keys `datapoint_id`, `message_type` and
+    `message`, the latter formated like on the REST interface.
+
+    Errors are sent as JSON object with a `detail` key, after which the
+    connection is closed with code 4000 + HTTP status code, e.g. 4403.
+    """
+
+    async def connect(self):
+        await self.accept()
+        try:
+            await self.subscribe()
+        except PushRequestError as e:
+            await self.send(text_data=json.dumps({"detail": e.detail}))
+            await self.close(code=4000 + e.status_code)
+            return
+        self.start_push()
+
+    async def disconnect(self, code):
+        await self.stop_push()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # This is a push only interface.
+        pass
+
+    async def send_push_payload(self, push_payload):
+        await self.send(text_data=push_payload)
+
+
+class DatapointMessageEventStreamConsumer(
+    DatapointMessagePushMixin, AsyncHttpConsumer
+):
+    """
+    Like DatapointMessageWebsocketConsumer but pushes the messages as
+    Server-Sent Events, for clients which can't use websockets.
+    """
+
+    # Seconds after which a comment is sent to keep idle connections alive
+    # and to detect clients which have gone away.
+    keepalive_interval = 15
+
+    request_task = None
+
+    async def http_request(self, message):
+        """
+        Handle the request in a task, as `handle` only returns once the
+        client has disconnected. AsyncHttpConsumer awaits `handle` in the
+        loop that receives the messages of the server, which would hence
+        never see the disconnect (see `http_disconnect`).
+        """
+        if message.get("more_body"):
+            await super().http_request(message)
+            return
+        self.request_task = asyncio.ensure_future(
+            self.handle_request(message)
+        )
+
+    async def handle_request(self, message):
+        try:
+            await super().http_request(message)
+        except StopConsumer:
+            # Raised by AsyncHttpConsumer once `handle` has returned. The
+            # consumer is stopped by the http.disconnect message, which the
+            # server sends if the response is complete or the client gone.
+            pass
+
+    async def handle(self, body):
+        try:
+            await self.subscribe()
+        except PushRequestError as e:
+            await self.send_response(
+                e.status_code,
+                json.dumps({"detail": e.detail}).encode(),
+                headers=[(b"Content-Type", b"application/json")],
+            )
+            return
+        await self.send_headers(
+            headers=[
+                (b"Content-Type", b"text/event-stream"),
+                (b"Cache-Control", b"no-cache"),
+                # Prevent that reverse proxies buffer the messages.
+                (b"X-Accel-Buffering", b"no"),
+            ]
+        )
+        await self.send_body(b"", more_body=True)
+        # Push until the client disconnects, which cancels the push.
+        self.start_push()
+        await self.push_task
+
+    async def push_messages(self):
+        while True:
+            try:
+                push_payload = await asyncio.wait_for(
+                    self.subscription.get(), timeout=self.keepalive_interval
+                )
+            except asyncio.TimeoutError:
+                await self.send_body(b": keepalive\n\n", more_body=True)
+                continue
+            await self.send_push_payload(push_payload)
+
+    async def send_push_payload(self, push_payload):
+        event = "data: %s\n\n" % push_payload
+        await self.send_body(event.encode(), more_body=True)
+
+    async def disconnect(self):
+        await self.stop_push()
+        # Also called by the request task itself once `handle` returned.
+        request_task = self.request_task
+        self.request_task = None
+        if request_task is not None and not request_task.done():
+            if request_task is not asyncio.current_task():
+                request_task.cancel()
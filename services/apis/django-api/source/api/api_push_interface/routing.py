@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.urls import path
+
+from .authentication import PushAuthMiddlewareStack
+from .consumers import DatapointMessageEventStreamConsumer
+from .consumers import DatapointMessageWebsocketConsumer
+
+ROOT_PATH = settings.ROOT_PATH
+
+# The authentication is only applied to the push endpoints, the other
+# requests are authenticated by Django/DRF as usual.
+websocket_urlpatterns = [
+    path(
+        ROOT_PATH + "push/ws/",
+        PushAuthMiddlewareStack(DatapointMessageWebsocketConsumer.as_asgi()),
+    ),
+]
+
+http_urlpatterns = [
+    path(
+        ROOT_PATH + "push/sse/",
+        PushAuthMiddlewareStack(
+            DatapointMessageEventStreamConsumer.as_asgi()
+        ),
+    ),
+]
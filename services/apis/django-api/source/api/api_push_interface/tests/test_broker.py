@@ -0,0 +1,154 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from api_main.tests.fake_mqtt import FakeMQTTBroker, FakeMQTTClient
+from api_push_interface.broker import MqttToPush
+from api_push_interface.broker import message_to_push_payload
+
+
+class TestMessageToPushPayload:
+    def test_value_message_encoded_like_rest_interface(self):
+        payload = {"value": 21.5, "timestamp": 1585092224000}
+
+        push_payload = message_to_push_payload(
+            datapoint_id=1, message_type="value", payload=payload
+        )
+
+        expected_push_payload = {
+            "datapoint_id": 1,
+            "message_type": "value",
+            "message": {"value": "21.5", "timestamp": 1585092224000},
+        }
+        assert json.loads(push_payload) == expected_push_payload
+
+    def test_setpoint_message_encoded_like_rest_interface(self):
+        payload = {
+            "setpoint": [
+                {
+                    "from_timestamp": None,
+                    "to_timestamp": None,
+                    "preferred_value": "on",
+                }
+            ],
+            "timestamp": 1585092224000,
+        }
+
+        push_payload = message_to_push_payload(
+            datapoint_id=2, message_type="setpoint", payload=payload
+        )
+
+        message = json.loads(push_payload)["message"]
+        assert message["setpoint"][0]["preferred_value"] == '"on"'
+
+
+@pytest.fixture
+def mqtt_to_push():
+    fake_broker = FakeMQTTBroker()
+    fake_client = FakeMQTTClient(fake_broker=fake_broker)
+    mqtt_to_push = MqttToPush(mqtt_client=fake_client)
+    yield mqtt_to_push
+    mqtt_to_push.disconnect()
+
+
+def fake_msg(topic, payload):
+    msg = MagicMock()
+    msg.topic = topic
+    msg.payload = json.dumps(payload).encode()
+    return msg
+
+
+class TestMqttToPush:
+    def test_message_fanned_out_to_matching_subscriptions(
+        self, mqtt_to_push
+    ):
+        loop = asyncio.new_event_loop()
+        subscription_1 = mqtt_to_push.subscribe(
+            loop=loop,
+            queue=asyncio.Queue(maxsize=10),
+            datapoint_ids=[1, 2],
+            message_types=["value"],
+        )
+        subscription_2 = mqtt_to_push.subscribe(
+            loop=loop,
+            queue=asyncio.Queue(maxsize=10),
+            datapoint_ids=[3],
+            message_types=["value"],
+        )
+
+        msg = fake_msg(
+            "test_connector/messages/1/value",
+            {"value": 1.0, "timestamp": 1585092224000},
+        )
+        mqtt_to_push.on_message(None, None, msg)
+        # Process the callbacks scheduled by call_soon_threadsafe.
+        loop.run_until_complete(asyncio.sleep(0))
+
+        assert subscription_1.queue.qsize() == 1
+        assert subscription_2.queue.qsize() == 0
+        loop.close()
+
+    def test_unsubscribed_client_receives_nothing(self, mqtt_to_push):
+        loop = asyncio.new_event_loop()
+        subscription = mqtt_to_push.subscribe(
+            loop=loop,
+            queue=asyncio.Queue(maxsize=10),
+            datapoint_ids=[1],
+            message_types=["value"],
+        )
+        mqtt_to_push.unsubscribe(subscription)
+
+        msg = fake_msg(
+            "test_connector/messages/1/value",
+            {"value": 1.0, "timestamp": 1585092224000},
+        )
+        mqtt_to_push.on_message(None, None, msg)
+        loop.run_until_complete(asyncio.sleep(0))
+
+        assert subscription.queue.qsize() == 0
+        loop.close()
+
+    def test_oldest_messages_dropped_for_slow_client(self, mqtt_to_push):
+        loop = asyncio.new_event_loop()
+        subscription = mqtt_to_push.subscribe(
+            loop=loop,
+            queue=asyncio.Queue(maxsize=2),
+            datapoint_ids=[1],
+            message_types=["value"],
+        )
+
+        for timestamp in [1000, 2000, 3000]:
+            msg = fake_msg(
+                "test_connector/messages/1/value",
+                {"value": 1.0, "timestamp": timestamp},
+            )
+            mqtt_to_push.on_message(None, None, msg)
+        loop.run_until_complete(asyncio.sleep(0))
+
+        assert subscription.n_dropped == 1
+        timestamps = [
+            json.loads(subscription.queue.get_nowait())["message"]["timestamp"]
+            for _ in range(subscription.queue.qsize())
+        ]
+        assert timestamps == [2000, 3000]
+        loop.close()
+
+    def test_other_topics_ignored(self, mqtt_to_push):
+        loop = asyncio.new_event_loop()
+        subscription = mqtt_to_push.subscribe(
+            loop=loop,
+            queue=asyncio.Queue(maxsize=10),
+            datapoint_ids=[1],
+            message_types=["value"],
+        )
+
+        msg = fake_msg("test_connector/messages/1/unknown", {})
+        mqtt_to_push.on_message(None, None, msg)
+        msg = fake_msg("test_connector/heartbeat", {})
+        mqtt_to_push.on_message(None, None, msg)
+        loop.run_until_complete(asyncio.sleep(0))
+
+        assert subscription.queue.qsize() == 0
+        loop.close()
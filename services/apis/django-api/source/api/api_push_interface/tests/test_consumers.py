@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.testing import ApplicationCommunicator
+from django.contrib.auth.models import User, Permission
+
+from api_main.tests.fake_mqtt import FakeMQTTBroker, FakeMQTTClient
+from api_main.tests.helpers import connector_factory
+from api_main.tests.helpers import datapoint_factory
+from api_push_interface.broker import MqttToPush
+from api_push_interface.consumers import DatapointMessageEventStreamConsumer
+from .test_broker import fake_msg
+
+
+@pytest.fixture
+def mqtt_to_push():
+    fake_broker = FakeMQTTBroker()
+    fake_client = FakeMQTTClient(fake_broker=fake_broker)
+    mqtt_to_push = MqttToPush(mqtt_client=fake_client)
+    yield mqtt_to_push
+    mqtt_to_push.disconnect()
+
+
+@pytest.fixture
+def user():
+    user = User.objects.create_user(username="push_user", password="pass")
+    p = Permission.objects.get(codename="view_datapointlastvalue")
+    user.user_permissions.add(p)
+    return user
+
+
+def sse_scope(user, query_string=b""):
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "path": "/push/sse/",
+        "query_string": query_string,
+        "headers": [],
+        "user": user,
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+class TestDatapointMessageEventStreamConsumer:
+    def test_messages_pushed_until_client_disconnects(
+        self, mqtt_to_push, user
+    ):
+        datapoint = datapoint_factory(connector_factory())
+        datapoint.is_active = True
+        datapoint.save()
+
+        async def run_client():
+            communicator = ApplicationCommunicator(
+                DatapointMessageEventStreamConsumer.as_asgi(),
+                sse_scope(user, b"datapoint__id__in=%d" % datapoint.id),
+            )
+            await communicator.send_input(
+                {"type": "http.request", "body": b""}
+            )
+            response_start = await communicator.receive_output(timeout=5)
+            assert response_start["status"] == 200
+            first_body = await communicator.receive_output(timeout=5)
+            assert first_body["more_body"]
+
+            # The connection must stay open and carry the messages.
+            msg = fake_msg(
+                "test_connector/messages/%s/value" % datapoint.id,
+                {"value": 21.5, "timestamp": 1585092224000},
+            )
+            mqtt_to_push.on_message(None, None, msg)
+            event = await communicator.receive_output(timeout=5)
+            assert event["more_body"]
+            assert event["body"].startswith(b"data: ")
+            push_payload = json.loads(event["body"][len(b"data: ") :])
+            assert push_payload["datapoint_id"] == datapoint.id
+            assert push_payload["message"]["value"] == "21.5"
+
+            await communicator.send_input({"type": "http.disconnect"})
+            await communicator.wait(timeout=5)
+            # Let the cancelled push finish.
+            await asyncio.sleep(0)
+
+        async_to_sync(run_client)()
+        assert mqtt_to_push.subscriptions == set()
+
+    def test_error_returned_without_permission(self, mqtt_to_push, user):
+        user.user_permissions.clear()
+
+        async def run_client():
+            communicator = ApplicationCommunicator(
+                DatapointMessageEventStreamConsumer.as_asgi(),
+                sse_scope(user),
+            )
+            await communicator.send_input(
+                {"type": "http.request", "body": b""}
+            )
+            response_start = await communicator.receive_output(timeout=5)
+            assert response_start["status"] == 403
+            body = await communicator.receive_output(timeout=5)
+            assert not body.get("more_body")
+
+            # Like the server once the response is complete.
+            await communicator.send_input({"type": "http.disconnect"})
+            await communicator.wait(timeout=5)
+
+        async_to_sync(run_client)()
@@ -1,13 +1,18 @@
+from django.conf import settings
 from django.db import models
-from django_filters import FilterSet, NumberFilter, CharFilter
+from django.db.models.functions import Cast, NullIf
+from django_filters import FilterSet, NumberFilter, CharFilter, ChoiceFilter
 
 from api_main.models.datapoint import Datapoint
 from api_main.models.datapoint import DatapointValue
+from api_main.models.datapoint import DatapointValueAggregate
 from api_main.models.datapoint import DatapointSetpoint
 from api_main.models.datapoint import DatapointSchedule
 from api_main.models.datapoint import DatapointLastValue
 from api_main.models.datapoint import DatapointLastSetpoint
 from api_main.models.datapoint import DatapointLastSchedule
+from api_main.continuous_aggregates import select_continuous_aggregate
+from ems_utils.downsampling import DOWNSAMPLING_METHODS
 from ems_utils.timestamp import datetime_from_timestamp
 
 
@@ -56,11 +61,74 @@ class DatapointValueFilter(TimestampFilter):
     """
 
     interval = CharFilter(method="apply_timebucket")
+    # These are applied by the view after the datapoint has been selected,
+    # they are defined here for validation and to appear in the schema.
+    max_points = NumberFilter(
+        method="apply_in_view",
+        min_value=4,
+        help_text=(
+            "Reduce the returned messages to at most this number while "
+            "preserving the visual shape of the time series. Only numeric "
+            "and boolean values are returned if the reduction is necessary."
+        ),
+    )
+    downsampling_method = ChoiceFilter(
+        method="apply_in_view",
+        choices=[(m, m) for m in DOWNSAMPLING_METHODS],
+        help_text=(
+            "The algorithm used for `max_points`. `lttb` (default) for "
+            "Largest-Triangle-Three-Buckets, `minmax` for min/max per bucket."
+        ),
+    )
 
     class Meta:
         model = DatapointValue
         fields = []  # The custom methods are added automatically.
 
+    def filter_queryset(self, queryset):
+        """
+        Swaps the raw values for a continuous aggregate if the requested
+        time buckets can be computed from it.
+
+        Only the `gte` and `lt` timestamp filters can be served from an
+        aggregate (and only if aligned to the aggregate buckets), as for
+        the other two the bucket at the border would contain values that
+        should not be included.
+        """
+        aggregate_interval = self.select_continuous_aggregate()
+        if aggregate_interval is not None:
+            queryset = DatapointValueAggregate.timescale.filter(
+                bucket_interval=aggregate_interval
+            )
+        return super().filter_queryset(queryset)
+
+    def select_continuous_aggregate(self):
+        """
+        Returns the interval of the continuous aggregate to use or None if
+        the raw values must be used.
+        """
+        if not settings.USE_CONTINUOUS_AGGREGATES:
+            return None
+        cleaned_data = self.form.cleaned_data
+        interval = cleaned_data.get("interval")
+        if not interval:
+            return None
+        for name in ["timestamp__gt", "timestamp__lte"]:
+            if cleaned_data.get(name) is not None:
+                return None
+        timestamps = []
+        for name in ["timestamp__gte", "timestamp__lt"]:
+            if cleaned_data.get(name) is not None:
+                timestamps.append(float(cleaned_data[name]))
+        return select_continuous_aggregate(
+            interval=interval,
+            aggregate_intervals=DatapointValue.continuous_aggregates,
+            timestamps=timestamps,
+        )
+
+    def apply_in_view(self, queryset, *_):
+        return queryset
+
     def apply_timebucket(self, queryset, _, value):
         """
         Applies the time bucket to compute average values over time slots.
@@ -78,7 +146,20 @@ class DatapointValueFilter(TimestampFilter):
 
         """
         queryset = queryset.time_bucket("time", value)
-        queryset = queryset.annotate(value=models.Avg("_value_float"))
+        if queryset.model is DatapointValueAggregate:
+            # The average of the averages is only correct if weighted
+            # with the number of values in each bucket.
+            queryset = queryset.annotate(
+                value=models.Sum(
+                    models.F("value_avg") * models.F("value_count"),
+                    output_field=models.FloatField(),
+                )
+                / NullIf(
+                    Cast(models.Sum("value_count"), models.FloatField()), 0.0
+                )
+            )
+        else:
+            queryset = queryset.annotate(value=models.Avg("_value_float"))
         # Late first, newest item last in list. This should not cost anything
         # extra as the timescaledb django plugin orders too, but just the other
         # way around.
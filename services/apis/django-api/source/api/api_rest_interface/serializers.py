@@ -1,7 +1,13 @@
+import math
+from datetime import timedelta
+
 from rest_framework import serializers
 
+from api_main.continuous_aggregates import parse_interval
 from api_main.models.datapoint import Datapoint
 from api_main.models.connector import Connector
+from ems_utils.message_format.serializers import Int64Field
+from ems_utils.resampling import FILL_METHODS
 
 
 class ConnectorSerializer(serializers.ModelSerializer):
@@ -43,3 +49,202 @@ class DatapointSerializer(serializers.ModelSerializer):
         # Removes the unique constraint from the serializer as we do
         # only updating and the short name is very likely to exist already.
         extra_kwargs = {"short_name": {"validators": []}}
+
+
+class DatapointIdListField(serializers.CharField):
+    """
+    A comma separated list of datapoint IDs as query parameter.
+    """
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        try:
+            return [int(dp_id) for dp_id in value.split(",") if dp_id.strip()]
+        except ValueError:
+            raise serializers.ValidationError(
+                "Must be a comma separated list of integers."
+            )
+
+
+class ResampleParamsSerializer(serializers.Serializer):
+    """
+    Query parameters of the endpoint that resamples value messages to a
+    regular time grid.
+    """
+
+    # Limits the response size, 100k buckets of e.g. 15 minutes are roughly
+    # three years.
+    max_buckets = 100000
+
+    datapoint__id__in = DatapointIdListField(
+        help_text=(
+            "Comma separated list of the IDs of the datapoints to return "
+            "values for, e.g. `1,2,42`."
+        ),
+    )
+    interval = serializers.CharField(
+        help_text=(
+            "The interval of the time grid, e.g. `15 minutes`. Must be "
+            "a PostgreSQL interval string without month or year components."
+        ),
+    )
+    fill = serializers.ChoiceField(
+        choices=FILL_METHODS,
+        default="none",
+        help_text=(
+            "How to fill buckets without values. `locf` carries the last "
+            "observed value forward, `interpolate` interpolates linearly "
+            "and `none` (default) returns null."
+        ),
+    )
+    timestamp__gte = Int64Field(
+        help_text=(
+            "Start of the requested time range as timestamp in milliseconds."
+        ),
+    )
+    timestamp__lt = Int64Field(
+        help_text=(
+            "End of the requested time range as timestamp in milliseconds."
+        ),
+    )
+    origin = Int64Field(
+        required=False,
+        help_text=(
+            "A timestamp in milliseconds the grid is aligned to, i.e. "
+            "that is a border of the buckets. Defaults to `timestamp__gte`."
+        ),
+    )
+
+    def validate_interval(self, value):
+        interval = parse_interval(value)
+        if interval is None:
+            raise serializers.ValidationError(
+                "Invalid interval, use e.g. `15 minutes`."
+            )
+        return interval
+
+    def validate(self, data):
+        if data["timestamp__lt"] <= data["timestamp__gte"]:
+            raise serializers.ValidationError(
+                {"timestamp__lt": "Must be greater then timestamp__gte."}
+            )
+
+        # Compute the grid from the parameters.
+        interval_ms = data["interval"] / timedelta(milliseconds=1)
+        origin = data.get("origin", data["timestamp__gte"])
+        n_intervals_before = (data["timestamp__gte"] - origin) // interval_ms
+        grid_start = origin + n_intervals_before * interval_ms
+        time_range = data["timestamp__lt"] - grid_start
+        n_buckets = math.ceil(time_range / interval_ms)
+        if n_buckets > self.max_buckets:
+            raise serializers.ValidationError(
+                "Requested grid has %s buckets, only %s are allowed."
+                % (n_buckets, self.max_buckets)
+            )
+        data["interval_ms"] = interval_ms
+        data["grid_start"] = grid_start
+        data["n_buckets"] = n_buckets
+        return data
+
+
+class DatapointValueDataFrameSerializer(serializers.Serializer):
+    """
+    Values of one or more datapoints on a common time grid.
+    """
+
+    values = serializers.DictField(
+        child=serializers.ListField(
+            child=serializers.CharField(allow_null=True)
+        ),
+        help_text=(
+            "The JSON encoded values (or null) for each bucket with the "
+            "datapoint ID as key."
+        ),
+    )
+    timestamps = serializers.ListField(
+        child=Int64Field(),
+        help_text=("The start of each bucket as timestamp in milliseconds."),
+    )
+
+
+class ValueStatisticsParamsSerializer(serializers.Serializer):
+    """
+    Query parameters of the endpoint that returns the statistics of the
+    value messages of many datapoints.
+    """
+
+    datapoint__id__in = DatapointIdListField(
+        required=False,
+        help_text=(
+            "Comma separated list of the IDs of the datapoints to return "
+            "statistics for, e.g. `1,2,42`. Defaults to all datapoints."
+        ),
+    )
+
+
+class DatapointValueStatisticsSerializer(serializers.Serializer):
+    """
+    Statistics of the value messages of one datapoint.
+    """
+
+    count = serializers.IntegerField(
+        help_text=(
+            "The number of value messages. For numeric datapoints on "
+            "TimescaleDB messages with non numeric values are only counted "
+            "for the most recent bucket of the continuous aggregates."
+        ),
+    )
+    first_timestamp = Int64Field(
+        allow_null=True,
+        help_text=("Timestamp in milliseconds of the first message."),
+    )
+    last_timestamp = Int64Field(
+        allow_null=True,
+        help_text=("Timestamp in milliseconds of the last message."),
+    )
+    min = serializers.FloatField(
+        allow_null=True, help_text=("The smallest numeric value."),
+    )
+    max = serializers.FloatField(
+        allow_null=True, help_text=("The largest numeric value."),
+    )
+    mean = serializers.FloatField(
+        allow_null=True, help_text=("The mean of all numeric values."),
+    )
+    message_rate = serializers.FloatField(
+        allow_null=True,
+        help_text=(
+            "Average number of messages per hour between the first and the "
+            "last message."
+        ),
+    )
+
+
+class TableStatisticsSerializer(serializers.Serializer):
+    """
+    Statistics of all stored value messages.
+    """
+
+    approximate_count = serializers.IntegerField(
+        help_text=("The approximate number of all value messages."),
+    )
+    n_chunks = serializers.IntegerField(
+        allow_null=True,
+        help_text=("The number of TimescaleDB chunks holding the messages."),
+    )
+    size_bytes = serializers.IntegerField(
+        allow_null=True,
+        help_text=("The size of the messages including indexes on disk."),
+    )
+
+
+class DatapointValueStatisticsListSerializer(serializers.Serializer):
+    """
+    Statistics of the value messages of many datapoints.
+    """
+
+    table = TableStatisticsSerializer()
+    statistics_by_datapoint_id = serializers.DictField(
+        child=DatapointValueStatisticsSerializer(),
+        help_text=("The statistics with the datapoint ID as key."),
+    )
@@ -4,12 +4,16 @@ functionality provided by the REST Api that a client must request. These
 tests here are end to end. Additional details, like e.g. field checking are
 covered in the tests of the serializers.
 """
+import gzip
 import json
 import time
 
 from rest_framework.test import APIClient
 from django.contrib.auth.models import User, Permission
+from django.db import connection
 from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 import pytest
 
 from api_main.mqtt_integration import ApiMqttIntegration, MqttToDb
@@ -460,6 +464,404 @@ class TestRESTEndpoint(TransactionTestCase):
         assert request.status_code == 200
         assert request.data == [expected_data]
 
+    def test_get_datapoint_value_streamed_as_csv(self):
+        """
+        Check that the value history can be downloaded as CSV, also gzip
+        compressed.
+        """
+        dp = datapoint_factory(self.test_connector)
+        dp.save()
+        for timestamp, value in [(1585092224000, 21.5), (1585092225000, 22)]:
+            DatapointValue(
+                datapoint=dp,
+                value=value,
+                time=datetime_from_timestamp(timestamp),
+            ).save()
+
+        p = Permission.objects.get(codename="view_datapointvalue")
+        self.user.user_permissions.add(p)
+        request = self.client.get(
+            "/datapoint/%s/value/?timestamp__gte=1585092224000" % dp.id,
+            HTTP_ACCEPT="text/csv",
+        )
+
+        assert request.status_code == 200
+        assert request.streaming
+        assert request["Content-Type"] == "text/csv; charset=utf-8"
+        content = b"".join(request.streaming_content).decode()
+        expected_content = (
+            "value,timestamp\r\n"
+            "21.5,1585092224000\r\n"
+            "22.0,1585092225000\r\n"
+        )
+        assert content == expected_content
+
+        request = self.client.get(
+            "/datapoint/%s/value/?timestamp__gte=1585092224000" % dp.id,
+            HTTP_ACCEPT="text/csv",
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        assert request["Content-Encoding"] == "gzip"
+        content = gzip.decompress(b"".join(request.streaming_content))
+        assert content.decode() == expected_content
+
+    def test_export_datapoint_values_of_multiple_datapoints(self):
+        dp = datapoint_factory(self.test_connector)
+        dp.save()
+        dp_2 = datapoint_factory(self.test_connector)
+        dp_2.save()
+        for datapoint, value in [(dp, "on"), (dp_2, 1.5)]:
+            DatapointValue(
+                datapoint=datapoint,
+                value=value,
+                time=datetime_from_timestamp(1585092224000),
+            ).save()
+
+        p = Permission.objects.get(codename="view_datapointvalue")
+        self.user.user_permissions.add(p)
+        request = self.client.get(
+            "/datapoint/value/",
+            {"datapoint__id__in": "%s,%s" % (dp.id, dp_2.id)},
+            HTTP_ACCEPT="application/x-ndjson",
+        )
+
+        assert request.status_code == 200
+        lines = b"".join(request.streaming_content).splitlines()
+        expected_rows = [
+            {
+                "datapoint_id": dp.id,
+                "value": json.dumps("on"),
+                "timestamp": 1585092224000,
+            },
+            {
+                "datapoint_id": dp_2.id,
+                "value": json.dumps(1.5),
+                "timestamp": 1585092224000,
+            },
+        ]
+        assert [json.loads(line) for line in lines] == expected_rows
+
+        # JSON would require to load all messages in memory.
+        request = self.client.get(
+            "/datapoint/value/",
+            {"datapoint__id__in": dp.id},
+            HTTP_ACCEPT="application/json",
+        )
+        assert request.status_code == 406
+
+    # The queries of offloaded reads are executed in other threads, which
+    # CaptureQueriesContext doesn't see.
+    @override_settings(ASYNC_READ_ENDPOINTS=False)
+    def test_get_datapoint_last_messages_in_one_query(self):
+        """
+        Check that the last message endpoints don't issue a query per
+        datapoint, as these are polled frequently by controllers.
+        """
+        msg_types = [
+            ("last_value", DatapointLastValue, "view_datapointlastvalue"),
+            (
+                "last_schedule",
+                DatapointLastSchedule,
+                "view_datapointlastschedule",
+            ),
+            (
+                "last_setpoint",
+                DatapointLastSetpoint,
+                "view_datapointlastsetpoint",
+            ),
+        ]
+        for _, _, codename in msg_types:
+            p = Permission.objects.get(codename=codename)
+            self.user.user_permissions.add(p)
+
+        for n_datapoints in [2, 20]:
+            Datapoint.objects.all().delete()
+            for i in range(n_datapoints):
+                dp = datapoint_factory(self.test_connector)
+                dp.is_active = True
+                dp.save()
+                time = datetime_from_timestamp(1585092224000 + i)
+                DatapointLastValue(datapoint=dp, value=i, time=time).save()
+                DatapointLastSchedule(
+                    datapoint=dp, schedule=[], time=time
+                ).save()
+                DatapointLastSetpoint(
+                    datapoint=dp, setpoint=[], time=time
+                ).save()
+
+            for msg_type, model, _ in msg_types:
+                with CaptureQueriesContext(connection) as queries:
+                    request = self.client.get("/datapoint/%s/" % msg_type)
+                assert request.status_code == 200
+                msgs = request.data["msgs_by_datapoint_id"]
+                assert len(msgs) == n_datapoints
+                # Authentication and permission checks cause some queries
+                # too, but the messages and datapoints must be fetched at
+                # once, independent of the number of datapoints. The first
+                # query computes the version token for the ETag.
+                api_queries = [q for q in queries if "api_main_" in q["sql"]]
+                assert len(api_queries) == 2
+                for api_query in api_queries:
+                    assert model._meta.db_table in api_query["sql"]
+
+    def test_get_datapoint_last_value_not_modified(self):
+        """
+        Check that clients polling the last values receive a 304 response
+        as long as no value has changed.
+        """
+        p = Permission.objects.get(codename="view_datapointlastvalue")
+        self.user.user_permissions.add(p)
+        dp = datapoint_factory(self.test_connector)
+        dp.is_active = True
+        dp.save()
+        last_value = DatapointLastValue(
+            datapoint=dp, value=1, time=datetime_from_timestamp(1585092224000)
+        )
+        last_value.save()
+
+        request = self.client.get("/datapoint/last_value/")
+        assert request.status_code == 200
+        etag = request["ETag"]
+
+        request = self.client.get(
+            "/datapoint/last_value/", HTTP_IF_NONE_MATCH=etag
+        )
+        assert request.status_code == 304
+        assert request["ETag"] == etag
+
+        # Any update must invalidate the ETag and the cached response.
+        last_value.value = 2
+        last_value.save()
+        request = self.client.get(
+            "/datapoint/last_value/", HTTP_IF_NONE_MATCH=etag
+        )
+        assert request.status_code == 200
+        assert request["ETag"] != etag
+        msg = request.data["msgs_by_datapoint_id"][str(dp.id)]
+        assert msg["value"] == json.dumps(2)
+
+    def test_put_datapoint_schedules_of_multiple_datapoints(self):
+        """
+        Write schedule messages of several datapoints in one request.
+        """
+        p = Permission.objects.get(codename="change_datapointschedule")
+        self.user.user_permissions.add(p)
+        dps = []
+        for _ in range(2):
+            dp = datapoint_factory(
+                self.test_connector,
+                data_format="continuous_numeric",
+                type="actuator",
+            )
+            dps.append(dp)
+        schedule = [
+            {
+                "from_timestamp": None,
+                "to_timestamp": None,
+                "value": json.dumps(21.0),
+            }
+        ]
+        timestamps = [1585092224000, 1585092225000]
+        test_data = {
+            "msgs_by_datapoint_id": {
+                str(dp.id): [
+                    {"schedule": schedule, "timestamp": ts}
+                    for ts in timestamps
+                ]
+                for dp in dps
+            }
+        }
+
+        request = self.client.put(
+            "/datapoint/schedule/", test_data, format="json"
+        )
+
+        assert request.status_code == 200
+        assert request.data == {"msgs_created": 4, "msgs_updated": 0}
+        for dp in dps:
+            assert DatapointSchedule.objects.filter(datapoint=dp).count() == 2
+            last_schedule = DatapointLastSchedule.objects.get(datapoint=dp)
+            assert last_schedule.time == datetime_from_timestamp(
+                timestamps[-1]
+            )
+
+        # Older messages, e.g. from a backfill, must not replace the last
+        # messages.
+        older_data = {
+            "msgs_by_datapoint_id": {
+                str(dps[0].id): [{"schedule": [], "timestamp": 1585092223000}]
+            }
+        }
+        request = self.client.put(
+            "/datapoint/schedule/", older_data, format="json"
+        )
+        assert request.status_code == 200
+        last_schedule = DatapointLastSchedule.objects.get(datapoint=dps[0])
+        assert last_schedule.time == datetime_from_timestamp(timestamps[-1])
+
+        # Unknown datapoints reject the whole request.
+        test_data["msgs_by_datapoint_id"]["0"] = []
+        request = self.client.put(
+            "/datapoint/schedule/", test_data, format="json"
+        )
+        assert request.status_code == 400
+        assert "0" in request.data["msgs_by_datapoint_id"]
+        assert DatapointSchedule.objects.count() == 5
+
+    def test_get_datapoint_value_resample(self):
+        """
+        Check that values are resampled to the requested grid and gaps are
+        filled as requested.
+        """
+        dp = datapoint_factory(self.test_connector)
+        dp.is_active = True
+        dp.save()
+        dp_2 = datapoint_factory(self.test_connector)
+        dp_2.is_active = True
+        dp_2.save()
+        # 2022-01-01T00:00:00Z
+        ts_start = 1640995200000
+        test_values = [(0, 1.0), (60000, 3.0), (2 * 900000 + 1000, 6.0)]
+        for offset, test_value in test_values:
+            DatapointValue(
+                datapoint=dp,
+                value=test_value,
+                time=datetime_from_timestamp(ts_start + offset),
+            ).save()
+
+        p = Permission.objects.get(codename="view_datapointvalue")
+        self.user.user_permissions.add(p)
+        expected_timestamps = [ts_start + i * 900000 for i in range(4)]
+        expected_values = {
+            "none": ["2.0", None, "6.0", None],
+            "locf": ["2.0", "2.0", "6.0", "6.0"],
+            "interpolate": ["2.0", "4.0", "6.0", None],
+        }
+        for fill, expected_dp_values in expected_values.items():
+            request = self.client.get(
+                "/datapoint/value/resample/",
+                {
+                    "datapoint__id__in": "%s,%s" % (dp.id, dp_2.id),
+                    "interval": "15 minutes",
+                    "fill": fill,
+                    "timestamp__gte": ts_start,
+                    "timestamp__lt": ts_start + 4 * 900000,
+                },
+            )
+
+            assert request.status_code == 200
+            assert request.data["timestamps"] == expected_timestamps
+            assert request.data["values"] == {
+                str(dp.id): expected_dp_values,
+                str(dp_2.id): [None] * 4,
+            }
+
+    def test_get_datapoint_value_resample_ignores_values_before_range(self):
+        """
+        Check that the grid is aligned to `origin` but only values within
+        the requested time range are averaged.
+        """
+        dp = datapoint_factory(self.test_connector)
+        dp.is_active = True
+        dp.save()
+        # 2022-01-01T00:00:00Z
+        ts_origin = 1640995200000
+        ts_start = ts_origin + 600000
+        test_values = [(ts_start - 1, 100.0), (ts_start + 120000, 2.0)]
+        for timestamp, test_value in test_values:
+            DatapointValue(
+                datapoint=dp,
+                value=test_value,
+                time=datetime_from_timestamp(timestamp),
+            ).save()
+
+        p = Permission.objects.get(codename="view_datapointvalue")
+        self.user.user_permissions.add(p)
+        request = self.client.get(
+            "/datapoint/value/resample/",
+            {
+                "datapoint__id__in": "%s" % dp.id,
+                "interval": "15 minutes",
+                "timestamp__gte": ts_start,
+                "timestamp__lt": ts_origin + 2 * 900000,
+                "origin": ts_origin,
+            },
+        )
+
+        assert request.status_code == 200
+        assert request.data["timestamps"] == [ts_origin, ts_origin + 900000]
+        assert request.data["values"] == {str(dp.id): ["2.0", None]}
+
+    def test_get_datapoint_value_resample_rejects_invalid_interval(self):
+        p = Permission.objects.get(codename="view_datapointvalue")
+        self.user.user_permissions.add(p)
+        request = self.client.get(
+            "/datapoint/value/resample/",
+            {
+                "datapoint__id__in": "1",
+                "interval": "1 month",
+                "timestamp__gte": 1640995200000,
+                "timestamp__lt": 1640995200001,
+            },
+        )
+        assert request.status_code == 400
+        assert "interval" in request.data
+
+    def test_get_datapoint_value_stats(self):
+        """
+        Check the statistics of a single datapoint and of many datapoints,
+        the latter including datapoints without any messages.
+        """
+        dp = datapoint_factory(self.test_connector)
+        dp.is_active = True
+        dp.data_format = "generic_numeric"
+        dp.save()
+        dp_2 = datapoint_factory(self.test_connector)
+        dp_2.is_active = True
+        dp_2.save()
+        # 2022-01-01T00:00:00Z
+        ts_start = 1640995200000
+        for i, test_value in enumerate([1.0, 2.0, 6.0]):
+            DatapointValue(
+                datapoint=dp,
+                value=test_value,
+                time=datetime_from_timestamp(ts_start + i * 1800000),
+            ).save()
+
+        p = Permission.objects.get(codename="view_datapointvalue")
+        self.user.user_permissions.add(p)
+        expected_data = {
+            "count": 3,
+            "first_timestamp": ts_start,
+            "last_timestamp": ts_start + 3600000,
+            "min": 1.0,
+            "max": 6.0,
+            "mean": 3.0,
+            "message_rate": 3.0,
+        }
+        request = self.client.get("/datapoint/%s/value/stats/" % dp.id)
+        assert request.status_code == 200
+        assert request.data == expected_data
+
+        request = self.client.get(
+            "/datapoint/value/stats/",
+            {"datapoint__id__in": "%s,%s" % (dp.id, dp_2.id)},
+        )
+        assert request.status_code == 200
+        assert request.data["table"]["approximate_count"] == 3
+        assert request.data["statistics_by_datapoint_id"] == {
+            str(dp.id): expected_data,
+            str(dp_2.id): {
+                "count": 0,
+                "first_timestamp": None,
+                "last_timestamp": None,
+                "min": None,
+                "max": None,
+                "mean": None,
+                "message_rate": None,
+            },
+        }
+
     def test_post_datapoint_value_detail_rejected_for_sensor(self):
         """
         Check that it is not possible to write sensor message from the client.
@@ -4,17 +4,45 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 from .views import DatapointViewSet
 from .views import DatapointValueViewSet
+from .views import DatapointValueResampleViewSet
+from .views import DatapointValueStatisticsViewSet
 from .views import DatapointScheduleViewSet
 from .views import DatapointSetpointViewSet
 from .views import DatapointLastValueViewSet
 from .views import DatapointLastScheduleViewSet
 from .views import DatapointLastSetpointViewSet
 from .views import PrometheusMetricsViewSet
+from api_main.db_routers import replica_reads
+from ems_utils.message_format.views import async_view
+from ems_utils.message_format.views import offload_safe_methods
 
 # Which endpoints are provided depends on these two setting flags (see Readme):
 ACTIVATE_CONTROL_EXTENSION = settings.ACTIVATE_CONTROL_EXTENSION
 ACTIVATE_HISTORY_EXTENSION = settings.ACTIVATE_HISTORY_EXTENSION
 
+
+def offload_reads(request):
+    """
+    Offload reads to the thread pool of `async_view`. The setting is
+    evaluated per request, such that it can be overridden in tests.
+    """
+    return settings.ASYNC_READ_ENDPOINTS and offload_safe_methods(request)
+
+
+def message_view(view):
+    """
+    Wrap the views of the message endpoints, which may map reads as well
+    as writes. Potentially long running reads are served by an async view
+    that executes them in a thread pool, see ASYNC_READ_ENDPOINTS in
+    settings, writes are executed like any sync view. History reads may be
+    served by a read replica, see api_main/db_routers.py
+    """
+    view = replica_reads(view)
+    if settings.ASYNC_READ_ENDPOINTS:
+        return async_view(view, offload=offload_reads)
+    return view
+
+
 # These endpoints don't depend on the settings above. They are always provided.
 urlpatterns = [
     path("schema/", SpectacularAPIView.as_view(), name="schema"),
@@ -39,7 +67,9 @@ if not ACTIVATE_CONTROL_EXTENSION and not ACTIVATE_HISTORY_EXTENSION:
         [
             path(
                 "datapoint/last_value/",
-                DatapointLastValueViewSet.as_view({"get": "list"}),
+                message_view(
+                    DatapointLastValueViewSet.as_view({"get": "list"})
+                ),
             ),
             path(
                 "datapoint/<int:dp_id>/value/",
@@ -55,15 +85,21 @@ elif ACTIVATE_CONTROL_EXTENSION and not ACTIVATE_HISTORY_EXTENSION:
         [
             path(
                 "datapoint/last_value/",
-                DatapointLastValueViewSet.as_view({"get": "list"}),
+                message_view(
+                    DatapointLastValueViewSet.as_view({"get": "list"})
+                ),
             ),
             path(
                 "datapoint/last_schedule/",
-                DatapointLastScheduleViewSet.as_view({"get": "list"}),
+                message_view(
+                    DatapointLastScheduleViewSet.as_view({"get": "list"})
+                ),
             ),
             path(
                 "datapoint/last_setpoint/",
-                DatapointLastSetpointViewSet.as_view({"get": "list"}),
+                message_view(
+                    DatapointLastSetpointViewSet.as_view({"get": "list"})
+                ),
             ),
             path(
                 "datapoint/<int:dp_id>/value/",
@@ -86,12 +122,44 @@ elif not ACTIVATE_CONTROL_EXTENSION and ACTIVATE_HISTORY_EXTENSION:
         [
             path(
                 "datapoint/last_value/",
-                DatapointLastValueViewSet.as_view({"get": "list"}),
+                message_view(
+                    DatapointLastValueViewSet.as_view({"get": "list"})
+                ),
+            ),
+            path(
+                "datapoint/value/resample/",
+                message_view(
+                    DatapointValueResampleViewSet.as_view({"get": "list"})
+                ),
+            ),
+            path(
+                "datapoint/value/stats/",
+                message_view(
+                    DatapointValueStatisticsViewSet.as_view({"get": "list"})
+                ),
+            ),
+            path(
+                "datapoint/<int:dp_id>/value/stats/",
+                message_view(
+                    DatapointValueStatisticsViewSet.as_view(
+                        {"get": "retrieve"}
+                    )
+                ),
+            ),
+            path(
+                "datapoint/value/",
+                message_view(
+                    DatapointValueViewSet.as_view(
+                        {"get": "export", "put": "update_many_by_datapoint_id"}
+                    )
+                ),
             ),
             path(
                 "datapoint/<int:dp_id>/value/",
-                DatapointValueViewSet.as_view(
-                    {"get": "list", "post": "create", "put": "update_many"}
+                message_view(
+                    DatapointValueViewSet.as_view(
+                        {"get": "list", "post": "create", "put": "update_many"}
+                    )
                 ),
             ),
             path(
@@ -107,30 +175,84 @@ elif ACTIVATE_CONTROL_EXTENSION and ACTIVATE_HISTORY_EXTENSION:
         [
             path(
                 "datapoint/last_value/",
-                DatapointLastValueViewSet.as_view({"get": "list"}),
+                message_view(
+                    DatapointLastValueViewSet.as_view({"get": "list"})
+                ),
             ),
             path(
                 "datapoint/last_schedule/",
-                DatapointLastScheduleViewSet.as_view({"get": "list"}),
+                message_view(
+                    DatapointLastScheduleViewSet.as_view({"get": "list"})
+                ),
             ),
             path(
                 "datapoint/last_setpoint/",
-                DatapointLastSetpointViewSet.as_view({"get": "list"}),
+                message_view(
+                    DatapointLastSetpointViewSet.as_view({"get": "list"})
+                ),
+            ),
+            path(
+                "datapoint/value/resample/",
+                message_view(
+                    DatapointValueResampleViewSet.as_view({"get": "list"})
+                ),
+            ),
+            path(
+                "datapoint/value/stats/",
+                message_view(
+                    DatapointValueStatisticsViewSet.as_view({"get": "list"})
+                ),
+            ),
+            path(
+                "datapoint/<int:dp_id>/value/stats/",
+                message_view(
+                    DatapointValueStatisticsViewSet.as_view(
+                        {"get": "retrieve"}
+                    )
+                ),
+            ),
+            path(
+                "datapoint/value/",
+                message_view(
+                    DatapointValueViewSet.as_view(
+                        {"get": "export", "put": "update_many_by_datapoint_id"}
+                    )
+                ),
             ),
             path(
                 "datapoint/<int:dp_id>/value/",
-                DatapointValueViewSet.as_view(
-                    {"get": "list", "post": "create", "put": "update_many"}
+                message_view(
+                    DatapointValueViewSet.as_view(
+                        {"get": "list", "post": "create", "put": "update_many"}
+                    )
                 ),
             ),
             path(
                 "datapoint/<int:dp_id>/value/<int:timestamp>/",
                 DatapointValueViewSet.as_view({"delete": "destroy"}),
             ),
+            path(
+                "datapoint/schedule/",
+                message_view(
+                    DatapointScheduleViewSet.as_view(
+                        {"get": "export", "put": "update_many_by_datapoint_id"}
+                    )
+                ),
+            ),
+            path(
+                "datapoint/setpoint/",
+                message_view(
+                    DatapointSetpointViewSet.as_view(
+                        {"get": "export", "put": "update_many_by_datapoint_id"}
+                    )
+                ),
+            ),
             path(
                 "datapoint/<int:dp_id>/schedule/",
-                DatapointScheduleViewSet.as_view(
-                    {"get": "list", "post": "create", "put": "update_many"}
+                message_view(
+                    DatapointScheduleViewSet.as_view(
+                        {"get": "list", "post": "create", "put": "update_many"}
+                    )
                 ),
             ),
             path(
@@ -139,8 +261,10 @@ elif ACTIVATE_CONTROL_EXTENSION and ACTIVATE_HISTORY_EXTENSION:
             ),
             path(
                 "datapoint/<int:dp_id>/setpoint/",
-                DatapointSetpointViewSet.as_view(
-                    {"get": "list", "post": "create", "put": "update_many"}
+                message_view(
+                    DatapointSetpointViewSet.as_view(
+                        {"get": "list", "post": "create", "put": "update_many"}
+                    )
                 ),
             ),
             path(
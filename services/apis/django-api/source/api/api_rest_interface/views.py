@@ -7,7 +7,13 @@ the generic implementation in ems_utils to display in the API schema.
 """
 import json
 
+import numpy as np
+from django.conf import settings
+from django.db import router
+from django.db import connections
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import OpenApiParameter
 from django.utils.encoding import smart_str
 from django.shortcuts import get_object_or_404
 from prometheus_client import multiprocess
@@ -27,7 +33,12 @@ from api_main.models.datapoint import DatapointSetpoint
 from api_main.models.datapoint import DatapointLastValue
 from api_main.models.datapoint import DatapointLastSchedule
 from api_main.models.datapoint import DatapointLastSetpoint
+from api_main.continuous_aggregates import TIME_BUCKET_ORIGIN
+from api_main.continuous_aggregates import timescale_available
 from api_main.mqtt_integration import ApiMqttIntegration
+from api_main.storage_policies import StorageMetricsCollector
+from api_main.value_statistics import table_statistics
+from api_main.value_statistics import value_statistics
 from ems_utils.message_format.views import DatapointViewSetTemplate
 from ems_utils.message_format.views import ViewSetWithDatapointFK
 from ems_utils.message_format.views import ViewSetWithMulitDatapointFK
@@ -39,7 +50,24 @@ from ems_utils.message_format.serializers import DatapointLastValueSerializer
 from ems_utils.message_format.serializers import DatapointLastScheduleSerializer
 from ems_utils.message_format.serializers import DatapointLastSetpointSerializer
 from ems_utils.message_format.serializers import PutMsgSummary
+from ems_utils.message_format.serializers import (
+    DatapointValueListByDatapointIdSerializer,
+)
+from ems_utils.message_format.serializers import (
+    DatapointScheduleListByDatapointIdSerializer,
+)
+from ems_utils.message_format.serializers import (
+    DatapointSetpointListByDatapointIdSerializer,
+)
+from ems_utils.resampling import fill_gaps
+from ems_utils.resampling import resample_to_grid
+from ems_utils.timestamp import datetime_from_timestamp
 from .serializers import DatapointSerializer
+from .serializers import DatapointValueDataFrameSerializer
+from .serializers import ResampleParamsSerializer
+from .serializers import ValueStatisticsParamsSerializer
+from .serializers import DatapointValueStatisticsSerializer
+from .serializers import DatapointValueStatisticsListSerializer
 from .filters import DatapointFilter
 from .filters import DatapointValueFilter
 from .filters import DatapointSetpointFilter
@@ -49,6 +77,24 @@ from .filters import DatapointLastSetpointFilter
 from .filters import DatapointLastScheduleFilter
 from .models import Metric
 
+# Documents the `export` action of the message endpoints.
+export_schema = extend_schema(
+    parameters=[
+        OpenApiParameter(
+            "datapoint__id__in",
+            description=(
+                "Comma separated list of the IDs of the datapoints to export "
+                "messages for, e.g. `1,2,42`."
+            ),
+            required=True,
+        )
+    ],
+    responses={
+        (200, "text/csv"): OpenApiTypes.STR,
+        (200, "application/x-ndjson"): OpenApiTypes.STR,
+    },
+)
+
 
 @extend_schema(tags=["Datapoint"],)
 class DatapointViewSet(DatapointViewSetTemplate):
@@ -247,10 +293,12 @@ class DatapointValueViewSet(ViewSetWithDatapointFK):
     __doc__ = DatapointValue.__doc__.strip()
     model = DatapointValue
     datapoint_model = Datapoint
+    last_model = DatapointLastValue
     queryset = DatapointValue.timescale.all()
     serializer_class = DatapointValueSerializer
     create_for_actuators_only = True
     filterset_class = DatapointValueFilter
+    allow_downsampling = True
 
     def create(self, request, dp_id):
         """
@@ -285,6 +333,205 @@ class DatapointValueViewSet(ViewSetWithDatapointFK):
     def update_many(self, *args, **kwargs):
         return super().update_many(*args, **kwargs)
 
+    @extend_schema(
+        request=DatapointValueListByDatapointIdSerializer,
+        responses=PutMsgSummary,
+        parameters=[],
+    )
+    def update_many_by_datapoint_id(self, *args, **kwargs):
+        return super().update_many_by_datapoint_id(*args, **kwargs)
+
+    @export_schema
+    def export(self, *args, **kwargs):
+        return super().export(*args, **kwargs)
+
+
+@extend_schema(tags=["Datapoint Value"],)
+class DatapointValueResampleViewSet(GenericViewSet):
+    """
+    Returns the numeric values of one or more datapoints resampled to a
+    regular time grid, i.e. the average value within each bucket.
+    """
+
+    datapoint_queryset = Datapoint.objects.filter(is_active=True)
+    # This is required for automatic permission checking.
+    queryset = DatapointValue.timescale.all()
+    serializer_class = DatapointValueDataFrameSerializer
+
+    @extend_schema(parameters=[ResampleParamsSerializer])
+    def list(self, request):
+        params_serializer = ResampleParamsSerializer(data=request.query_params)
+        params_serializer.is_valid(raise_exception=True)
+        params = params_serializer.validated_data
+
+        datapoint_ids = list(
+            self.datapoint_queryset.filter(
+                id__in=params["datapoint__id__in"]
+            ).values_list("id", flat=True)
+        )
+        if "timescale" in settings.DATABASES["default"]["ENGINE"]:
+            values_by_id = self.resample_in_db(datapoint_ids, params)
+        else:
+            values_by_id = self.resample_in_python(datapoint_ids, params)
+
+        values = {}
+        for datapoint_id in datapoint_ids:
+            if datapoint_id not in values_by_id:
+                values[str(datapoint_id)] = [None] * params["n_buckets"]
+                continue
+            values[str(datapoint_id)] = [
+                None if np.isnan(v) else json.dumps(v)
+                for v in values_by_id[datapoint_id].tolist()
+            ]
+        timestamps = (
+            params["grid_start"]
+            + np.arange(params["n_buckets"]) * params["interval_ms"]
+        )
+        data = {
+            "values": values,
+            "timestamps": np.round(timestamps).astype(np.int64).tolist(),
+        }
+        return Response(data)
+
+    def resample_in_db(self, datapoint_ids, params):
+        """
+        Resample with `time_bucket_gapfill` in TimescaleDB. The times are
+        shifted by an offset to align the buckets with the requested grid.
+        The grid only places the buckets, the values are restricted to the
+        requested time range.
+        """
+        grid_start = datetime_from_timestamp(params["grid_start"])
+        grid_end = grid_start + params["interval"] * params["n_buckets"]
+        time_gte = datetime_from_timestamp(params["timestamp__gte"])
+        time_lt = datetime_from_timestamp(params["timestamp__lt"])
+        offset = (grid_start - TIME_BUCKET_ORIGIN) % params["interval"]
+        aggregation = "avg(_value_float)"
+        if params["fill"] != "none":
+            aggregation = "%s(%s)" % (params["fill"], aggregation)
+
+        sql = (
+            "SELECT datapoint_id, bucket + %(offset)s AS bucket, value FROM ("
+            "SELECT datapoint_id, "
+            "time_bucket_gapfill(%(interval)s, time - %(offset)s, "
+            "%(gapfill_start)s, %(gapfill_end)s) AS bucket, "
+            "{aggregation} AS value "
+            "FROM {table} "
+            "WHERE datapoint_id = ANY(%(datapoint_ids)s) "
+            "AND time >= %(time_gte)s AND time < %(time_lt)s "
+            "GROUP BY datapoint_id, bucket"
+            ") AS gapfilled ORDER BY datapoint_id, bucket;"
+        ).format(aggregation=aggregation, table=DatapointValue._meta.db_table)
+        sql_params = {
+            "offset": offset,
+            "interval": params["interval"],
+            "gapfill_start": grid_start - offset,
+            "gapfill_end": grid_end - offset,
+            "datapoint_ids": datapoint_ids,
+            "time_gte": time_gte,
+            "time_lt": time_lt,
+        }
+
+        values_by_id = {}
+        connection = connections[router.db_for_read(DatapointValue)]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, sql_params)
+            for datapoint_id, bucket, value in cursor.fetchall():
+                if datapoint_id not in values_by_id:
+                    values_by_id[datapoint_id] = np.full(
+                        params["n_buckets"], np.nan
+                    )
+                i = round((bucket - grid_start) / params["interval"])
+                if 0 <= i < params["n_buckets"] and value is not None:
+                    values_by_id[datapoint_id][i] = value
+        return values_by_id
+
+    def resample_in_python(self, datapoint_ids, params):
+        """
+        Vectorized fallback for DBs without `time_bucket_gapfill`.
+        """
+        rows = (
+            DatapointValue.objects.filter(
+                datapoint_id__in=datapoint_ids,
+                time__gte=datetime_from_timestamp(params["timestamp__gte"]),
+                time__lt=datetime_from_timestamp(params["timestamp__lt"]),
+                _value_float__isnull=False,
+            )
+            .values_list("datapoint_id", "time", "_value_float")
+            .iterator(chunk_size=10000)
+        )
+        row_datapoint_ids = []
+        row_times = []
+        row_values = []
+        for datapoint_id, time, value in rows:
+            row_datapoint_ids.append(datapoint_id)
+            row_times.append(time.timestamp())
+            row_values.append(value)
+        row_datapoint_ids = np.asarray(row_datapoint_ids, dtype=np.int64)
+        row_times = np.asarray(row_times, dtype=float)
+        row_values = np.asarray(row_values, dtype=float)
+
+        values_by_id = {}
+        for datapoint_id in datapoint_ids:
+            is_datapoint = row_datapoint_ids == datapoint_id
+            averages = resample_to_grid(
+                times=row_times[is_datapoint],
+                values=row_values[is_datapoint],
+                grid_start=params["grid_start"] / 1000,
+                interval=params["interval_ms"] / 1000,
+                n_buckets=params["n_buckets"],
+            )
+            values_by_id[datapoint_id] = fill_gaps(averages, params["fill"])
+        return values_by_id
+
+
+@extend_schema(tags=["Datapoint Value"],)
+class DatapointValueStatisticsViewSet(GenericViewSet):
+    """
+    Returns statistics of the value messages, like the number of messages
+    or the timestamp of the last one. On TimescaleDB these are computed
+    from indexes, chunk metadata and continuous aggregates, and are hence
+    cheap even for very long histories.
+    """
+
+    datapoint_queryset = Datapoint.objects.filter(is_active=True)
+    # This is required for automatic permission checking.
+    queryset = DatapointValue.timescale.all()
+    serializer_class = DatapointValueStatisticsSerializer
+
+    def get_connection(self):
+        return connections[router.db_for_read(DatapointValue)]
+
+    @extend_schema(
+        parameters=[ValueStatisticsParamsSerializer],
+        responses=DatapointValueStatisticsListSerializer,
+    )
+    def list(self, request):
+        params_serializer = ValueStatisticsParamsSerializer(
+            data=request.query_params
+        )
+        params_serializer.is_valid(raise_exception=True)
+        params = params_serializer.validated_data
+
+        datapoints = self.datapoint_queryset
+        if "datapoint__id__in" in params:
+            datapoints = datapoints.filter(id__in=params["datapoint__id__in"])
+        connection = self.get_connection()
+        statistics_by_id = value_statistics(
+            datapoints.only("id", "data_format"), connection
+        )
+        data = {
+            "table": table_statistics(connection),
+            "statistics_by_datapoint_id": {
+                str(k): v for k, v in statistics_by_id.items()
+            },
+        }
+        return Response(data)
+
+    def retrieve(self, request, dp_id):
+        datapoint = get_object_or_404(self.datapoint_queryset, id=dp_id)
+        statistics_by_id = value_statistics([datapoint], self.get_connection())
+        return Response(statistics_by_id[datapoint.id])
+
 
 @extend_schema(tags=["Datapoint Value"],)
 class DatapointLastValueViewSet(ViewSetWithMulitDatapointFK):
@@ -303,6 +550,7 @@ class DatapointScheduleViewSet(ViewSetWithDatapointFK):
     __doc__ = DatapointSchedule.__doc__.strip()
     model = DatapointSchedule
     datapoint_model = Datapoint
+    last_model = DatapointLastSchedule
     queryset = DatapointSchedule.objects.all()
     serializer_class = DatapointScheduleSerializer
     create_for_actuators_only = True
@@ -344,6 +592,18 @@ class DatapointScheduleViewSet(ViewSetWithDatapointFK):
     def update_many(self, *args, **kwargs):
         return super().update_many(*args, **kwargs)
 
+    @extend_schema(
+        request=DatapointScheduleListByDatapointIdSerializer,
+        responses=PutMsgSummary,
+        parameters=[],
+    )
+    def update_many_by_datapoint_id(self, *args, **kwargs):
+        return super().update_many_by_datapoint_id(*args, **kwargs)
+
+    @export_schema
+    def export(self, *args, **kwargs):
+        return super().export(*args, **kwargs)
+
 
 @extend_schema(tags=["Datapoint Schedule"],)
 class DatapointLastScheduleViewSet(ViewSetWithMulitDatapointFK):
@@ -362,6 +622,7 @@ class DatapointSetpointViewSet(ViewSetWithDatapointFK):
     __doc__ = DatapointSetpoint.__doc__.strip()
     model = DatapointSetpoint
     datapoint_model = Datapoint
+    last_model = DatapointLastSetpoint
     queryset = DatapointSetpoint.objects.all()
     serializer_class = DatapointSetpointSerializer
     create_for_actuators_only = True
@@ -402,6 +663,18 @@ class DatapointSetpointViewSet(ViewSetWithDatapointFK):
         def update_many(self, *args, **kwargs):
             return super().update_many(*args, **kwargs)
 
+    @extend_schema(
+        request=DatapointSetpointListByDatapointIdSerializer,
+        responses=PutMsgSummary,
+        parameters=[],
+    )
+    def update_many_by_datapoint_id(self, *args, **kwargs):
+        return super().update_many_by_datapoint_id(*args, **kwargs)
+
+    @export_schema
+    def export(self, *args, **kwargs):
+        return super().export(*args, **kwargs)
+
 
 @extend_schema(tags=["Datapoint Setpoint"],)
 class DatapointLastSetpointViewSet(ViewSetWithMulitDatapointFK):
@@ -440,6 +713,8 @@ class PrometheusMetricsViewSet(GenericViewSet):
     def retrieve(self, request):
         registry = CollectorRegistry()
         multiprocess.MultiProcessCollector(registry)
+        if timescale_available():
+            registry.register(StorageMetricsCollector())
         metrics = generate_latest(registry)
         headers = {
             "Content-type": CONTENT_TYPE_LATEST,
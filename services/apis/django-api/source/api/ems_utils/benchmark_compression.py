@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+"""
+This is a simple script that compares the CPU time spent on compressing
+typical responses of the REST API with the bytes saved by it, for all
+encodings and a range of compression levels.
+
+The responses are synthetic but resemble those of the API: a history of
+value messages, a history of schedule messages and the metadata of many
+datapoints. Run this from the directory containing ems_utils with:
+
+python -m ems_utils.benchmark_compression
+"""
+import json
+import time
+import random
+import logging
+import argparse
+
+from ems_utils.compression import ENCODERS
+from ems_utils.compression import compress_content
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s-%(levelname)s: %(message)s",
+)
+logger = logging.getLogger()
+
+# The levels to benchmark for each encoding.
+LEVELS = {"gzip": [1, 6, 9], "br": [1, 4, 6, 11], "zstd": [1, 3, 9, 19]}
+
+
+def value_history(n_msgs):
+    """
+    Like GET /datapoint/{id}/value/ for a temperature sensor.
+    """
+    timestamp = 1640995200000
+    value = 21.0
+    msgs = []
+    for _ in range(n_msgs):
+        timestamp += 60000
+        value = round(value + random.uniform(-0.2, 0.2), 1)
+        msgs.append({"value": json.dumps(value), "timestamp": timestamp})
+    return json.dumps(msgs).encode()
+
+
+def schedule_history(n_msgs):
+    """
+    Like GET /datapoint/{id}/schedule/ with a day ahead schedule of 15
+    minute slots in every message.
+    """
+    timestamp = 1640995200000
+    msgs = []
+    for _ in range(n_msgs):
+        timestamp += 900000
+        schedule = []
+        for i in range(96):
+            schedule.append(
+                {
+                    "from_timestamp": timestamp + i * 900000,
+                    "to_timestamp": timestamp + (i + 1) * 900000,
+                    "value": json.dumps(round(random.uniform(15, 25), 1)),
+                }
+            )
+        msgs.append({"schedule": schedule, "timestamp": timestamp})
+    return json.dumps(msgs).encode()
+
+
+def datapoint_metadata(n_datapoints):
+    """
+    Like GET /datapoint/ for a number of connectors.
+    """
+    datapoints = []
+    for i in range(n_datapoints):
+        datapoints.append(
+            {
+                "id": i + 1,
+                "type": random.choice(["sensor", "actuator"]),
+                "data_format": random.choice(
+                    ["generic_numeric", "continuous_numeric", "bool"]
+                ),
+                "short_name": "room_%s_temperature" % i,
+                "description": "Temperature measured in room %s." % i,
+                "min_value": None,
+                "max_value": None,
+                "allowed_values": None,
+                "unit": "°C",
+                "connector": {"name": "connector-%s" % (i % 10)},
+                "key_in_connector": "devices/%s/sensors/temperature" % i,
+            }
+        )
+    return json.dumps(datapoints).encode()
+
+
+def benchmark(payloads, n_repetitions):
+    """
+    Compress every payload with every encoder and level and log the
+    results.
+    """
+    for name, payload in payloads.items():
+        logger.info("%s: %.1f kB uncompressed", name, len(payload) / 1000)
+        for encoder_class in ENCODERS:
+            for level in LEVELS[encoder_class.encoding]:
+                started = time.process_time()
+                for _ in range(n_repetitions):
+                    encoder = encoder_class(level)
+                    compressed = compress_content(encoder, payload)
+                cpu_time = (time.process_time() - started) / n_repetitions
+                logger.info(
+                    "    %-4s level %2s: %6.2f ms CPU, %8.1f kB (%4.1f%%), "
+                    "%6.1f MB/s",
+                    encoder_class.encoding,
+                    level,
+                    cpu_time * 1000,
+                    len(compressed) / 1000,
+                    len(compressed) / len(payload) * 100,
+                    len(payload) / cpu_time / 1e6,
+                )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n",
+        "--n-msgs",
+        type=int,
+        default=10000,
+        help="Number of value messages in the value history, the other "
+        "responses are scaled accordingly. Defaults to 10000.",
+    )
+    parser.add_argument(
+        "-r",
+        "--repetitions",
+        type=int,
+        default=5,
+        help="Number of times each payload is compressed. Defaults to 5.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(0)
+    payloads = {
+        "Value history": value_history(args.n_msgs),
+        "Schedule history": schedule_history(max(args.n_msgs // 100, 1)),
+        "Datapoint metadata": datapoint_metadata(max(args.n_msgs // 20, 1)),
+    }
+    benchmark(payloads, args.repetitions)
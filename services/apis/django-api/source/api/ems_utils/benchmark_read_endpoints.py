@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+"""
+This is a simple script that measures how a REST API that exposes the
+message format copes with a mix of slow and fast read requests.
+
+A number of clients continuously request a long history (the slow requests)
+while other clients poll the latest values (the fast requests). For both
+groups the number of requests per second and the latency percentiles are
+reported. Run the script once against a deployment with
+ASYNC_READ_ENDPOINTS=FALSE and once with ASYNC_READ_ENDPOINTS=TRUE to
+compare both. The API must have these endpoints for this script to work:
+
+GET /datapoint/{dp_id}/value/
+    Used for the slow requests.
+GET /datapoint/last_value/
+    Used for the fast requests.
+"""
+import time
+import logging
+import argparse
+from threading import Event
+from statistics import quantiles
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s-%(funcName)s-%(levelname)s: %(message)s",
+)
+logger = logging.getLogger()
+
+
+def request_until_stopped(url, auth, stop_event):
+    """
+    Request `url` again and again until `stop_event` is set.
+
+    Arguments:
+    ----------
+    url : str
+        The URL to request.
+    auth : tuple or None
+        Username and password for basic authentication.
+    stop_event : threading.Event
+        Signals that the benchmark is over.
+
+    Returns:
+    --------
+    latencies : list of float
+        The duration of each successful request in seconds.
+    n_errors : int
+        The number of requests that have failed.
+    """
+    latencies = []
+    n_errors = 0
+    session = requests.Session()
+    session.auth = auth
+    while not stop_event.is_set():
+        started = time.monotonic()
+        try:
+            response = session.get(url)
+            response.raise_for_status()
+        except requests.RequestException:
+            n_errors += 1
+            continue
+        latencies.append(time.monotonic() - started)
+    return latencies, n_errors
+
+
+def summarize(name, results, duration):
+    """
+    Log requests per second and latency percentiles of a group of clients.
+    """
+    latencies = []
+    n_errors = 0
+    for client_latencies, client_n_errors in results:
+        latencies.extend(client_latencies)
+        n_errors += client_n_errors
+
+    if len(latencies) < 2:
+        logger.info("%s: Not enough successful requests.", name)
+        return
+    percentiles = quantiles(latencies, n=100)
+    logger.info(
+        "%s: %.1f requests/s, %s errors, latency in ms: "
+        "p50=%.1f p95=%.1f p99=%.1f max=%.1f",
+        name,
+        len(latencies) / duration,
+        n_errors,
+        percentiles[49] * 1000,
+        percentiles[94] * 1000,
+        percentiles[98] * 1000,
+        max(latencies) * 1000,
+    )
+
+
+def benchmark(
+    target_url,
+    auth,
+    datapoint_id,
+    history_query,
+    n_slow_clients,
+    n_fast_clients,
+    duration,
+):
+    """
+    Run the slow and fast clients concurrently for `duration` seconds.
+    """
+    target_url = target_url.rstrip("/")
+    slow_url = "%s/datapoint/%s/value/?%s" % (
+        target_url,
+        datapoint_id,
+        history_query,
+    )
+    fast_url = "%s/datapoint/last_value/" % target_url
+
+    stop_event = Event()
+    n_clients = n_slow_clients + n_fast_clients
+    with ThreadPoolExecutor(max_workers=n_clients) as executor:
+        slow_futures = [
+            executor.submit(request_until_stopped, slow_url, auth, stop_event)
+            for _ in range(n_slow_clients)
+        ]
+        fast_futures = [
+            executor.submit(request_until_stopped, fast_url, auth, stop_event)
+            for _ in range(n_fast_clients)
+        ]
+        time.sleep(duration)
+        stop_event.set()
+        slow_results = [f.result() for f in slow_futures]
+        fast_results = [f.result() for f in fast_futures]
+
+    summarize("History requests", slow_results, duration)
+    summarize("Latest value requests", fast_results, duration)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-t",
+        "--target-url",
+        required=True,
+        help="The base URL of the REST API, e.g. http://localhost:8080/",
+    )
+    parser.add_argument("-u", "--username", help="Username for basic auth.")
+    parser.add_argument("-p", "--password", help="Password for basic auth.")
+    parser.add_argument(
+        "-i",
+        "--datapoint-id",
+        required=True,
+        help="The id of the datapoint to request the history for.",
+    )
+    parser.add_argument(
+        "-q",
+        "--history-query",
+        default="",
+        help=(
+            "Query parameters for the history requests, e.g. "
+            "timestamp__gte=1609459200000. Should select many messages."
+        ),
+    )
+    parser.add_argument(
+        "-s",
+        "--slow-clients",
+        type=int,
+        default=4,
+        help="Number of clients requesting the history. Defaults to 4.",
+    )
+    parser.add_argument(
+        "-f",
+        "--fast-clients",
+        type=int,
+        default=16,
+        help="Number of clients polling the latest values. Defaults to 16.",
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        type=float,
+        default=60,
+        help="Duration of the benchmark in seconds. Defaults to 60.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    auth = None
+    if args.username:
+        auth = (args.username, args.password)
+    benchmark(
+        target_url=args.target_url,
+        auth=auth,
+        datapoint_id=args.datapoint_id,
+        history_query=args.history_query,
+        n_slow_clients=args.slow_clients,
+        n_fast_clients=args.fast_clients,
+        duration=args.duration,
+    )
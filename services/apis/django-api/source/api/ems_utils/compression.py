@@ -0,0 +1,229 @@
+"""
+Compression of HTTP responses with the best encoding the client accepts.
+
+Supports zstd and brotli (if the `zstandard` and `brotli` packages are
+installed) and gzip. Unlike Django's GZipMiddleware this handles several
+encodings and a minimum size, and it compresses outside the thread that
+is shared by all sync code under ASGI.
+"""
+import re
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ModuleNotFoundError:
+    brotli = None
+
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+# Only these are worth compressing, e.g. images are compressed already. The
+# binary message formats are, as these repeat the keys of every message.
+COMPRESSIBLE_CONTENT_TYPE_RE = re.compile(
+    r"^(text/|application/(json|x-ndjson|javascript|xml|vnd\.oai\.openapi|"
+    r"msgpack|cbor)|application/[\w.-]+\+(json|xml))"
+)
+
+
+class GzipEncoder:
+    """
+    Compresses one response body to gzip.
+
+    All encoders have the same interface: `compress` returns the compressed
+    bytes of a part of the body, that are guaranteed to be decodable after
+    `flush`. `finish` returns the remaining bytes after the last part.
+    """
+
+    encoding = "gzip"
+    default_level = 6
+
+    def __init__(self, level):
+        # wbits > 16 writes a gzip header and trailer.
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + 15)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    """
+    Compresses one response body to brotli, see `GzipEncoder`.
+    """
+
+    encoding = "br"
+    # Higher levels are too slow to compress responses on the fly.
+    default_level = 4
+
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdEncoder:
+    """
+    Compresses one response body to zstd, see `GzipEncoder`.
+    """
+
+    encoding = "zstd"
+    default_level = 3
+
+    def __init__(self, level):
+        compressor = zstandard.ZstdCompressor(level=level)
+        self.compressor = compressor.compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+# In order of preference, if the client accepts several equally.
+ENCODERS = [GzipEncoder]
+if brotli is not None:
+    ENCODERS.insert(0, BrotliEncoder)
+if zstandard is not None:
+    ENCODERS.insert(0, ZstdEncoder)
+
+
+def select_encoder(accept_encoding, encoders=ENCODERS):
+    """
+    Select the encoder for the most preferred encoding the client accepts.
+
+    Arguments:
+    ----------
+    accept_encoding : str
+        The Accept-Encoding header of the request, e.g. "gzip, br;q=0.8".
+    encoders : list of encoder classes
+        The available encoders in order of preference of the server.
+
+    Returns:
+    --------
+    encoder : encoder class or None
+        None if the client accepts none of `encoders`.
+    """
+    qualities = {}
+    for item in accept_encoding.lower().split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip()] = quality
+
+    selected_encoder = None
+    selected_quality = 0.0
+    for encoder in encoders:
+        quality = qualities.get(encoder.encoding, qualities.get("*", 0.0))
+        if quality > selected_quality:
+            selected_encoder = encoder
+            selected_quality = quality
+    return selected_encoder
+
+
+def compress_content(encoder, content):
+    """
+    Compress `content` (bytes) at once.
+    """
+    return encoder.compress(content) + encoder.finish()
+
+
+def compress_stream(encoder, parts):
+    """
+    Compress `parts`, an iterable of bytes, part by part. Every part is
+    flushed so that clients can decode it immediately.
+    """
+    for part in parts:
+        compressed = encoder.compress(part) + encoder.flush()
+        if compressed:
+            yield compressed
+    yield encoder.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses responses with the encoding negotiated from the
+    Accept-Encoding header of the request.
+
+    Streaming responses are compressed on the fly and always. Other
+    responses only if their content has at least
+    `settings.RESPONSE_COMPRESSION_MIN_SIZE` bytes, as compressing tiny
+    responses costs more time than it saves. The compression level of
+    each encoding is taken from `settings.RESPONSE_COMPRESSION_LEVELS`.
+    """
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # Compressing long histories takes a while, hence don't block
+        # the thread that executes all other sync code.
+        return await sync_to_async(
+            self.process_response, thread_sensitive=False
+        )(request, response)
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "")
+        if not COMPRESSIBLE_CONTENT_TYPE_RE.match(content_type):
+            return response
+        if not response.streaming:
+            if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+                return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        encoder_class = select_encoder(accept_encoding)
+        if encoder_class is None:
+            return response
+        level = settings.RESPONSE_COMPRESSION_LEVELS.get(
+            encoder_class.encoding, encoder_class.default_level
+        )
+        encoder = encoder_class(level)
+
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                encoder, response.streaming_content
+            )
+            # The length of the compressed content is unknown.
+            del response["Content-Length"]
+        else:
+            compressed_content = compress_content(encoder, response.content)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response["Content-Length"] = str(len(response.content))
+
+        # The compressed content is not byte for byte equal anymore.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoder_class.encoding
+        return response
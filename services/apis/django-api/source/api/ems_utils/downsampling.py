@@ -0,0 +1,137 @@
+"""
+Vectorized algorithms to reduce time series to a number of points that is
+suitable for visualization.
+
+All functions take the time series as two numpy arrays (`x` must be sorted
+ascending and `y` must not contain NaN values) and return the indices of the
+selected points, sorted ascending. First and last point are always selected.
+"""
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    See: Sveinn Steinarsson, "Downsampling Time Series for Visual
+    Representation", 2013. The points in between the first and last point
+    are split into `n_out - 2` buckets and from each bucket the point is
+    selected that forms the largest triangle with the point selected from the
+    previous bucket and the average of the next bucket.
+
+    Arguments:
+    ----------
+    x : numpy.ndarray
+        The time axis, e.g. timestamps as floats.
+    y : numpy.ndarray
+        The values corresponding to `x`.
+    n_out : int
+        The number of points to select. Must be >= 3.
+
+    Returns:
+    --------
+    indices : numpy.ndarray
+        Indices of the selected points.
+    """
+    n_in = len(x)
+    if n_out >= n_in:
+        return np.arange(n_in)
+    if n_out < 3:
+        raise ValueError("n_out must be at least 3.")
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # The borders of the buckets, first and last point are excluded as
+    # these are always selected.
+    edges = np.linspace(1, n_in - 1, n_out - 1).astype(int)
+
+    # The averages of all buckets, computed at once with cumulative sums.
+    # For the last bucket the "next bucket" is the last point.
+    x_cumsum = np.concatenate([[0.0], np.cumsum(x)])
+    y_cumsum = np.concatenate([[0.0], np.cumsum(y)])
+    counts = edges[1:] - edges[:-1]
+    x_avg = (x_cumsum[edges[1:]] - x_cumsum[edges[:-1]]) / counts
+    y_avg = (y_cumsum[edges[1:]] - y_cumsum[edges[:-1]]) / counts
+    x_avg = np.append(x_avg[1:], x[-1])
+    y_avg = np.append(y_avg[1:], y[-1])
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n_in - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        x_b = x[start:end]
+        y_b = y[start:end]
+        # Twice the triangle area, the factor doesn't matter for argmax.
+        areas = np.abs(
+            (x[a] - x_avg[i]) * (y_b - y[a]) - (x[a] - x_b) * (y_avg[i] - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+
+    return indices
+
+
+def minmax(x, y, n_out):
+    """
+    Min/Max per pixel downsampling.
+
+    The time range is split into `(n_out - 2) // 2` equally sized buckets
+    (the "pixels") and for each bucket the points with the minimum and
+    maximum value are selected. This preserves the envelope of the
+    time series, i.e. spikes are never lost.
+
+    Arguments:
+    ----------
+    x : numpy.ndarray
+        The time axis, e.g. timestamps as floats.
+    y : numpy.ndarray
+        The values corresponding to `x`.
+    n_out : int
+        The maximum number of points to select. Must be >= 4.
+
+    Returns:
+    --------
+    indices : numpy.ndarray
+        Indices of the selected points.
+    """
+    n_in = len(x)
+    if n_out >= n_in:
+        return np.arange(n_in)
+    if n_out < 4:
+        raise ValueError("n_out must be at least 4.")
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    n_buckets = (n_out - 2) // 2
+    x_span = x[-1] - x[0]
+    if x_span > 0:
+        bucket_ids = ((x - x[0]) / x_span * n_buckets).astype(np.int64)
+        bucket_ids = np.minimum(bucket_ids, n_buckets - 1)
+    else:
+        bucket_ids = np.zeros(n_in, dtype=np.int64)
+
+    # Sort by bucket and then by value. The first item of each bucket is
+    # then the minimum and the last the maximum.
+    order = np.lexsort((y, bucket_ids))
+    sorted_bucket_ids = bucket_ids[order]
+    is_first = np.empty(n_in, dtype=bool)
+    is_first[0] = True
+    is_first[1:] = sorted_bucket_ids[1:] != sorted_bucket_ids[:-1]
+    is_last = np.empty(n_in, dtype=bool)
+    is_last[-1] = True
+    is_last[:-1] = is_first[1:]
+
+    indices = np.concatenate(
+        [[0, n_in - 1], order[is_first], order[is_last]]
+    )
+    return np.unique(indices)
+
+
+DOWNSAMPLING_METHODS = {
+    "lttb": lttb,
+    "minmax": minmax,
+}
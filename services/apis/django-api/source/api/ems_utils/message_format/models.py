@@ -1,8 +1,206 @@
+from django.db import connections
 from django.db import models
+from django.db import router
+from django.db import transaction
+from django.utils import timezone
 from timescale.db.models.managers import TimescaleManager
 from timescale.db.models.fields import TimescaleDateTimeField
 
 
+# Number of messages written per INSERT statement by `bulk_upsert`.
+BULK_UPSERT_BATCH_SIZE = 10000
+
+
+def _msg_field_value(msg, field):
+    """
+    Returns the value of `field` in `msg` (a dict as accepted by
+    `bulk_update_or_create`) or the default of the field if missing.
+    Related objects are replaced by their primary keys.
+    """
+    if field.name in msg:
+        value = msg[field.name]
+    elif field.attname in msg:
+        value = msg[field.attname]
+    else:
+        return field.get_default()
+    if field.is_relation and isinstance(value, models.Model):
+        value = value.pk
+    return value
+
+
+def _is_newer(time, other_time):
+    """
+    Returns True if `time` is later than `other_time`, where None (i.e. no
+    message received yet) is older than any time.
+    """
+    if other_time is None:
+        return time is not None
+    return time is not None and time > other_time
+
+
+def _bulk_upsert_sql(
+    model, connection, fields, key_fields, update_fields, only_newer
+):
+    """
+    Returns the statement used by `bulk_upsert` to write messages that
+    contain `update_fields`. It expects one array per field in `fields`.
+    """
+    quote_name = connection.ops.quote_name
+    if update_fields:
+        conflict_action = "UPDATE SET " + ", ".join(
+            "{0} = EXCLUDED.{0}".format(quote_name(field.column))
+            for field in update_fields
+        )
+    else:
+        # Rows skipped by DO NOTHING are not returned, which is fine as
+        # updated messages are counted as the remainder in `bulk_upsert`.
+        conflict_action = "NOTHING"
+    table = quote_name(model._meta.db_table)
+    if only_newer and update_fields:
+        conflict_action += (
+            " WHERE {table}.time IS NULL OR EXCLUDED.time > {table}.time"
+        ).format(table=table)
+    return (
+        "INSERT INTO {table} ({columns}) SELECT * FROM unnest({arrays}) "
+        "ON CONFLICT ({unique_columns}) DO {conflict_action} "
+        "RETURNING (xmax = 0);"
+    ).format(
+        table=table,
+        columns=", ".join(quote_name(field.column) for field in fields),
+        arrays=", ".join(
+            "%s::{}[]".format(field.db_type(connection)) for field in fields
+        ),
+        unique_columns=", ".join(
+            quote_name(field.column) for field in key_fields
+        ),
+        conflict_action=conflict_action,
+    )
+
+
+def bulk_upsert(
+    model,
+    msgs,
+    unique_fields,
+    only_newer=False,
+    batch_size=BULK_UPSERT_BATCH_SIZE,
+):
+    """
+    Create or update messages with one `INSERT ... ON CONFLICT DO UPDATE`
+    statement per batch. This works on PostgreSQL only.
+
+    Each column is sent as one array and expanded with `unnest`, which keeps
+    the statement short. PostgreSQL sets `xmax` of rows inserted by the
+    statement to 0, which allows counting created and updated messages.
+    Like for the generic implementation, only the fields contained in a
+    message are updated, and the last one wins if `msgs` contains several
+    messages with the same values of `unique_fields`. Messages are hence
+    grouped by the fields they contain and every group is written with its
+    own statement. Fields missing in a message are set to their default
+    only if the message is created. Fields with `auto_now` are set to the
+    current time.
+
+    Arguments:
+    ----------
+    model : django Model
+        The model for which the data should be written to.
+    msgs : list of dict
+        Each dict containting the fields (as keys) and desired values
+        that should be stored for one object in the DB.
+    unique_fields : list of str
+        Names of the fields of the unique constraint used to match `msgs`
+        with existing messages.
+    only_newer : bool
+        If True, existing messages are only updated if the `time` of the
+        new message is later. The check happens within the statement, i.e.
+        concurrent writers cannot replace a newer message with an older one.
+        Of several messages with the same values of `unique_fields` the
+        newest wins.
+    batch_size : int
+        The maximum number of messages per statement.
+
+    Returns:
+    --------
+    msgs_created : int
+        The number of messages that have been created.
+    msgs_updated : int
+        The number of messages that have been updated. Messages skipped due
+        to `only_newer` are not counted.
+    """
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    auto_now_fields = [
+        field
+        for field in fields
+        if getattr(field, "auto_now", False)
+        or getattr(field, "auto_now_add", False)
+    ]
+    fields_by_name = {field.name: field for field in fields}
+    key_fields = [fields_by_name[name] for name in unique_fields]
+
+    msgs_by_key = {}
+    for msg in msgs:
+        key = tuple(_msg_field_value(msg, field) for field in key_fields)
+        if only_newer and key in msgs_by_key:
+            if _is_newer(msgs_by_key[key].get("time"), msg.get("time")):
+                continue
+        msgs_by_key[key] = msg
+
+    # Updating the union of the fields of all messages would replace the
+    # stored values of fields missing in a message with the default.
+    msgs_by_update_fields = {}
+    for msg in msgs_by_key.values():
+        update_fields = tuple(
+            field
+            for field in fields
+            if field.name not in unique_fields
+            and (
+                field.name in msg
+                or field.attname in msg
+                or getattr(field, "auto_now", False)
+            )
+        )
+        msgs_by_update_fields.setdefault(update_fields, []).append(msg)
+
+    db_alias = router.db_for_write(model)
+    connection = connections[db_alias]
+    now = timezone.now()
+    msgs_created = 0
+    msgs_updated = 0
+    with transaction.atomic(using=db_alias), connection.cursor() as cursor:
+        for update_fields, group_msgs in msgs_by_update_fields.items():
+            sql = _bulk_upsert_sql(
+                model=model,
+                connection=connection,
+                fields=fields,
+                key_fields=key_fields,
+                update_fields=update_fields,
+                only_newer=only_newer,
+            )
+            for start in range(0, len(group_msgs), batch_size):
+                batch = group_msgs[start : start + batch_size]
+                arrays = []
+                for field in fields:
+                    if field in auto_now_fields:
+                        values = [now] * len(batch)
+                    else:
+                        values = [
+                            _msg_field_value(msg, field) for msg in batch
+                        ]
+                    arrays.append(
+                        [field.get_db_prep_save(v, connection) for v in values]
+                    )
+                cursor.execute(sql, arrays)
+                rows = cursor.fetchall()
+                created = sum(1 for (inserted,) in rows if inserted)
+                msgs_created += created
+                if only_newer:
+                    # Skipped messages are not returned.
+                    msgs_updated += len(rows) - created
+                else:
+                    msgs_updated += len(batch) - created
+
+    return msgs_created, msgs_updated
+
+
 class DatapointTemplate(models.Model):
     """
     Devices are abstracted as a set of datapoints.
@@ -219,6 +417,9 @@ class TimescaleModel(models.Model):
         datapoint. This seems not to be an issue as this function will likely
         be used only to restore backups.
 
+        On PostgreSQL all messages are written set based by `bulk_upsert`,
+        other databases fall back to matching the messages per datapoint.
+
         Arguments:
         ----------
         model : django Model
@@ -234,6 +435,25 @@ class TimescaleModel(models.Model):
         msgs_updated : int
             The number of messages that have been updated.
         """
+        if not msgs:
+            return 0, 0
+        if connections[router.db_for_write(model)].vendor == "postgresql":
+            return bulk_upsert(
+                model=model, msgs=msgs, unique_fields=["datapoint", "time"]
+            )
+        return TimescaleModel.bulk_update_or_create_generic(
+            model=model, msgs=msgs
+        )
+
+    @staticmethod
+    def bulk_update_or_create_generic(model, msgs):
+        """
+        Database independent version of `bulk_update_or_create`, which
+        issues one query per datapoint to find existing messages.
+
+        Arguments and return values are the same as for
+        `bulk_update_or_create`.
+        """
         # Start with searching for msgs that exist already with the same
         # combination of timestamp and datapoint in the database.
         # These messages will be updated.
@@ -410,7 +630,11 @@ class DatapointValueTemplate(TimescaleModel):
         """
         for msg in msgs:
             original_value = msg["value"]
+            # Set all three fields, else an update could leave a stale value
+            # in one of the hidden fields.
             msg["value"] = None
+            msg["_value_float"] = None
+            msg["_value_bool"] = None
 
             if isinstance(original_value, bool):
                 msg["_value_bool"] = original_value
@@ -423,7 +647,103 @@ class DatapointValueTemplate(TimescaleModel):
         return TimescaleModel.bulk_update_or_create(model=model, msgs=msgs)
 
 
-class DatapointLastValueTemplate(models.Model):
+class LastMessageModel(models.Model):
+    """
+    Mixin provides the `bulk_update_or_create` to last message models.
+    """
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def bulk_update_or_create(model, msgs):
+        """
+        Store the messages as last messages of their datapoints, unless the
+        stored last message is newer. Hence writing old messages, e.g. while
+        restoring a backup, does not replace more recent live data.
+
+        On PostgreSQL this happens in a single statement per batch, that
+        checks the time of the stored message while holding the row lock.
+        Other databases fall back to checking the stored messages in Python.
+
+        Arguments:
+        ----------
+        model : django Model
+            The model for which the data should be written to.
+        msgs : list of dict
+            Each dict containting the fields (as keys) and desired values
+            that should be stored for one object in the DB.
+
+        Returns:
+        --------
+        msgs_created : int
+            The number of messages that have been created.
+        msgs_updated : int
+            The number of messages that have been updated.
+        """
+        if not msgs:
+            return 0, 0
+        if connections[router.db_for_write(model)].vendor == "postgresql":
+            return bulk_upsert(
+                model=model,
+                msgs=msgs,
+                unique_fields=["datapoint"],
+                only_newer=True,
+            )
+
+        datapoint_field = model._meta.get_field("datapoint")
+        msgs_by_datapoint_id = {}
+        for msg in msgs:
+            datapoint_id = _msg_field_value(msg, datapoint_field)
+            current_msg = msgs_by_datapoint_id.get(datapoint_id)
+            if current_msg is not None:
+                if _is_newer(current_msg.get("time"), msg.get("time")):
+                    continue
+            msgs_by_datapoint_id[datapoint_id] = msg
+
+        existing_msg_objects = model.objects.filter(
+            datapoint__in=msgs_by_datapoint_id.keys()
+        )
+        # bulk_update doesn't set auto_now fields like `last_modified`.
+        auto_now_fields = [
+            field.name
+            for field in model._meta.concrete_fields
+            if getattr(field, "auto_now", False)
+        ]
+        fields_to_update = set(auto_now_fields)
+        now = timezone.now()
+        objs_to_update = []
+        for existing_msg_object in existing_msg_objects:
+            # The messages remaining in msgs_by_datapoint_id after the loop
+            # are those we need to create.
+            new_msg = msgs_by_datapoint_id.pop(
+                existing_msg_object.datapoint_id
+            )
+            if not _is_newer(new_msg.get("time"), existing_msg_object.time):
+                continue
+            for field in new_msg:
+                if field == "datapoint":
+                    continue
+                fields_to_update.add(field)
+                setattr(existing_msg_object, field, new_msg[field])
+            for field in auto_now_fields:
+                setattr(existing_msg_object, field, now)
+            objs_to_update.append(existing_msg_object)
+
+        if objs_to_update:
+            model.objects.bulk_update(
+                objs=objs_to_update, fields=fields_to_update, batch_size=1000
+            )
+
+        objs_to_create = [
+            model(**msg) for msg in msgs_by_datapoint_id.values()
+        ]
+        model.objects.bulk_create(objs=objs_to_create, batch_size=1000)
+
+        return len(objs_to_create), len(objs_to_update)
+
+
+class DatapointLastValueTemplate(LastMessageModel):
     """
     Intended model to store the last value message of a datapoint.
 
@@ -455,6 +775,12 @@ class DatapointLastValueTemplate(models.Model):
         default=None,
         help_text=("The timestamp of the last received value message."),
     )
+    # Allows clients to cheaply check whether the last messages have
+    # changed, see `ViewSetWithMulitDatapointFK`.
+    last_modified = models.DateTimeField(
+        auto_now=True,
+        help_text=("The time the value message has last been written."),
+    )
 
 
 class DatapointScheduleTemplate(TimescaleModel):
@@ -488,7 +814,7 @@ class DatapointScheduleTemplate(TimescaleModel):
     )
 
 
-class DatapointLastScheduleTemplate(models.Model):
+class DatapointLastScheduleTemplate(LastMessageModel):
     """
     Intended model to store the last schedule message of a datapoint.
 
@@ -520,6 +846,12 @@ class DatapointLastScheduleTemplate(models.Model):
         default=None,
         help_text=("The timestamp of the last received schedule message."),
     )
+    # Allows clients to cheaply check whether the last messages have
+    # changed, see `ViewSetWithMulitDatapointFK`.
+    last_modified = models.DateTimeField(
+        auto_now=True,
+        help_text=("The time the schedule message has last been written."),
+    )
 
 
 class DatapointSetpointTemplate(TimescaleModel):
@@ -555,7 +887,7 @@ class DatapointSetpointTemplate(TimescaleModel):
     )
 
 
-class DatapointLastSetpointTemplate(models.Model):
+class DatapointLastSetpointTemplate(LastMessageModel):
     """
     Intended model to store the last setpoint message of a datapoint.
 
@@ -587,3 +919,9 @@ class DatapointLastSetpointTemplate(models.Model):
         default=None,
         help_text=("The timestamp of the last received setpoint message."),
     )
+    # Allows clients to cheaply check whether the last messages have
+    # changed, see `ViewSetWithMulitDatapointFK`.
+    last_modified = models.DateTimeField(
+        auto_now=True,
+        help_text=("The time the setpoint message has last been written."),
+    )
@@ -0,0 +1,64 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .renderers import JSON_ENCODED_KEYS
+from .renderers import cbor2
+from .renderers import msgpack
+
+
+def encode_json_values(data):
+    """
+    Inverse of `renderers.decode_json_values`, i.e. encodes the native
+    values of messages to JSON as expected by the serializers.
+    """
+    if isinstance(data, dict):
+        encoded_data = {}
+        for key, item in data.items():
+            if key in JSON_ENCODED_KEYS:
+                item = json.dumps(item)
+            else:
+                item = encode_json_values(item)
+            encoded_data[key] = item
+        return encoded_data
+    if isinstance(data, list):
+        return [encode_json_values(item) for item in data]
+    return data
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parses MessagePack, see `renderers.MessagePackRenderer`.
+    """
+
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            data = msgpack.unpackb(stream.read(), raw=False)
+        except Exception as exc:
+            raise ParseError("MessagePack parse error - %s" % exc)
+        return encode_json_values(data)
+
+
+class CBORParser(BaseParser):
+    """
+    Parses CBOR, see `renderers.CBORRenderer`.
+    """
+
+    media_type = "application/cbor"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            data = cbor2.loads(stream.read())
+        except Exception as exc:
+            raise ParseError("CBOR parse error - %s" % exc)
+        return encode_json_values(data)
+
+
+BINARY_PARSER_CLASSES = []
+if msgpack is not None:
+    BINARY_PARSER_CLASSES.append(MessagePackParser)
+if cbor2 is not None:
+    BINARY_PARSER_CLASSES.append(CBORParser)
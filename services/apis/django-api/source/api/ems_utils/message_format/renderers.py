@@ -0,0 +1,229 @@
+import io
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ModuleNotFoundError:
+    # Fallback to the default JSON encoder if orjson is not installed.
+    orjson = None
+
+# The binary formats are only offered if the packages are installed.
+try:
+    import msgpack
+except ModuleNotFoundError:
+    msgpack = None
+
+try:
+    import cbor2
+except ModuleNotFoundError:
+    cbor2 = None
+
+# Keys of the message format which carry JSON encoded values. The binary
+# formats carry these values natively, which spares clients to parse twice.
+JSON_ENCODED_KEYS = frozenset(["value", "preferred_value"])
+
+
+def decode_json_values(data):
+    """
+    Returns a copy of `data` in which the JSON encoded values of messages
+    (see `JSON_ENCODED_KEYS`) have been replaced by the decoded values.
+    """
+    if isinstance(data, dict):
+        decoded_data = {}
+        for key, item in data.items():
+            if key in JSON_ENCODED_KEYS and isinstance(item, str):
+                try:
+                    item = json.loads(item)
+                except ValueError:
+                    # Not a message, e.g. an error description.
+                    pass
+            else:
+                item = decode_json_values(item)
+            decoded_data[key] = item
+        return decoded_data
+    if isinstance(data, (list, tuple)):
+        return [decode_json_values(item) for item in data]
+    return data
+
+
+class OrjsonCompatibleList(list):
+    """
+    A list which marks data that can be rendered by orjson to exactly the
+    same bytes as DRF's JSONRenderer would produce.
+
+    This is only the case if the data contains dicts, lists, str, int,
+    bool and None exclusively. Floats are not allowed as orjson formats
+    these differently then the json module of the standard library.
+    """
+
+    pass
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    A drop in replacement for DRF's JSONRenderer that uses orjson to encode
+    `OrjsonCompatibleList` data, e.g. the value messages of the history
+    endpoints. All other data is rendered by JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not self.can_render_fast(data, accepted_media_type):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data)
+        # We always escape U+2028 and U+2029 to ensure we output JSON
+        # that is a strict javascript subset, like JSONRenderer does.
+        # See: http://timelessrepo.com/json-isnt-a-javascript-subset
+        ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028")
+        ret = ret.replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+    def can_render_fast(self, data, accepted_media_type):
+        """
+        Returns True if orjson renders `data` identical to JSONRenderer.
+        """
+        if orjson is None or not isinstance(data, OrjsonCompatibleList):
+            return False
+        # orjson only produces compact output without ASCII escaping.
+        if self.ensure_ascii or not self.compact:
+            return False
+        if self.get_indent(accepted_media_type or "", {}) is not None:
+            return False
+        return True
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Base class for row based formats that can be rendered piece by piece.
+
+    Views can hence stream long histories with `render_rows`, without ever
+    holding the whole result in memory. `render` is used for all other
+    responses, e.g. errors.
+    """
+
+    charset = "utf-8"
+    # Rendered rows are yielded in pieces of roughly this many characters.
+    chunk_size = 64 * 1024
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, dict):
+            data = [data]
+        return b"".join(self.render_rows(data))
+
+    def render_rows(self, rows):
+        """
+        Render `rows`, an iterable of flat dicts, e.g. serialized messages.
+
+        Returns:
+        --------
+        chunks : generator of bytes
+            The rendered rows.
+        """
+        raise NotImplementedError(".render_rows() must be overridden.")
+
+
+class CSVRenderer(StreamingRenderer):
+    """
+    Renders rows as CSV, with the keys of the first row as header. Values
+    that are lists or dicts, e.g. schedules, are stored as JSON.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+
+    def render_rows(self, rows):
+        buffer = io.StringIO()
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(
+                    buffer, fieldnames=list(row), extrasaction="ignore"
+                )
+                writer.writeheader()
+            for key, value in row.items():
+                if isinstance(value, (list, dict)):
+                    row[key] = json.dumps(value)
+            writer.writerow(row)
+            if buffer.tell() >= self.chunk_size:
+                yield buffer.getvalue().encode(self.charset)
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode(self.charset)
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """
+    Renders rows as newline delimited JSON, i.e. one JSON object per line.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render_rows(self, rows):
+        lines = []
+        n_bytes = 0
+        for row in rows:
+            if orjson is not None:
+                line = orjson.dumps(row)
+            else:
+                line = json.dumps(row, separators=(",", ":")).encode()
+            lines.append(line)
+            n_bytes += len(line) + 1
+            if n_bytes >= self.chunk_size:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+                n_bytes = 0
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renders data as MessagePack, with native values instead of the JSON
+    encoded values of the message format.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(
+            decode_json_values(data), use_bin_type=True, default=str
+        )
+
+
+class CBORRenderer(BaseRenderer):
+    """
+    Like `MessagePackRenderer` but renders CBOR.
+    """
+
+    media_type = "application/cbor"
+    format = "cbor"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return cbor2.dumps(
+            decode_json_values(data),
+            default=lambda encoder, value: encoder.encode(str(value)),
+        )
+
+
+BINARY_RENDERER_CLASSES = []
+if msgpack is not None:
+    BINARY_RENDERER_CLASSES.append(MessagePackRenderer)
+if cbor2 is not None:
+    BINARY_RENDERER_CLASSES.append(CBORRenderer)
@@ -1,6 +1,9 @@
 import json
 from datetime import datetime
+from functools import lru_cache
+from itertools import islice
 
+import numpy as np
 from drf_spectacular.utils import extend_schema_serializer
 from drf_spectacular.utils import OpenApiExample
 from rest_framework import serializers
@@ -9,7 +12,9 @@ from rest_framework import serializers
 from ems_utils.message_format.models import DatapointValueTemplate
 from ems_utils.message_format.models import DatapointSetpointTemplate
 from ems_utils.message_format.models import DatapointScheduleTemplate
+from ems_utils.message_format.renderers import OrjsonCompatibleList
 from ems_utils.timestamp import timestamp_utc_now
+from ems_utils.timestamp import timestamps_ms
 
 
 try:
@@ -27,92 +32,290 @@ except ModuleNotFoundError:
         pass
 
 
-class GenericValidators:
+def iter_chunks(queryset, fields, chunk_size=10000):
     """
-    Generic functions to validate the fields during deserialization.
+    Fetch `fields` of the objects in `queryset` in chunks from a DB cursor.
 
-    Generic Docstring for all validate_* functions
+    Yields:
+    -------
+    chunk : list of tuple
+        Up to `chunk_size` rows, each holding the values of `fields`.
+    """
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class CompiledValueValidator:
+    """
+    Validates values against the rules of one datapoint, i.e. its data
+    format, min/max values and allowed values.
+
+    The checks that apply are determined once while compiling (instead of
+    testing the data format for every value) and allowed values are stored
+    as set if possible. Compiled validators are cached and shared by all
+    datapoints with the same rules, use `for_datapoint` to retrieve one.
+    The errors are the same as `GenericValidators.validate_value` raised
+    before.
 
     Arguments:
     ----------
-    datapoint: datapoint instance.
-        .. matching thecurrently processed message.
-    value:
-        The value to validate. See also:
-        https://www.django-rest-framework.org/api-guide/serializers/#validation
+    data_format : str
+        The data format of the datapoint, e.g. `continuous_numeric`.
+    min_value : float or None
+        The smallest allowed value of continuous numeric datapoints.
+    max_value : float or None
+        The largest allowed value of continuous numeric datapoints.
+    allowed_values : list or None
+        The allowed values of discrete datapoints. Values other than lists
+        or tuples (e.g. strings) are used as they are.
+    """
 
-    Returns:
-    --------
-    value:
-        The input value if and only if valid.
+    def __init__(self, data_format, min_value, max_value, allowed_values):
+        self.is_numeric = "_numeric" in data_format
+        self.is_continuous_numeric = "continuous_numeric" in data_format
+        self.is_text = "_text" in data_format
+        self.is_bool = "bool" in data_format
+        self.is_discrete = "discrete_" in data_format
+        self.min_value = min_value
+        self.max_value = max_value
+        # Keep the original list for the error messages.
+        self.allowed_values_repr = allowed_values
+        # Could be None or emptry string, both should be handled no values
+        # allowed.
+        allowed_values = allowed_values or []
+        self.allowed_values = allowed_values
+        if isinstance(allowed_values, (list, tuple)):
+            try:
+                self.allowed_values = set(allowed_values)
+            except TypeError:
+                # Unhashable allowed values, like lists.
+                pass
+
+    @classmethod
+    def for_datapoint(cls, datapoint):
+        """
+        Returns the (cached) compiled validator for `datapoint`.
+
+        The cache is keyed by the rules and not by the datapoint, hence
+        changes to the datapoint metadata take effect immediately.
+        """
+        return cls._compile(
+            datapoint.data_format,
+            datapoint.min_value,
+            datapoint.max_value,
+            json.dumps(datapoint.allowed_values),
+        )
 
-    Raises:
-    -------
-    serializers.ValidationError:
-        If input value is not valid.
-    """
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def _compile(cls, data_format, min_value, max_value, allowed_values_json):
+        return cls(
+            data_format=data_format,
+            min_value=min_value,
+            max_value=max_value,
+            allowed_values=json.loads(allowed_values_json),
+        )
 
     @staticmethod
-    def validate_value(datapoint, value):
-
+    def parse(value):
         # We expect all values to be encoded as JSON strings.
         # That way we always send a string over REST API which is favourable
         # as OpenAPI does not support dynamic types.
         try:
-            value = json.loads(value)
+            return json.loads(value)
         except json.JSONDecodeError:
             raise serializers.ValidationError(
                 "Value (%s) cannot be parsed as JSON." % value
             )
 
-        if "_numeric" in datapoint.data_format:
+    def check_type(self, value):
+        if self.is_numeric:
             # None is also a valid value for a Django float field, also for
             # BEMCom values.
-            if type(value) not in [float, int, type(None)]:
+            if type(value) not in (float, int, type(None)):
                 raise serializers.ValidationError(
                     "Value (%s) for numeric datapoint cannot be parsed to"
                     " float or int." % value
                 )
-        if "continuous_numeric" in datapoint.data_format:
-            if datapoint.min_value is not None and value is not None:
-                if value < datapoint.min_value:
-                    raise serializers.ValidationError(
-                        "Value (%s) for numeric datapoint is smaller then "
-                        "minimum allowed value (%s)."
-                        % (value, datapoint.min_value)
-                    )
-            if datapoint.max_value is not None and value is not None:
-                if value > datapoint.max_value:
-                    raise serializers.ValidationError(
-                        "Value (%s) for numeric datapoint is larger then "
-                        "maximum allowed value (%s)."
-                        % (value, datapoint.max_value)
-                    )
-        if "_text" in datapoint.data_format:
-            if type(value) not in [str, type(None)]:
+
+    def check_range(self, value):
+        if self.is_continuous_numeric and value is not None:
+            if self.min_value is not None and value < self.min_value:
+                raise serializers.ValidationError(
+                    self.below_min_message(value)
+                )
+            if self.max_value is not None and value > self.max_value:
+                raise serializers.ValidationError(
+                    self.above_max_message(value)
+                )
+
+    def below_min_message(self, value):
+        return (
+            "Value (%s) for numeric datapoint is smaller then "
+            "minimum allowed value (%s)." % (value, self.min_value)
+        )
+
+    def above_max_message(self, value):
+        return (
+            "Value (%s) for numeric datapoint is larger then "
+            "maximum allowed value (%s)." % (value, self.max_value)
+        )
+
+    def check_other(self, value):
+        if self.is_text:
+            if type(value) not in (str, type(None)):
                 raise serializers.ValidationError(
                     "Value (%s) for text datapoint is no string." % value
                 )
-        if "bool" in datapoint.data_format:
-            if type(value) not in [bool]:
+        if self.is_bool:
+            if type(value) is not bool:
                 raise serializers.ValidationError(
                     "Value (%s) for boolean datapoint is no bool." % value
                 )
-        if "discrete_" in datapoint.data_format:
-            # Could be None or emptry string, both should be handled no values
-            # allowed.
-            if datapoint.allowed_values:
-                allowed_values = datapoint.allowed_values
-            else:
-                allowed_values = []
-            if value not in allowed_values:
+        if self.is_discrete:
+            try:
+                is_allowed = value in self.allowed_values
+            except TypeError:
+                # Unhashable values can't be in a set of allowed values.
+                is_allowed = False
+            if not is_allowed:
                 raise serializers.ValidationError(
                     "Value (%s) for discrete datapoint in list of "
-                    "allowed_values (%s)." % (value, datapoint.allowed_values)
+                    "allowed_values (%s)."
+                    % (value, self.allowed_values_repr)
                 )
 
+    def validate(self, value):
+        """
+        Validate a single JSON encoded value.
+
+        Returns:
+        --------
+        value:
+            The parsed value if valid.
+
+        Raises:
+        -------
+        serializers.ValidationError:
+            If the value is not valid.
+        """
+        value = self.parse(value)
+        self.check_type(value)
+        self.check_range(value)
+        self.check_other(value)
         return value
 
+    def validate_many(self, values):
+        """
+        Validate many JSON encoded values at once.
+
+        The min/max checks of continuous numeric datapoints are carried out
+        vectorized for all values.
+
+        Arguments:
+        ----------
+        values : iterable of str
+            The JSON encoded values.
+
+        Returns:
+        --------
+        results : dict
+            Maps each item of `values` to a tuple of the parsed value and
+            the error message, the latter being None for valid values.
+        """
+        results = {}
+        numeric_values = {}
+        for value in values:
+            try:
+                parsed_value = self.parse(value)
+                self.check_type(parsed_value)
+            except serializers.ValidationError as ve:
+                results[value] = (None, str(ve.detail[0]))
+                continue
+            if self.is_continuous_numeric and parsed_value is not None:
+                numeric_values[value] = parsed_value
+                continue
+            try:
+                self.check_other(parsed_value)
+            except serializers.ValidationError as ve:
+                results[value] = (None, str(ve.detail[0]))
+                continue
+            results[value] = (parsed_value, None)
+
+        if not numeric_values:
+            return results
+
+        parsed_values = list(numeric_values.values())
+        errors = [None] * len(parsed_values)
+        try:
+            array = np.asarray(parsed_values, dtype=float)
+        except OverflowError:
+            # Integers too large for floats, compare one by one.
+            array = None
+            for i, parsed_value in enumerate(parsed_values):
+                try:
+                    self.check_range(parsed_value)
+                except serializers.ValidationError as ve:
+                    errors[i] = str(ve.detail[0])
+        # The minimum check comes first in `validate` and must hence
+        # take precedence, i.e. overwrite the maximum errors.
+        if array is not None:
+            with np.errstate(invalid="ignore"):
+                if self.max_value is not None:
+                    for i in np.nonzero(array > self.max_value)[0]:
+                        errors[i] = self.above_max_message(parsed_values[i])
+                if self.min_value is not None:
+                    for i in np.nonzero(array < self.min_value)[0]:
+                        errors[i] = self.below_min_message(parsed_values[i])
+        for value, parsed_value, error in zip(
+            numeric_values, parsed_values, errors
+        ):
+            if error is None:
+                try:
+                    self.check_other(parsed_value)
+                except serializers.ValidationError as ve:
+                    error = str(ve.detail[0])
+            if error is not None:
+                results[value] = (None, error)
+            else:
+                results[value] = (parsed_value, None)
+        return results
+
+
+class GenericValidators:
+    """
+    Generic functions to validate the fields during deserialization.
+
+    Generic Docstring for all validate_* functions
+
+    Arguments:
+    ----------
+    datapoint: datapoint instance.
+        .. matching thecurrently processed message.
+    value:
+        The value to validate. See also:
+        https://www.django-rest-framework.org/api-guide/serializers/#validation
+
+    Returns:
+    --------
+    value:
+        The input value if and only if valid.
+
+    Raises:
+    -------
+    serializers.ValidationError:
+        If input value is not valid.
+    """
+
+    @staticmethod
+    def validate_value(datapoint, value):
+        validator = CompiledValueValidator.for_datapoint(datapoint)
+        return validator.validate(value)
+
     @staticmethod
     def validate_timestamp(datapoint, timestamp):
         # No further checking for None, it's ok.
@@ -372,6 +575,24 @@ class DatapointSerializer(serializers.ModelSerializer):
         extra_kwargs = {"origin_id": {"validators": []}}
 
 
+class DatapointValueListSerializer(serializers.ListSerializer):
+    """
+    Validates the values of all messages at once before the messages are
+    validated one by one, see `CompiledValueValidator.validate_many`.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and self.instance is not None:
+            values = set()
+            for msg in data:
+                if isinstance(msg, dict) and isinstance(msg.get("value"), str):
+                    # Like CharField does before `validate_value` is called.
+                    values.add(msg["value"].strip())
+            validator = CompiledValueValidator.for_datapoint(self.instance)
+            self.child.value_results = validator.validate_many(values)
+        return super().to_internal_value(data)
+
+
 class DatapointValueSerializer(serializers.Serializer):
     """
     Serializer for a value message.
@@ -386,6 +607,10 @@ class DatapointValueSerializer(serializers.Serializer):
     # an API user.
     __doc__ = None
     #
+
+    class Meta:
+        list_serializer_class = DatapointValueListSerializer
+
     value = serializers.CharField(
         allow_null=True, help_text=DatapointValueTemplate.value.field.help_text
     )
@@ -405,8 +630,82 @@ class DatapointValueSerializer(serializers.Serializer):
             fields_values["timestamp"] = None
         return fields_values
 
+    @classmethod
+    def to_representation_fast(cls, queryset):
+        """
+        Serialize all messages in `queryset` like `to_representation` would
+        but considerably faster, as neither model instances nor serializer
+        fields are involved.
+
+        Arguments:
+        ----------
+        queryset : Django queryset
+            The value messages to serialize.
+
+        Returns:
+        --------
+        data : OrjsonCompatibleList
+            Equals `cls(queryset, many=True).data`.
+        """
+        rows = queryset.values_list(
+            "time", "_value_float", "_value_bool", "value"
+        )
+        rows = list(rows)
+        timestamps = timestamps_ms([row[0] for row in rows])
+        data = OrjsonCompatibleList()
+        for row, timestamp in zip(rows, timestamps):
+            _, value_float, value_bool, value = row
+            # Same logic as in DatapointValueTemplate.from_db
+            if value_float is not None:
+                value = value_float
+            elif value_bool is not None:
+                value = value_bool
+            data.append({"value": json.dumps(value), "timestamp": timestamp})
+        return data
+
+    @classmethod
+    def iter_representation_fast(cls, queryset, with_datapoint_id=False):
+        """
+        Like `to_representation_fast` but yields the messages one by one
+        while fetching these in chunks from a DB cursor. Memory usage is
+        hence constant no matter how many messages are in `queryset`.
+
+        Arguments:
+        ----------
+        queryset : Django queryset
+            The value messages to serialize.
+        with_datapoint_id : bool, default False
+            If True the id of the datapoint is added to every message.
+
+        Yields:
+        -------
+        message : dict
+            Equals one item of `cls(queryset, many=True).data`, with
+            `datapoint_id` as first key if requested.
+        """
+        fields = ["datapoint_id", "time", "_value_float", "_value_bool"]
+        for chunk in iter_chunks(queryset, fields + ["value"]):
+            timestamps = timestamps_ms([row[1] for row in chunk])
+            for row, timestamp in zip(chunk, timestamps):
+                datapoint_id, _, value_float, value_bool, value = row
+                if value_float is not None:
+                    value = value_float
+                elif value_bool is not None:
+                    value = value_bool
+                message = {"value": json.dumps(value), "timestamp": timestamp}
+                if with_datapoint_id:
+                    message = {"datapoint_id": datapoint_id, **message}
+                yield message
+
     def validate_value(self, value):
         datapoint = self.instance
+        # Computed by DatapointValueListSerializer if many=True.
+        value_results = getattr(self, "value_results", None)
+        if value_results is not None and value in value_results:
+            value, error = value_results[value]
+            if error is not None:
+                raise serializers.ValidationError(error)
+            return value
         gv = GenericValidators()
         return gv.validate_value(datapoint, value)
 
@@ -495,6 +794,50 @@ class DatapointScheduleSerializer(serializers.Serializer):
             fields_values["timestamp"] = None
         return fields_values
 
+    @classmethod
+    def to_representation_fast(cls, queryset):
+        """
+        Serialize all messages in `queryset` like `to_representation` would
+        but without creating model instances.
+
+        Arguments:
+        ----------
+        queryset : Django queryset
+            The schedule messages to serialize.
+
+        Returns:
+        --------
+        data : list
+            Equals `cls(queryset, many=True).data`.
+        """
+        rows = list(queryset.values_list("time", "schedule"))
+        timestamps = timestamps_ms([row[0] for row in rows])
+        data = []
+        for (_, schedule), timestamp in zip(rows, timestamps):
+            for schedule_item in schedule:
+                schedule_item["value"] = json.dumps(schedule_item["value"])
+            data.append({"schedule": schedule, "timestamp": timestamp})
+        return data
+
+    @classmethod
+    def iter_representation_fast(cls, queryset, with_datapoint_id=False):
+        """
+        Like `to_representation_fast` but yields the messages one by one
+        with constant memory, see `DatapointValueSerializer`.
+        """
+        fields = ["datapoint_id", "time", "schedule"]
+        for chunk in iter_chunks(queryset, fields, chunk_size=1000):
+            timestamps = timestamps_ms([row[1] for row in chunk])
+            for (datapoint_id, _, schedule), timestamp in zip(
+                chunk, timestamps
+            ):
+                for schedule_item in schedule:
+                    schedule_item["value"] = json.dumps(schedule_item["value"])
+                message = {"schedule": schedule, "timestamp": timestamp}
+                if with_datapoint_id:
+                    message = {"datapoint_id": datapoint_id, **message}
+                yield message
+
     def validate_timestamp(self, value):
         datapoint = self.instance
         gv = GenericValidators()
@@ -620,6 +963,54 @@ class DatapointSetpointSerializer(serializers.Serializer):
             fields_values["timestamp"] = None
         return fields_values
 
+    @classmethod
+    def to_representation_fast(cls, queryset):
+        """
+        Serialize all messages in `queryset` like `to_representation` would
+        but without creating model instances.
+
+        Arguments:
+        ----------
+        queryset : Django queryset
+            The setpoint messages to serialize.
+
+        Returns:
+        --------
+        data : list
+            Equals `cls(queryset, many=True).data`.
+        """
+        rows = list(queryset.values_list("time", "setpoint"))
+        timestamps = timestamps_ms([row[0] for row in rows])
+        data = []
+        for (_, setpoint), timestamp in zip(rows, timestamps):
+            for setpoint_item in setpoint:
+                setpoint_item["preferred_value"] = json.dumps(
+                    setpoint_item["preferred_value"]
+                )
+            data.append({"setpoint": setpoint, "timestamp": timestamp})
+        return data
+
+    @classmethod
+    def iter_representation_fast(cls, queryset, with_datapoint_id=False):
+        """
+        Like `to_representation_fast` but yields the messages one by one
+        with constant memory, see `DatapointValueSerializer`.
+        """
+        fields = ["datapoint_id", "time", "setpoint"]
+        for chunk in iter_chunks(queryset, fields, chunk_size=1000):
+            timestamps = timestamps_ms([row[1] for row in chunk])
+            for (datapoint_id, _, setpoint), timestamp in zip(
+                chunk, timestamps
+            ):
+                for setpoint_item in setpoint:
+                    setpoint_item["preferred_value"] = json.dumps(
+                        setpoint_item["preferred_value"]
+                    )
+                message = {"setpoint": setpoint, "timestamp": timestamp}
+                if with_datapoint_id:
+                    message = {"datapoint_id": datapoint_id, **message}
+                yield message
+
     def validate_timestamp(self, value):
         datapoint = self.instance
         gv = GenericValidators()
@@ -654,13 +1045,15 @@ class DatapointAsDictKeySerializerTemplate(serializers.Serializer):
 
     def to_representation(self, queryset):
 
-        child_serializer = self.Meta.child_serializer
+        # One serializer instance is sufficient to serialize all messages.
+        child_serializer = self.Meta.child_serializer()
         msgs_by_datapoint_id = {}
         for instance in queryset:
             # datapoint_id must be str as DictField is only defined
-            # for keys that are strings.
-            datapoint_id = str(instance.datapoint.id)
-            msg = child_serializer(instance).data
+            # for keys that are strings. Use the foreign key column, as
+            # `instance.datapoint.id` would trigger one query per message.
+            datapoint_id = str(instance.datapoint_id)
+            msg = child_serializer.to_representation(instance)
             msgs_by_datapoint_id[datapoint_id] = msg
         return {"msgs_by_datapoint_id": msgs_by_datapoint_id}
 
@@ -704,6 +1097,36 @@ class DatapointLastSetpointSerializer(DatapointAsDictKeySerializerTemplate):
     )
 
 
+class DatapointValueListByDatapointIdSerializer(serializers.Serializer):
+    """
+    Value messages of multiple datapoints, keyed by datapoint id.
+    """
+
+    msgs_by_datapoint_id = serializers.DictField(
+        child=DatapointValueSerializer(many=True), allow_empty=True
+    )
+
+
+class DatapointScheduleListByDatapointIdSerializer(serializers.Serializer):
+    """
+    Schedule messages of multiple datapoints, keyed by datapoint id.
+    """
+
+    msgs_by_datapoint_id = serializers.DictField(
+        child=DatapointScheduleSerializer(many=True), allow_empty=True
+    )
+
+
+class DatapointSetpointListByDatapointIdSerializer(serializers.Serializer):
+    """
+    Setpoint messages of multiple datapoints, keyed by datapoint id.
+    """
+
+    msgs_by_datapoint_id = serializers.DictField(
+        child=DatapointSetpointSerializer(many=True), allow_empty=True
+    )
+
+
 @extend_schema_serializer(
     examples=[
         OpenApiExample(
@@ -1,21 +1,46 @@
+import hashlib
 import logging
-
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from itertools import islice
+from threading import Lock
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from cachetools import LRUCache
+from django.db import close_old_connections
+from django.db import transaction
+from django.db.models import Count, Max, Sum
 from django.db.utils import DataError
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from django_filters import rest_framework as filters
 from drf_spectacular.utils import extend_schema
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError, NotAuthenticated
 from rest_framework.exceptions import PermissionDenied, NotFound
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import GenericViewSet
 
+from ems_utils.downsampling import DOWNSAMPLING_METHODS
 from ems_utils.timestamp import datetime_from_timestamp
+from .parsers import BINARY_PARSER_CLASSES
+from .renderers import BINARY_RENDERER_CLASSES
+from .renderers import CSVRenderer
+from .renderers import NDJSONRenderer
+from .renderers import StreamingRenderer
 from .serializers import PutMsgSummary
 
 
 logger = logging.getLogger(__name__)
 
+# The number of rows fetched and converted at once while downsampling.
+DOWNSAMPLING_CHUNK_SIZE = 10000
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
 
 # TODO: Would be nice to have more details about the possible errors.
 # TODO This also overrides the default 200/201 responses.
@@ -34,6 +59,116 @@ common_resonses_all = {
 }
 
 
+def numeric_value(value_float, value_bool):
+    """
+    Returns the value of a message used for downsampling, NaN for messages
+    with neither numeric nor boolean value.
+    """
+    if value_float is not None:
+        return value_float
+    if value_bool is not None:
+        return value_bool
+    return np.nan
+
+
+def offload_safe_methods(request):
+    """
+    The default of `async_view`, offloads only requests that don't write.
+    """
+    return request.method in ("GET", "HEAD", "OPTIONS")
+
+
+def async_view(view, offload=offload_safe_methods):
+    """
+    Wrap a sync view (e.g. the result of `ViewSet.as_view`) into an async
+    view that executes the sync view in a thread pool.
+
+    Under ASGI Django executes all sync views of a process in one shared
+    thread, i.e. a single slow request blocks all other requests. The
+    wrapped view in contrast only occupies one thread of the pool while
+    the event loop keeps serving other requests. The response is also
+    rendered in the pool, as Django would else render it in the shared
+    thread.
+
+    Requests for which `offload` returns False, by default all writes, are
+    executed in the shared thread as Django does for sync views, which
+    keeps their transactions and connections where Django expects them.
+
+    Arguments:
+    ----------
+    view : callable
+        The sync view to wrap.
+    offload : callable
+        Called with the request, returns True if the request should be
+        executed in the thread pool. Evaluated per request.
+
+    Returns:
+    --------
+    wrapped_view : coroutine function
+        The async view, has the same attributes (like `csrf_exempt`)
+        as `view`.
+    """
+
+    def run_view(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, "render") and callable(response.render):
+            response.render()
+        return response
+
+    def run_view_offloaded(request, *args, **kwargs):
+        # Django only handles the connections of the request thread, so
+        # the pool threads must care for their connections themselves.
+        close_old_connections()
+        try:
+            return run_view(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+    @wraps(view)
+    async def wrapped_view(request, *args, **kwargs):
+        if offload(request):
+            return await sync_to_async(
+                run_view_offloaded, thread_sensitive=False
+            )(request, *args, **kwargs)
+        return await sync_to_async(run_view, thread_sensitive=True)(
+            request, *args, **kwargs
+        )
+
+    return wrapped_view
+
+
+def streaming_response(request, rows, filename):
+    """
+    Render `rows` piece by piece with the StreamingRenderer selected by
+    content negotiation. The content is compressed on the fly by
+    `ems_utils.compression.CompressionMiddleware` if the client accepts it.
+
+    Arguments:
+    ----------
+    request : DRF request
+        The request, content negotiation must have selected a
+        StreamingRenderer already.
+    rows : iterable of dict
+        The serialized messages, should be a generator for long histories.
+    filename : str
+        Name of the downloaded file, without extension.
+
+    Returns:
+    --------
+    response : django.http.StreamingHttpResponse
+        The response streaming the rendered rows.
+    """
+    renderer = request.accepted_renderer
+    content = renderer.render_rows(rows)
+    content_type = "%s; charset=%s" % (renderer.media_type, renderer.charset)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = 'attachment; filename="%s.%s"' % (
+        filename,
+        renderer.format,
+    )
+    return response
+
+
 class DatapointViewSetTemplate(GenericViewSet):
     """
     Generic code to interact with datapoint objects.
@@ -199,6 +334,11 @@ class ViewSetWithDatapointFK(GenericViewSet):
         filter generation for the output.
     serializer_class : DRF serializier class.
         The serializer used to pack/unpack the objects into JSON.
+    last_model : Django model or None
+        If set, the messages written by `update_many` and
+        `update_many_by_datapoint_id` are also stored as last messages of
+        their datapoints in this model (see `LastMessageModel`), unless a
+        newer last message exists.
     create_for_actuators_only : bool, default False
         If True allows create operations for actuator datapoints.
         This makes sense as there are no schedules or setpoints for sensor
@@ -207,20 +347,171 @@ class ViewSetWithDatapointFK(GenericViewSet):
     filter_backends : List of filter backends.
         You should not need to change this. See also:
         https://www.django-rest-framework.org/api-guide/filtering/
+    allow_downsampling : bool, default False
+        If True the list endpoint accepts the `max_points` and
+        `downsampling_method` query parameters to reduce the number of
+        returned messages to a number suitable for visualization. Requires
+        that `model` stores numeric values in `_value_float` and
+        `_value_bool` like `DatapointValueTemplate`.
+    renderer_classes : List of renderers.
+        The defaults plus CSV and NDJSON, which are streamed by `list` and
+        `export`, i.e. without loading all messages in memory. Furthermore
+        MessagePack and CBOR if the corresponding packages are installed.
+    parser_classes : List of parsers.
+        The defaults plus MessagePack and CBOR, if installed.
     """
 
     model = None
     datapoint_model = None
     queryset = None
     serializer_class = None
+    last_model = None
     filter_backends = (filters.DjangoFilterBackend,)
+    allow_downsampling = False
+    renderer_classes = (
+        api_settings.DEFAULT_RENDERER_CLASSES
+        + [CSVRenderer, NDJSONRenderer]
+        + BINARY_RENDERER_CLASSES
+    )
+    parser_classes = (
+        api_settings.DEFAULT_PARSER_CLASSES + BINARY_PARSER_CLASSES
+    )
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action == "export":
+            # Other formats would require to assemble the whole result.
+            renderers = [
+                r for r in renderers if isinstance(r, StreamingRenderer)
+            ]
+        return renderers
 
     def list(self, request, dp_id):
         datapoint = get_object_or_404(self.datapoint_model, id=dp_id)
-        queryset = self.queryset.filter(datapoint=datapoint)
-        queryset = self.filter_queryset(queryset)
+        # Filter for the datapoint after the filter backends have been
+        # applied, as these may replace the queryset, e.g. to serve the
+        # data from a continuous aggregate.
+        queryset = self.filter_queryset(self.queryset)
+        queryset = queryset.filter(datapoint=datapoint)
+        queryset = self.resolve_time_buckets(datapoint, queryset)
+
+        if self.allow_downsampling and "max_points" in request.query_params:
+            queryset = self.downsample(request, datapoint, queryset)
+
+        # The renderer is only selected if the view is called through the
+        # DRF request handling, which tests calling `list` directly skip.
+        renderer = getattr(request, "accepted_renderer", None)
+        if isinstance(renderer, StreamingRenderer):
+            return streaming_response(
+                request,
+                rows=self.iter_representation(queryset),
+                filename="%s_%s" % (self.model._meta.model_name, dp_id),
+            )
 
+        # Serializing plain querysets can be done much faster without the
+        # field machinery of DRF, which matters for long histories.
+        fast_serializer = getattr(
+            self.serializer_class, "to_representation_fast", None
+        )
+        if fast_serializer is not None and not isinstance(queryset, list):
+            return Response(fast_serializer(queryset))
+
+        serializer = self.serializer_class(queryset, many=True)
+        return Response(serializer.data)
+
+    def export(self, request):
+        """
+        Streams the messages of all datapoints listed in `datapoint__id__in`
+        as CSV or NDJSON. The messages are fetched with constant memory and
+        ordered by datapoint. Supports the same filters as `list`.
         """
+        datapoint_ids = request.query_params.get("datapoint__id__in", "")
+        try:
+            datapoint_ids = [
+                int(i) for i in datapoint_ids.split(",") if i.strip()
+            ]
+        except ValueError:
+            raise ValidationError(
+                {
+                    "datapoint__id__in": [
+                        "Must be a comma separated list of integers."
+                    ]
+                }
+            )
+        datapoint_ids = list(
+            self.datapoint_model.objects.filter(id__in=datapoint_ids)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        queryset = self.filter_queryset(self.queryset)
+        # The rows are fetched while the response is streamed, i.e. after
+        # the view has returned. Select the DB now, while routers can
+        # still see the request context.
+        queryset = queryset.using(queryset.db)
+        # Invalid time bucket parameters are only detected by the DB, check
+        # them now as errors can't be reported anymore once streaming has
+        # started. The probe matches no rows.
+        self.resolve_time_buckets(
+            self.datapoint_model(), queryset.filter(datapoint__isnull=True)
+        )
+
+        def iter_rows():
+            for datapoint_id in datapoint_ids:
+                datapoint = self.datapoint_model(id=datapoint_id)
+                dp_queryset = self.resolve_time_buckets(
+                    datapoint, queryset.filter(datapoint=datapoint)
+                )
+                yield from self.iter_representation(
+                    dp_queryset, with_datapoint_id=True
+                )
+
+        return streaming_response(
+            request,
+            rows=iter_rows(),
+            filename="%s_export" % self.model._meta.model_name,
+        )
+
+    def iter_representation(self, queryset, with_datapoint_id=False):
+        """
+        Serialize the messages in `queryset` one by one, see
+        `iter_representation_fast` of the message serializers.
+
+        Arguments:
+        ----------
+        queryset : queryset or list
+            The messages to serialize. Lists (e.g. of time buckets) are
+            serialized at once as these are small anyway.
+        with_datapoint_id : bool, default False
+            If True the id of the datapoint is added to every message.
+
+        Returns:
+        --------
+        rows : iterable of dict
+            The serialized messages.
+        """
+        fast_serializer = getattr(
+            self.serializer_class, "iter_representation_fast", None
+        )
+        if fast_serializer is not None and not isinstance(queryset, list):
+            # Exports should be in chronological order.
+            queryset = queryset.using(queryset.db).order_by("time")
+            return fast_serializer(
+                queryset, with_datapoint_id=with_datapoint_id
+            )
+
+        data = self.serializer_class(queryset, many=True).data
+        if not with_datapoint_id:
+            return data
+        return (
+            {"datapoint_id": msg_object.datapoint_id, **message}
+            for msg_object, message in zip(queryset, data)
+        )
+
+    def resolve_time_buckets(self, datapoint, queryset):
+        """
+        Converts `queryset` to a list of model instances if time buckets
+        have been applied by the filters, else returns it unchanged.
+
         Usually queryset would be a normal Django queryset (containing object
         instances). However, if we applied time_bucket, the contents of the
         queryset will be dicts that look something like:
@@ -276,9 +567,122 @@ class ViewSetWithDatapointFK(GenericViewSet):
                         ]
                     }
                 )
+        return queryset
 
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+    def downsample(self, request, datapoint, queryset):
+        """
+        Reduces the messages in queryset to at most `max_points` messages
+        that preserve the visual shape of the time series.
+
+        Only numeric (and boolean) values can be downsampled. Other values
+        are ignored if downsampling is necessary, i.e. if the queryset
+        contains more then `max_points` messages.
+
+        Arguments:
+        ----------
+        request : DRF request
+            The request holding the query parameters.
+        datapoint : datapoint_model instance
+            The datapoint the messages belong to.
+        queryset : queryset or list
+            The filtered messages, a list of model instances if time
+            buckets have been applied.
+
+        Returns:
+        --------
+        queryset : queryset or list
+            The unchanged queryset if it contains no more then `max_points`
+            messages, else a list of model instances.
+        """
+        max_points = request.query_params.get("max_points")
+        method = request.query_params.get("downsampling_method") or "lttb"
+        try:
+            max_points = int(max_points)
+        except ValueError:
+            max_points = None
+        if max_points is None or max_points < 4:
+            raise ValidationError(
+                {"max_points": ["Must be an integer greater or equal 4."]}
+            )
+        if method not in DOWNSAMPLING_METHODS:
+            raise ValidationError(
+                {
+                    "downsampling_method": [
+                        "Must be one of: %s"
+                        % ", ".join(DOWNSAMPLING_METHODS.keys())
+                    ]
+                }
+            )
+
+        if isinstance(queryset, list):
+            # Time buckets, these are always numeric.
+            rows = ((m.time, m.value, None) for m in queryset)
+        else:
+            # Stream the rows instead of loading all model instances
+            # into memory.
+            rows = (
+                queryset.order_by("time")
+                .values_list("time", "_value_float", "_value_bool")
+                .iterator(chunk_size=DOWNSAMPLING_CHUNK_SIZE)
+            )
+
+        # Collect the rows chunk wise in arrays, which need a fraction of
+        # the memory of Python objects per row. Times are stored as
+        # microseconds since epoch, messages without numeric (or boolean)
+        # value as NaN.
+        x_chunks = []
+        y_chunks = []
+        is_bool_chunks = []
+        n_rows = 0
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, DOWNSAMPLING_CHUNK_SIZE))
+            if not chunk:
+                break
+            n_rows += len(chunk)
+            x_chunks.append(
+                np.fromiter(
+                    ((t - EPOCH) // MICROSECOND for t, _, _ in chunk),
+                    np.int64,
+                    len(chunk),
+                )
+            )
+            y_chunks.append(
+                np.fromiter(
+                    (numeric_value(f, b) for _, f, b in chunk),
+                    float,
+                    len(chunk),
+                )
+            )
+            is_bool_chunks.append(
+                np.fromiter(
+                    (f is None and b is not None for _, f, b in chunk),
+                    bool,
+                    len(chunk),
+                )
+            )
+
+        if n_rows <= max_points:
+            return queryset
+
+        x = np.concatenate(x_chunks)
+        y = np.concatenate(y_chunks)
+        is_bool = np.concatenate(is_bool_chunks)
+        # `x` is not necessarily sorted for lists of time buckets.
+        order = np.argsort(x, kind="stable")
+        order = order[np.isfinite(y[order])]
+        indices = DOWNSAMPLING_METHODS[method](
+            x[order] / 1e6, y[order], max_points
+        )
+
+        downsampled = []
+        for i in order[indices]:
+            value = bool(y[i]) if is_bool[i] else float(y[i])
+            time = EPOCH + int(x[i]) * MICROSECOND
+            downsampled.append(
+                self.model(datapoint=datapoint, value=value, time=time)
+            )
+        return downsampled
 
     def retrieve(self, request, dp_id, timestamp=None):
         datapoint = get_object_or_404(self.datapoint_model, id=dp_id)
@@ -347,6 +751,31 @@ class ViewSetWithDatapointFK(GenericViewSet):
         else:
             return Response(validated_data, status=status.HTTP_200_OK)
 
+    def write_msgs(self, msgs):
+        """
+        Write `msgs` with `bulk_update_or_create` and update the last
+        messages in `last_model` in the same transaction.
+
+        Returns:
+        --------
+        msgs_created : int
+            The number of messages that have been created.
+        msgs_updated : int
+            The number of messages that have been updated.
+        """
+        if self.last_model is not None:
+            # bulk_update_or_create may change the msgs in place.
+            last_msgs = [dict(msg) for msg in msgs]
+        with transaction.atomic():
+            msg_stats = self.model.bulk_update_or_create(
+                model=self.model, msgs=msgs
+            )
+            if self.last_model is not None:
+                self.last_model.bulk_update_or_create(
+                    model=self.last_model, msgs=last_msgs
+                )
+        return msg_stats
+
     @extend_schema(responses=PutMsgSummary)
     def update_many(self, request, dp_id):
         """
@@ -377,9 +806,7 @@ class ViewSetWithDatapointFK(GenericViewSet):
             msg["time"] = datetime_from_timestamp(msg.pop("timestamp"))
             msgs.append(msg)
 
-        msg_stats = self.model.bulk_update_or_create(
-            model=self.model, msgs=msgs
-        )
+        msg_stats = self.write_msgs(msgs)
 
         put_msg_summary = PutMsgSummary().to_representation(
             instance={
@@ -389,6 +816,76 @@ class ViewSetWithDatapointFK(GenericViewSet):
         )
         return Response(put_msg_summary, status=status.HTTP_200_OK)
 
+    @extend_schema(responses=PutMsgSummary)
+    def update_many_by_datapoint_id(self, request):
+        """
+        Places messages of one or more datapoints in the database. This is
+        an upsert operation like `update_many`, but the messages are
+        provided as lists keyed by datapoint id, like:
+        {"msgs_by_datapoint_id": {"1": [<msg>, ...], "2": [...], ...}}
+
+        All datapoints are fetched at once and all messages are written in
+        one batch. This operation is all or nothing, if a single message
+        is invalid nothing is written.
+        """
+        msgs_by_datapoint_id = None
+        if isinstance(request.data, dict):
+            msgs_by_datapoint_id = request.data.get("msgs_by_datapoint_id")
+        if not isinstance(msgs_by_datapoint_id, dict):
+            raise ValidationError(
+                {
+                    "msgs_by_datapoint_id": [
+                        "Must be an object with datapoint ids as keys and "
+                        "lists of messages as values."
+                    ]
+                }
+            )
+
+        errors = {}
+        datapoint_ids = []
+        for datapoint_id_str in msgs_by_datapoint_id:
+            try:
+                datapoint_ids.append(int(datapoint_id_str))
+            except ValueError:
+                errors[datapoint_id_str] = ["Datapoint id must be an integer."]
+        datapoints = self.datapoint_model.objects.in_bulk(datapoint_ids)
+
+        msgs = []
+        for datapoint_id_str, datapoint_msgs in msgs_by_datapoint_id.items():
+            if datapoint_id_str in errors:
+                continue
+            datapoint = datapoints.get(int(datapoint_id_str))
+            if datapoint is None:
+                errors[datapoint_id_str] = [
+                    "No datapoint found matching id: %s." % datapoint_id_str
+                ]
+                continue
+            serializer = self.serializer_class(
+                datapoint, data=datapoint_msgs, many=True
+            )
+            if not serializer.is_valid():
+                errors[datapoint_id_str] = serializer.errors
+                continue
+            for msg in serializer.validated_data:
+                msg["datapoint"] = datapoint
+                msg["time"] = datetime_from_timestamp(msg.pop("timestamp"))
+                msgs.append(msg)
+
+        if errors:
+            raise ValidationError({"msgs_by_datapoint_id": errors})
+
+        msgs_created, msgs_updated = 0, 0
+        if msgs:
+            msgs_created, msgs_updated = self.write_msgs(msgs)
+
+        put_msg_summary = PutMsgSummary().to_representation(
+            instance={
+                "msgs_created": msgs_created,
+                "msgs_updated": msgs_updated,
+            }
+        )
+        return Response(put_msg_summary, status=status.HTTP_200_OK)
+
     def destroy(self, request, dp_id, timestamp=None):
         """
         TODO: This will likely not work. Should return Summary of deletions.
@@ -427,18 +924,77 @@ class ViewSetWithMulitDatapointFK(GenericViewSet):
     filter_backends : List of filter backends.
         You should not need to change this. See also:
         https://www.django-rest-framework.org/api-guide/filtering/
+    renderer_classes : List of renderers.
+        The defaults plus MessagePack and CBOR, if installed.
     """
 
     datapoint_queryset = None
     queryset = None
     serializer_class = None
     filter_backends = (filters.DjangoFilterBackend,)
+    renderer_classes = (
+        api_settings.DEFAULT_RENDERER_CLASSES + BINARY_RENDERER_CLASSES
+    )
+
+    # Serialized responses of `list`, shared by all subclasses as the keys
+    # contain the model name.
+    _cache = LRUCache(maxsize=128)
+    _cache_lock = Lock()
 
     def list(self, request):
+        """
+        Returns the messages as dict keyed by datapoint id.
+
+        These endpoints are polled frequently, although the messages
+        change rarely. Hence a cheap version token of the messages is
+        computed first, from which the `ETag` header is derived. Clients
+        which provide a matching `If-None-Match` header receive a 304
+        response. Else the serialized messages are served from a
+        per-process cache while the token is unchanged.
+
+        No `Last-Modified` header is sent, as its resolution of one second
+        is too coarse for messages that may arrive several times a second.
+        """
+        # The datapoint queryset is evaluated as subquery, i.e. this
+        # is a single query no matter how many datapoints are affected.
+        # Serializers must hence only access `datapoint_id` of the
+        # messages, as `datapoint` would trigger one query per message.
         queryset = self.queryset.filter(datapoint__in=self.datapoint_queryset)
         queryset = self.filter_queryset(queryset)
-        serializer = self.serializer_class(queryset)
-        return Response(serializer.data)
+
+        # `last_modified` is updated on every write of a message. Count
+        # and sum of ids catch messages (or datapoints) that are removed.
+        version = queryset.aggregate(
+            n_msgs=Count("pk"),
+            sum_datapoint_ids=Sum("datapoint_id"),
+            last_modified=Max("last_modified"),
+        )
+        etag_source = "%s|%s|%s|%s" % (
+            self.queryset.model._meta.label,
+            request.get_full_path(),
+            request.accepted_media_type,
+            sorted(version.items()),
+        )
+        etag = '"%s"' % hashlib.md5(etag_source.encode()).hexdigest()
+
+        not_modified_response = get_conditional_response(
+            request._request, etag=etag
+        )
+        if not_modified_response is not None:
+            not_modified_response["ETag"] = etag
+            return not_modified_response
+
+        with self._cache_lock:
+            data = self._cache.get(etag)
+        if data is None:
+            serializer = self.serializer_class(queryset)
+            data = serializer.data
+            with self._cache_lock:
+                self._cache[etag] = data
+
+        response = Response(data)
+        response["ETag"] = etag
+        return response
 
     def destroy(self, request):
         queryset = self.queryset.filter(datapoint__in=self.datapoint_queryset)
@@ -0,0 +1,89 @@
+"""
+Vectorized resampling of value messages onto a regular time grid.
+
+This is the fallback for databases without `time_bucket_gapfill`, i.e. it
+computes the same as the TimescaleDB functions `avg`, `locf` and
+`interpolate` applied on gap filled time buckets.
+"""
+import numpy as np
+
+FILL_METHODS = ("none", "locf", "interpolate")
+
+
+def resample_to_grid(times, values, grid_start, interval, n_buckets):
+    """
+    Compute the average of the values within each bucket of the grid.
+
+    Arguments:
+    ----------
+    times : numpy.ndarray
+        The times of the values as seconds since epoch.
+    values : numpy.ndarray
+        The numeric values, NaN values are ignored.
+    grid_start : float
+        The start of the first bucket as seconds since epoch.
+    interval : float
+        The length of one bucket in seconds.
+    n_buckets : int
+        The number of buckets in the grid.
+
+    Returns:
+    --------
+    averages : numpy.ndarray
+        The average value per bucket, NaN for buckets without values.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    bucket_ids = np.floor((times - grid_start) / interval).astype(np.int64)
+    in_grid = (bucket_ids >= 0) & (bucket_ids < n_buckets) & ~np.isnan(values)
+    bucket_ids = bucket_ids[in_grid]
+
+    sums = np.bincount(bucket_ids, weights=values[in_grid], minlength=n_buckets)
+    counts = np.bincount(bucket_ids, minlength=n_buckets)
+    averages = np.full(n_buckets, np.nan)
+    has_values = counts > 0
+    averages[has_values] = sums[has_values] / counts[has_values]
+    return averages
+
+
+def fill_gaps(values, method):
+    """
+    Fill NaN values in a regular time series.
+
+    Like the TimescaleDB functions no values are extrapolated, i.e. leading
+    gaps stay empty for both methods, trailing gaps for `interpolate`.
+
+    Arguments:
+    ----------
+    values : numpy.ndarray
+        The values on the regular grid, NaN for gaps.
+    method : str
+        One of `FILL_METHODS`. `locf` carries the last observed value
+        forward, `interpolate` interpolates linearly and `none` leaves
+        the gaps untouched.
+
+    Returns:
+    --------
+    filled_values : numpy.ndarray
+        A copy of `values` with gaps filled.
+    """
+    if method not in FILL_METHODS:
+        raise ValueError("Unknown fill method: %s" % method)
+
+    values = np.array(values, dtype=float)
+    is_valid = ~np.isnan(values)
+    if method == "none" or not is_valid.any():
+        return values
+
+    positions = np.arange(len(values))
+    if method == "locf":
+        last_valid = np.where(is_valid, positions, 0)
+        np.maximum.accumulate(last_valid, out=last_valid)
+        return values[last_valid]
+
+    valid_positions = positions[is_valid]
+    first, last = valid_positions[0], valid_positions[-1]
+    values[first : last + 1] = np.interp(
+        positions[first : last + 1], valid_positions, values[is_valid]
+    )
+    return values
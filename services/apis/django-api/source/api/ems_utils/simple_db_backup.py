@@ -13,6 +13,16 @@ GET/PUT /datapoint/{dp_id}/setpoint/
 GET/PUT /datapoint/{dp_id}/schedule/
     To retrieve/restore the datapoint value messages.
 
+These endpoints are optional and used to reduce the number of requests
+required for a backup, see `plan_chunks`:
+
+GET /datapoint/value/stats/
+    To plan the chunks of value messages by the density of the messages.
+GET /datapoint/last_setpoint/ and /datapoint/last_schedule/
+    To skip datapoints that have no setpoint/schedule messages.
+GET/PUT /datapoint/value/, /datapoint/setpoint/ and /datapoint/schedule/
+    To retrieve/restore chunks containing several datapoints.
+
 Please note:
 ------------
     The value/setpoint/schedule endpoints MUST support the `timestamp__gte`
@@ -20,14 +30,38 @@ Please note:
     by data. Without these parameters the Queries will likely grow to large
     and crash the django app with every request. Even if not, the chunks
     will likely contain many copies of the existing messages.
+
+    Messages are requested as NDJSON, which APIs supporting it stream
+    message by message. The messages are written to the compressed chunk
+    files as they arrive, i.e. memory usage doesn't depend on the number of
+    messages. APIs without NDJSON support return JSON, which works too.
+
+    Completely written chunks are listed in the manifest file in the data
+    directory, including their checksums and until which time they contain
+    the messages. This allows resuming interrupted backups, incremental
+    backups (see `--incremental`) and verifying chunks while restoring.
+
+    While restoring, the messages of the chunks are merged into requests
+    covering several datapoints, with a bounded number of requests being
+    written at once, see `restore_datapoint_messages`.
 """
 import os
 import bz2
 import json
+import time
+import hashlib
 import logging
 import argparse
+import threading
 from pathlib import Path
+from collections import deque
 from multiprocessing import Pool
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 from datetime import date, datetime, timedelta, timezone
 
 import requests
@@ -58,6 +92,22 @@ def date_to_timestamp(_date):
     return timestamp
 
 
+def timestamp_to_date(timestamp):
+    """
+    Converts a timestamp to the date in UTC.
+
+    Arguments:
+    ----------
+    timestamp : int
+        Milliseconds since 1.1.1970 UTC
+
+    Returns:
+    --------
+    _date : datetime.date
+    """
+    return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).date()
+
+
 def backup_datapoint_metadata(args, auth):
     """
     Fetch the metadata of all datapoints and store it in a file.
@@ -74,8 +124,8 @@ def backup_datapoint_metadata(args, auth):
 
     Returns:
     --------
-    datapoint_ids : list
-        A list of datapoint IDs known to the API.
+    datapoint_metadata : list of dict
+        The metadata of all datapoints known to the API.
     """
     dp_metadata_url = args.target_url + "/datapoint/"
     logger.debug("Fetching datapoint metadata from: %s", dp_metadata_url)
@@ -98,46 +148,653 @@ def backup_datapoint_metadata(args, auth):
         out_json = json.dumps(datapoint_metadata, indent=4)
         f.write(bz2.compress(out_json.encode()))
 
-    # Compute the IDs which will be used later to fetch the messages.
-    datapoint_ids = [dp["id"] for dp in datapoint_metadata]
-    logger.info("Fetched metadata for %s datapoints", len(datapoint_ids))
-    return datapoint_ids
+    logger.info("Fetched metadata for %s datapoints", len(datapoint_metadata))
+    return datapoint_metadata
+
+
+# Prefer NDJSON as it is streamed by the API, but accept JSON from APIs
+# that don't support it.
+MESSAGES_ACCEPT_HEADER = "application/x-ndjson, application/json;q=0.9"
+
+# The session of the current worker process, which keeps the connection
+# to the API alive between the chunks. See `init_worker_session`.
+session = None
+
+
+def init_worker_session(auth):
+    """
+    Create the session of a worker process, used as initializer of the pool.
+
+    Arguments:
+    ----------
+    auth : requests.auth object
+        The auth object that is used during the requests.
+    """
+    global session
+    session = requests.Session()
+    session.auth = auth
+
+
+def iter_response_messages(response):
+    """
+    Yields the messages of a (streamed) response one by one.
+
+    Arguments:
+    ----------
+    response : requests.Response
+        The response of a GET request for messages, in NDJSON or JSON.
+
+    Yields:
+    -------
+    msg : dict
+        One message.
+    """
+    content_type = response.headers.get("Content-Type", "")
+    if content_type.startswith("application/x-ndjson"):
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+    else:
+        yield from response.json()
+
+
+def write_messages(msgs, out_fnp):
+    """
+    Write messages as JSON list into a bz2 compressed file while iterating
+    over them, i.e. without holding the list in memory.
+
+    The file is written under a temporary name and renamed when complete,
+    hence a chunk file exists only if it has been written completely.
+
+    Arguments:
+    ----------
+    msgs : iterable of dict
+        The messages to write.
+    out_fnp : pathlib.Path
+        The path of the chunk file.
+
+    Returns:
+    --------
+    n_msgs : int
+        The number of messages written.
+    """
+    tmp_fnp = out_fnp.with_name(out_fnp.name + ".tmp")
+    n_msgs = 0
+    try:
+        with bz2.open(tmp_fnp, "wt") as f:
+            f.write("[")
+            for msg in msgs:
+                if n_msgs:
+                    f.write(",\n")
+                f.write(json.dumps(msg))
+                n_msgs += 1
+            f.write("]")
+    except BaseException:
+        tmp_fnp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_fnp, out_fnp)
+    return n_msgs
+
+
+def file_sha256(fnp):
+    """
+    Compute the SHA-256 checksum of a file.
+
+    Arguments:
+    ----------
+    fnp : pathlib.Path
+        The path of the file.
+
+    Returns:
+    --------
+    sha256 : str
+        The checksum as hex string.
+    """
+    sha256 = hashlib.sha256()
+    with open(fnp, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+# The manifest lists all chunks written completely by the backup, one JSON
+# object per line, see `load_datapoint_message` for the fields. The restore
+# log lists the chunks restored, see `restore_datapoint_messages`.
+MANIFEST_FN = "backup_manifest.jsonl"
+RESTORE_LOG_FN = "restore_log.jsonl"
+
+
+def read_manifest(manifest_fnp):
+    """
+    Read the entries of a manifest (or restore log) file.
+
+    Arguments:
+    ----------
+    manifest_fnp : pathlib.Path
+        The path of the file. A missing file has no entries.
+
+    Returns:
+    --------
+    entries : list of dict
+        The entries in the order they have been written. Lines which
+        cannot be parsed, e.g. if the script has been killed while
+        writing, are ignored.
+    """
+    entries = []
+    if not manifest_fnp.is_file():
+        return entries
+    with open(manifest_fnp, "r") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning("Ignoring broken line in: %s", manifest_fnp)
+    return entries
+
+
+def open_manifest(manifest_fnp):
+    """
+    Open a manifest (or restore log) file for appending entries with
+    `write_manifest_entry`.
+
+    Arguments:
+    ----------
+    manifest_fnp : pathlib.Path
+        The path of the file, created if missing.
+
+    Returns:
+    --------
+    f : file object
+        The file opened for appending.
+    """
+    f = open(manifest_fnp, "a+")
+    # Terminate a line broken by an interrupted write, else it would
+    # swallow the next entry.
+    if f.tell() > 0:
+        f.seek(f.tell() - 1)
+        if f.read(1) != "\n":
+            f.write("\n")
+    return f
+
+
+def write_manifest_entry(f, entry):
+    """
+    Append an entry to a manifest (or restore log) file.
+
+    Arguments:
+    ----------
+    f : file object
+        As returned by `open_manifest`.
+    entry : dict
+        The entry to append.
+    """
+    f.write(json.dumps(entry) + "\n")
+    f.flush()
 
 
 def load_datapoint_message(cv):
     """
     The worker that loads, compresses and saves the datapoint messages for one
-    day.
+    chunk.
 
     Arguments:
     ----------
     cv : dict
         The chunk_var dict containing all relevant information required to load
-        data for one datapoint_id, message_type and date.
+        data for one chunk, see `plan_chunks`.
         As defined in backup_datapoint_messages.
+
+    Returns:
+    --------
+    manifest_entry : dict
+        `cv["manifest_entry"]` extended by:
+            high_water_mark: The timestamp until which all messages of the
+                chunk have been fetched, i.e. the end of the chunk or the
+                time of the request if earlier.
+            n_msgs: The number of messages that have been saved.
+            last_timestamp: The timestamp of the last message or None.
+            sha256: The checksum of the chunk file.
     """
+    manifest_entry = dict(cv["manifest_entry"])
+    manifest_entry["high_water_mark"] = min(
+        manifest_entry["timestamp__lt"], int(time.time() * 1000)
+    )
+    last_timestamp = None
+
+    def track_last_timestamp(msgs):
+        nonlocal last_timestamp
+        for msg in msgs:
+            if last_timestamp is None or msg["timestamp"] > last_timestamp:
+                last_timestamp = msg["timestamp"]
+            yield msg
+
     logger.debug("Fetching datapoint data from: %s", cv["dp_data_url"])
-    response = requests.get(cv["dp_data_url"], auth=cv["auth"])
+    with session.get(
+        cv["dp_data_url"],
+        headers={"Accept": MESSAGES_ACCEPT_HEADER},
+        stream=True,
+    ) as response:
+        # Verify that the request returned OK.
+        if response.status_code != 200:
+            logger.error("Request failed: %s", response)
+            raise RuntimeError(
+                "Could not fetch datapoint data from url: %s"
+                % cv["dp_data_url"]
+            )
 
-    # Verify that the request returned OK.
+        # Store the data.
+        manifest_entry["n_msgs"] = write_messages(
+            track_last_timestamp(iter_response_messages(response)),
+            out_fnp=cv["out_fnp"],
+        )
+
+    manifest_entry["last_timestamp"] = last_timestamp
+    manifest_entry["sha256"] = file_sha256(cv["out_fnp"])
+    return manifest_entry
+
+
+# The message types that can exist for the datapoint types. Datapoints of
+# unknown type are backed up with all message types.
+MESSAGE_TYPES = ["value", "setpoint", "schedule"]
+MESSAGE_TYPES_BY_DATAPOINT_TYPE = {
+    "sensor": ["value"],
+    "actuator": ["value", "setpoint", "schedule"],
+}
+
+# Upper bounds for chunks spanning several days and/or datapoints. The
+# number of datapoints is bounded as their IDs are part of the URL.
+MAX_CHUNK_DAYS = 32
+MAX_CHUNK_DATAPOINTS = 100
+
+
+def fetch_value_statistics(args, auth):
+    """
+    Fetch the statistics of the value messages of all datapoints.
+
+    Arguments:
+    ----------
+    args : argparse.Namespace
+        As defined at the end of the script.
+    auth : requests.auth object
+        The auth object that is used during the request.
+
+    Returns:
+    --------
+    statistics_by_id : dict or None
+        Maps datapoint ID to the statistics of its value messages. None if
+        the API doesn't provide the statistics.
+    """
+    stats_url = args.target_url + "/datapoint/value/stats/"
+    logger.debug("Fetching value statistics from: %s", stats_url)
+    response = requests.get(stats_url, auth=auth)
     if response.status_code != 200:
-        logger.error("Request failed: %s", response)
-        raise RuntimeError(
-            "Could not fetch datapoint data from url: %s" % cv["dp_data_url"]
+        logger.warning(
+            "Could not fetch value statistics (%s), backing up value "
+            "messages in daily chunks per datapoint.",
+            response.status_code,
         )
+        return None
+    statistics_by_id = response.json()["statistics_by_datapoint_id"]
+    return {int(k): v for k, v in statistics_by_id.items()}
 
-    # Store the data.
-    datapoint_data = response.json()
-    out_json = json.dumps(datapoint_data, indent=4)
-    with open(cv["out_fnp"], "wb") as f:
-        f.write(bz2.compress(out_json.encode()))
+
+def fetch_last_timestamps(args, auth, message_type):
+    """
+    Fetch the timestamps of the last setpoint or schedule messages.
+
+    Arguments:
+    ----------
+    args : argparse.Namespace
+        As defined at the end of the script.
+    auth : requests.auth object
+        The auth object that is used during the request.
+    message_type : str
+        Either "setpoint" or "schedule".
+
+    Returns:
+    --------
+    last_timestamps : dict or None
+        Maps datapoint ID to the timestamp of the last message. Datapoints
+        without messages are missing. None if the API doesn't provide the
+        last messages.
+    """
+    last_url = args.target_url + "/datapoint/last_%s/" % message_type
+    logger.debug("Fetching last %s messages from: %s", message_type, last_url)
+    response = requests.get(last_url, auth=auth)
+    if response.status_code != 200:
+        logger.warning(
+            "Could not fetch last %s messages (%s), backing up %s "
+            "messages of all actuators.",
+            *(message_type, response.status_code, message_type)
+        )
+        return None
+    msgs_by_datapoint_id = response.json()["msgs_by_datapoint_id"]
+    return {int(k): v["timestamp"] for k, v in msgs_by_datapoint_id.items()}
+
+
+def chunk_days(msgs_per_day, messages_per_chunk):
+    """
+    Compute the number of days covered by the chunks of a datapoint.
+
+    Arguments:
+    ----------
+    msgs_per_day : float
+        The expected number of messages per day of the datapoint.
+    messages_per_chunk : int
+        The targeted number of messages per chunk.
+
+    Returns:
+    --------
+    n_days : int
+        The largest power of two (up to MAX_CHUNK_DAYS) days for which the
+        expected messages fit in one chunk. At least one day.
+    """
+    n_days = 1
+    while (
+        n_days * 2 <= MAX_CHUNK_DAYS
+        and msgs_per_day * n_days * 2 <= messages_per_chunk
+    ):
+        n_days *= 2
+    return n_days
+
+
+def plan_chunks(
+    datapoint_metadata,
+    start_date,
+    end_date,
+    messages_per_chunk,
+    value_statistics=None,
+    last_timestamps=None,
+    high_water_marks=None,
+):
+    """
+    Plan the chunks, i.e. the requests, required to backup all messages.
+
+    Without further information one chunk per datapoint, message type and
+    day is required, most of which are empty for typical datapoints. This
+    reduces the number of chunks by:
+        - Skipping setpoint and schedule messages of sensors.
+        - Skipping days before the first and after the last message.
+        - Grouping datapoints with few messages into chunks spanning several
+          days and datapoints. The number of days is a power of two, such
+          that the chunks of all datapoints are aligned to the same days.
+        - For incremental backups, skipping the days before the high-water
+          marks of the previous backups.
+    Datapoints with many messages, and datapoints for which the density of
+    messages is unknown, are backed up in daily chunks per datapoint.
+
+    Arguments:
+    ----------
+    datapoint_metadata : list of dict
+        The metadata of the datapoints to backup.
+    start_date : datetime.date
+        The first date to backup.
+    end_date : datetime.date
+        The last date to backup.
+    messages_per_chunk : int
+        The targeted number of messages per grouped chunk.
+    value_statistics : dict or None
+        The output of `fetch_value_statistics`. If None the density of the
+        value messages is unknown.
+    last_timestamps : dict or None
+        Maps the message types "setpoint" and "schedule" to the output of
+        `fetch_last_timestamps`. If None or a message type is missing all
+        actuators are backed up for this type.
+    high_water_marks : dict or None
+        Maps (message_type, datapoint ID) to the timestamp until which the
+        messages have been backed up already, see `high_water_marks`. The
+        day of the high-water mark is backed up again, as it may be
+        incomplete.
+
+    Returns:
+    --------
+    chunks : list of dict
+        With the keys `message_type`, `datapoint_ids` (sorted list of int),
+        `first_date` and `last_date` (both datetime.date, inclusive).
+    """
+    last_timestamps = last_timestamps or {}
+    high_water_marks = high_water_marks or {}
+    chunks = []
+
+    def add_chunk(message_type, datapoint_ids, first_date, last_date):
+        chunks.append(
+            {
+                "message_type": message_type,
+                "datapoint_ids": datapoint_ids,
+                "first_date": first_date,
+                "last_date": last_date,
+            }
+        )
+
+    def add_group_chunk(message_type, chunk_ranges):
+        add_chunk(
+            message_type,
+            list(chunk_ranges),
+            min(r[0] for r in chunk_ranges.values()),
+            max(r[1] for r in chunk_ranges.values()),
+        )
+
+    for message_type in MESSAGE_TYPES:
+        # Maps datapoint ID to (first date, last date, messages per day),
+        # the latter is None if unknown.
+        ranges = {}
+        for datapoint in datapoint_metadata:
+            datapoint_id = datapoint["id"]
+            message_types = MESSAGE_TYPES_BY_DATAPOINT_TYPE.get(
+                datapoint.get("type"), MESSAGE_TYPES
+            )
+            if message_type not in message_types:
+                continue
+
+            first_date, last_date, msgs_per_day = start_date, end_date, None
+            if message_type == "value" and value_statistics is not None:
+                statistics = value_statistics.get(datapoint_id)
+                if statistics is not None:
+                    if statistics["first_timestamp"] is None:
+                        continue
+                    first_date = max(
+                        first_date,
+                        timestamp_to_date(statistics["first_timestamp"]),
+                    )
+                    last_date = min(
+                        last_date,
+                        timestamp_to_date(statistics["last_timestamp"]),
+                    )
+                    # The rate is None if all messages have the same time.
+                    msgs_per_day = statistics["count"]
+                    if statistics["message_rate"] is not None:
+                        msgs_per_day = statistics["message_rate"] * 24
+            elif last_timestamps.get(message_type) is not None:
+                last_timestamp = last_timestamps[message_type].get(
+                    datapoint_id
+                )
+                if last_timestamp is None:
+                    continue
+                last_date = min(last_date, timestamp_to_date(last_timestamp))
+
+            key = (message_type, datapoint_id)
+            if key in high_water_marks:
+                hwm_date = timestamp_to_date(high_water_marks[key])
+                first_date = max(first_date, hwm_date)
+
+            if first_date <= last_date:
+                ranges[datapoint_id] = (first_date, last_date, msgs_per_day)
+
+        # Group the datapoints by the number of days their chunks span.
+        ranges_by_n_days = {}
+        for datapoint_id, (first_date, last_date, msgs_per_day) in sorted(
+            ranges.items()
+        ):
+            if msgs_per_day is None:
+                _date = first_date
+                while _date <= last_date:
+                    add_chunk(message_type, [datapoint_id], _date, _date)
+                    _date += timedelta(days=1)
+                continue
+            n_days = chunk_days(msgs_per_day, messages_per_chunk)
+            ranges_by_n_days.setdefault(n_days, {})[datapoint_id] = (
+                first_date,
+                last_date,
+                msgs_per_day,
+            )
+
+        # Fill the chunks of each window of days with datapoints until the
+        # expected number of messages or datapoints is reached. A chunk
+        # covers only the days within the window that its datapoints have
+        # messages on (and are not backed up already).
+        for n_days, n_days_ranges in sorted(ranges_by_n_days.items()):
+            window_start = start_date
+            while window_start <= end_date:
+                window_end = min(
+                    window_start + timedelta(days=n_days - 1), end_date
+                )
+                chunk_ranges = {}
+                chunk_msgs = 0
+                for datapoint_id, ranges_ in n_days_ranges.items():
+                    first_date, last_date, msgs_per_day = ranges_
+                    overlap_end = min(last_date, window_end)
+                    overlap_start = max(first_date, window_start)
+                    overlap_days = (overlap_end - overlap_start).days + 1
+                    if overlap_days <= 0:
+                        continue
+                    expected_msgs = msgs_per_day * overlap_days
+                    if chunk_ranges and (
+                        chunk_msgs + expected_msgs > messages_per_chunk
+                        or len(chunk_ranges) >= MAX_CHUNK_DATAPOINTS
+                    ):
+                        add_group_chunk(message_type, chunk_ranges)
+                        chunk_ranges = {}
+                        chunk_msgs = 0
+                    chunk_ranges[datapoint_id] = (overlap_start, overlap_end)
+                    chunk_msgs += expected_msgs
+                if chunk_ranges:
+                    add_group_chunk(message_type, chunk_ranges)
+                window_start += timedelta(days=n_days)
+
+    return chunks
+
+
+def is_single_chunk(chunk):
+    """
+    True if the chunk covers one datapoint and one day. These are stored in
+    the original format of the backup files.
+    """
+    return (
+        len(chunk["datapoint_ids"]) == 1
+        and chunk["first_date"] == chunk["last_date"]
+    )
+
+
+def chunk_file_name(chunk):
+    """
+    Compute the file name of a chunk.
+
+    Single chunks are named `dpdata_<dp_id>_<date>_<message_type>`. Chunks
+    covering several datapoints or days are named `dpgroup_<first_date>_
+    <last_date>_<message_type>_<hash of datapoint IDs>` and contain the
+    `datapoint_id` in every message. Both are stored in the folder of
+    the (first) date.
+
+    Arguments:
+    ----------
+    chunk : dict
+        As returned by `plan_chunks`.
+
+    Returns:
+    --------
+    chunk_fn : str
+        The name of the chunk file.
+    """
+    if is_single_chunk(chunk):
+        return "dpdata_{}_{}_{}.json.bz2".format(
+            chunk["datapoint_ids"][0],
+            chunk["first_date"],
+            chunk["message_type"],
+        )
+    datapoint_ids_str = ",".join(str(i) for i in chunk["datapoint_ids"])
+    datapoint_ids_hash = hashlib.sha1(datapoint_ids_str.encode()).hexdigest()
+    return "dpgroup_{}_{}_{}_{}.json.bz2".format(
+        chunk["first_date"],
+        chunk["last_date"],
+        chunk["message_type"],
+        datapoint_ids_hash[:12],
+    )
+
+
+def chunk_url(target_url, chunk):
+    """
+    Compute the URL to fetch the messages of a chunk from.
+
+    Arguments:
+    ----------
+    target_url : str
+        The URL of the API, see args.
+    chunk : dict
+        As returned by `plan_chunks`.
+
+    Returns:
+    --------
+    dp_data_url : str
+        The URL that returns the messages of the chunk.
+    """
+    ts_chunk_start = date_to_timestamp(chunk["first_date"])
+    ts_chunk_end = date_to_timestamp(chunk["last_date"] + timedelta(days=1))
+    if is_single_chunk(chunk):
+        dp_data_url = "{}/datapoint/{}/{}/?".format(
+            target_url, chunk["datapoint_ids"][0], chunk["message_type"]
+        )
+    else:
+        dp_data_url = "{}/datapoint/{}/?datapoint__id__in={}&".format(
+            target_url,
+            chunk["message_type"],
+            ",".join(str(i) for i in chunk["datapoint_ids"]),
+        )
+    dp_data_url += "timestamp__gte={}&timestamp__lt={}".format(
+        ts_chunk_start, ts_chunk_end
+    )
+    return dp_data_url
 
 
-def backup_datapoint_messages(args, auth, datapoint_ids):
+def high_water_marks(manifest_entries):
+    """
+    Compute until which time the messages have been backed up.
+
+    Arguments:
+    ----------
+    manifest_entries : list of dict
+        As returned by `read_manifest`.
+
+    Returns:
+    --------
+    high_water_marks : dict
+        Maps (message_type, datapoint ID) to the largest high-water mark
+        of the chunks containing the datapoint.
+    """
+    high_water_marks = {}
+    for entry in manifest_entries:
+        for datapoint_id in entry["datapoint_ids"]:
+            key = (entry["message_type"], datapoint_id)
+            high_water_marks[key] = max(
+                high_water_marks.get(key, entry["high_water_mark"]),
+                entry["high_water_mark"],
+            )
+    return high_water_marks
+
+
+def backup_datapoint_messages(args, auth, datapoint_metadata):
     """
     Backup the value/setpoint/schedule messages for the requested dates.
 
-    This creates one file (chunk) per datapoint, message_type and date.
+    This creates one file per chunk, see `plan_chunks`, and records it in
+    the manifest. Chunks that have been backed up completely before are
+    skipped, i.e. an interrupted backup can be resumed by starting it
+    again. Note that the chunks depend on the statistics of the messages,
+    i.e. a backup repeated at a later time may fetch some messages again
+    (restoring them twice is harmless).
+
+    In incremental mode only the messages after the high-water marks of
+    previous backups are fetched. Note that messages written later with
+    older timestamps (e.g. by backfilling) are not detected that way.
 
     Arguments:
     ----------
@@ -145,69 +802,100 @@ def backup_datapoint_messages(args, auth, datapoint_ids):
         As defined at the end of the script.
     auth : requests.auth object
         The auth object that is used during the request.
-    datapoint_ids : list
-        A list of datapoint IDs for which the message should be backed up.
+    datapoint_metadata : list of dict
+        The metadata of the datapoints for which the messages should be
+        backed up, as returned by backup_datapoint_metadata.
     """
-    # Create a list all chunks to backup.
     logger.info("Computing data chunks to backup.")
+    manifest_fnp = args.data_directory / MANIFEST_FN
+    manifest_entries = read_manifest(manifest_fnp)
+    manifest = {entry["file"]: entry for entry in manifest_entries}
+    value_statistics = fetch_value_statistics(args=args, auth=auth)
+    last_timestamps = {}
+    if any(dp.get("type") != "sensor" for dp in datapoint_metadata):
+        for message_type in ["setpoint", "schedule"]:
+            last_timestamps[message_type] = fetch_last_timestamps(
+                args=args, auth=auth, message_type=message_type
+            )
+    chunks = plan_chunks(
+        datapoint_metadata=datapoint_metadata,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        messages_per_chunk=args.messages_per_chunk,
+        value_statistics=value_statistics,
+        last_timestamps=last_timestamps,
+        high_water_marks=(
+            high_water_marks(manifest_entries) if args.incremental else None
+        ),
+    )
+
     chunk_vars = []
-    date = args.start_date
     skipped_chunks = 0
-    while date <= args.end_date:
+    for chunk in chunks:
         # Create a folder for each day to keep the mess on HDD a bit sorted.
-        out_directory = args.data_directory / str(date)
-        if not out_directory.is_dir():
-            os.mkdir(out_directory)
-
-        for datapoint_id in sorted(datapoint_ids):
-            for message_type in ["value", "setpoint", "schedule"]:
-
-                # Compute filenames and full filename incl. path.
-                out_fn = "dpdata_{}_{}_{}.json.bz2".format(
-                    datapoint_id, date, message_type
-                )
-                out_fnp = out_directory / out_fn
-
-                # If chunk file exists do not load again.
-                if out_fnp.is_file():
-                    skipped_chunks += 1
-                    continue
+        out_directory = args.data_directory / str(chunk["first_date"])
+        out_directory.mkdir(exist_ok=True)
+
+        out_fn = chunk_file_name(chunk)
+        out_fnp = out_directory / out_fn
+        out_file = "{}/{}".format(chunk["first_date"], out_fn)
+        ts_chunk_end = date_to_timestamp(
+            chunk["last_date"] + timedelta(days=1)
+        )
 
-                chunk_var = {
-                    "date": date,
-                    "datapoint_id": datapoint_id,
-                    "message_type": message_type,
-                    "ts_chunk_start": date_to_timestamp(date),
-                    "ts_chunk_end": date_to_timestamp(date + timedelta(days=1)),
-                    "out_fn": out_fn,
-                    "out_fnp": out_fnp,
-                    "auth": auth,
-                }
-
-                # This URL should request a chunk containing data for one day.
-                # Well at least if the API implements the timestamp filters.
-                dp_data_url = args.target_url
-                dp_data_url += "/datapoint/{datapoint_id}/{message_type}/"
-                dp_data_url += "?timestamp__gte={ts_chunk_start}"
-                dp_data_url += "&timestamp__lt={ts_chunk_end}"
-                dp_data_url = dp_data_url.format(**chunk_var)
-                chunk_var["dp_data_url"] = dp_data_url
-
-                chunk_vars.append(chunk_var)
-        date += timedelta(days=1)
+        # Do not load chunks again that have been written completely,
+        # i.e. not before the end of the chunk. Files missing in the
+        # manifest may be incomplete (e.g. from older versions).
+        entry = manifest.get(out_file)
+        if (
+            entry is not None
+            and entry["high_water_mark"] >= ts_chunk_end
+            and out_fnp.is_file()
+        ):
+            skipped_chunks += 1
+            continue
+
+        chunk_var = {
+            "out_fnp": out_fnp,
+            "dp_data_url": chunk_url(args.target_url, chunk),
+            "manifest_entry": {
+                "file": out_file,
+                "message_type": chunk["message_type"],
+                "datapoint_ids": chunk["datapoint_ids"],
+                "timestamp__gte": date_to_timestamp(chunk["first_date"]),
+                "timestamp__lt": ts_chunk_end,
+            },
+        }
+        chunk_vars.append(chunk_var)
 
     chunks_to_load = len(chunk_vars)
+    n_days = (args.end_date - args.start_date).days + 1
+    logger.info(
+        "Planned %s chunks instead of %s daily chunks per datapoint and "
+        "message type.",
+        *(len(chunks), n_days * len(datapoint_metadata) * len(MESSAGE_TYPES))
+    )
     logger.info(
         "User requested %s chunks. %s chunks exist already. Starting download.",
         *(chunks_to_load + skipped_chunks, skipped_chunks)
     )
-    with Pool(processes=args.worker_process_number) as pool:
-        for _ in tqdm(
+    n_msgs_total = 0
+    with Pool(
+        processes=args.worker_process_number,
+        initializer=init_worker_session,
+        initargs=(auth,),
+    ) as pool, open_manifest(manifest_fnp) as manifest_file:
+        for manifest_entry in tqdm(
             pool.imap_unordered(load_datapoint_message, chunk_vars),
             total=chunks_to_load,
         ):
-            pass
-    logger.info("Finished loading %s chunks.", chunks_to_load)
+            write_manifest_entry(manifest_file, manifest_entry)
+            n_msgs_total += manifest_entry["n_msgs"]
+    logger.info(
+        "Finished loading %s chunks with %s messages.",
+        chunks_to_load,
+        n_msgs_total,
+    )
 
 
 def restore_datapoint_metadata(args, auth):
@@ -328,28 +1016,81 @@ def restore_datapoint_metadata(args, auth):
     return dp_id_mapping
 
 
-def write_datapoint_message(cv):
+def group_messages_by_datapoint_id(msgs, dp_id_mapping):
     """
-    The worker that decompresses the datapoint messages for one
-    day and triggers writing to DB by calling the PUT method.
+    Convert the messages of a chunk covering several datapoints into the
+    format expected by the PUT methods of the `/datapoint/<type>/` endpoints.
+
+    Arguments:
+    ----------
+    msgs : list of dict
+        The messages of the chunk, each with a `datapoint_id` field.
+    dp_id_mapping : dict
+        A dict mapping from the datapoint IDs in the backup files to the
+        IDs of the corresponding datapoints in the DB. Messages of
+        datapoints missing here are dropped.
+
+    Returns:
+    --------
+    data : dict
+        Like {"msgs_by_datapoint_id": {"<dp_id_api>": [<msg>, ...], ...}}
+    """
+    msgs_by_datapoint_id = {}
+    for msg in msgs:
+        dp_id_api = dp_id_mapping.get(msg.pop("datapoint_id"))
+        if dp_id_api is None:
+            continue
+        msgs_by_datapoint_id.setdefault(str(dp_id_api), []).append(msg)
+    return {"msgs_by_datapoint_id": msgs_by_datapoint_id}
+
+
+def read_chunk_file(cv):
+    """
+    The worker that decompresses and parses the datapoint messages of one
+    chunk file.
 
     Arguments:
     ----------
     cv : dict
-        The chunk_var dict containing all relevant information required to load
-        data for one datapoint_id, message_type and date.
+        The chunk_var dict containing all relevant information required to
+        read one chunk. Contains `dp_id_mapping` for chunks covering
+        several datapoints, else `dp_id_api`.
         As defined in restore_datapoint_messages.
+
+    Returns:
+    --------
+    chunk : dict
+        With the keys `file`, `sha256`, `message_type`, `verified` and
+        `msgs_by_datapoint_id`, the latter mapping the datapoint IDs in the
+        DB (as str) to the messages of the chunk.
+        `verified` is False if the checksum of the chunk file doesn't
+        match the manifest, in which case no messages are returned.
     """
+    chunk = {
+        "file": cv["file"],
+        "sha256": cv["sha256"],
+        "message_type": cv["message_type"],
+        "verified": False,
+        "msgs_by_datapoint_id": {},
+    }
     logger.debug("Opening datapoint data file: %s", cv["chunk_fnp"])
-    with bz2.open(cv["chunk_fnp"], "rb") as f:
-        datapoint_data_str = f.read().decode()
-        datapoint_data = json.loads(datapoint_data_str)
+    with open(cv["chunk_fnp"], "rb") as f:
+        chunk_bytes = f.read()
+    if cv["sha256"] is not None:
+        if hashlib.sha256(chunk_bytes).hexdigest() != cv["sha256"]:
+            logger.error(
+                "Checksum of chunk file doesn't match the manifest, "
+                "skipping: %s",
+                cv["chunk_fnp"],
+            )
+            return chunk
+    chunk["verified"] = True
+    datapoint_data = json.loads(bz2.decompress(chunk_bytes).decode())
 
     # Skip empty datapoint_data, this happens if no data has been available
     # for that datapoint and data. But no need to restore nothing, wright?
     if not datapoint_data:
-        # This is similar to the output of response.json() below.
-        {"msgs_created": 0, "msgs_updated": 0}
+        return chunk
 
     # Try to parse data, i.e. bools and floats to allow storing them
     # not as strings. New versions of the database should have generated
@@ -370,26 +1111,159 @@ def write_datapoint_message(cv):
                     # datatypes string, bool and float.
                     value_native = msg["value"]
             msg["value"] = json.dumps(value_native)
-    logger.debug("Pushing datapoint data to: %s", cv["dp_data_url"])
-    response = requests.put(
-        cv["dp_data_url"], auth=cv["auth"], json=datapoint_data
-    )
-    # Verify that the request returned OK.
-    if response.status_code != 200:
-        logger.error(
-            "Request failed (%s): %s", response.status_code, response.json()
+
+    if "dp_id_mapping" in cv:
+        datapoint_data = group_messages_by_datapoint_id(
+            datapoint_data, dp_id_mapping=cv["dp_id_mapping"]
         )
-        raise RuntimeError(
-            "Could not write datapoint data to url: %s" % cv["dp_data_url"]
+        chunk["msgs_by_datapoint_id"] = datapoint_data["msgs_by_datapoint_id"]
+    else:
+        chunk["msgs_by_datapoint_id"] = {str(cv["dp_id_api"]): datapoint_data}
+    return chunk
+
+
+def add_messages_to_batch(batch, msgs_by_datapoint_id, messages_per_request):
+    """
+    Add messages to a batch until it holds `messages_per_request` messages.
+
+    Arguments:
+    ----------
+    batch : dict
+        With the keys `msgs_by_datapoint_id` and `n_msgs`, which are
+        updated in place. See `restore_datapoint_messages`.
+    msgs_by_datapoint_id : dict
+        Mapping the datapoint IDs to the lists of messages to add.
+    messages_per_request : int
+        The maximum number of messages of the batch.
+
+    Returns:
+    --------
+    remaining_msgs_by_datapoint_id : dict
+        The messages that didn't fit into the batch, in the format of
+        `msgs_by_datapoint_id`. Empty if all messages have been added.
+    """
+    remaining_msgs_by_datapoint_id = {}
+    for dp_id, msgs in msgs_by_datapoint_id.items():
+        n_free = messages_per_request - batch["n_msgs"]
+        if n_free > 0 and msgs:
+            batch_msgs = batch["msgs_by_datapoint_id"].setdefault(dp_id, [])
+            batch_msgs.extend(msgs[:n_free])
+            batch["n_msgs"] += len(msgs[:n_free])
+            msgs = msgs[n_free:]
+        if msgs:
+            remaining_msgs_by_datapoint_id[dp_id] = msgs
+    return remaining_msgs_by_datapoint_id
+
+
+# The sessions of the threads writing the restored messages, one per thread
+# as sessions are not thread safe. See `init_thread_session`.
+thread_local = threading.local()
+
+
+def init_thread_session(auth):
+    """
+    Create the session of a thread, used as initializer of the executor.
+
+    Arguments:
+    ----------
+    auth : requests.auth object
+        The auth object that is used during the requests.
+    """
+    thread_local.session = requests.Session()
+    thread_local.session.auth = auth
+
+
+def supports_multi_datapoint_put(args, auth, message_type):
+    """
+    Check if the API accepts messages of several datapoints in one request.
+
+    Arguments:
+    ----------
+    args : argparse.Namespace
+        As defined at the end of the script.
+    auth : requests.auth object
+        The auth object that is used during the request.
+    message_type : str
+        One of `MESSAGE_TYPES`.
+
+    Returns:
+    --------
+    supported : bool
+        True if PUT /datapoint/{message_type}/ is available, which is then
+        used with an empty payload that doesn't write anything.
+    """
+    url = args.target_url + "/datapoint/{}/".format(message_type)
+    response = requests.put(url, auth=auth, json={"msgs_by_datapoint_id": {}})
+    if response.status_code != 200:
+        logger.info(
+            "Request failed (%s), restoring %s messages per datapoint.",
+            response.status_code,
+            message_type,
         )
+        return False
+    return True
+
+
+def put_messages(batch):
+    """
+    The thread that writes the messages of one batch to the API.
+
+    Arguments:
+    ----------
+    batch : dict
+        The batch holding the messages and all relevant information required
+        to write them. As defined in restore_datapoint_messages.
 
-    return response.json()
+    Returns:
+    --------
+    msg_stats : dict
+        The sums of `msgs_created` and `msgs_updated` of the PUT methods.
+    """
+    if batch["multi_datapoint_put"]:
+        url = batch["target_url"] + "/datapoint/{}/"
+        url = url.format(batch["message_type"])
+        payload = {"msgs_by_datapoint_id": batch["msgs_by_datapoint_id"]}
+        payloads = [(url, payload)]
+    else:
+        payloads = []
+        for dp_id_api, msgs in batch["msgs_by_datapoint_id"].items():
+            url = batch["target_url"] + "/datapoint/{}/{}/"
+            url = url.format(dp_id_api, batch["message_type"])
+            payloads.append((url, msgs))
+
+    msg_stats = {"msgs_created": 0, "msgs_updated": 0}
+    for url, payload in payloads:
+        logger.debug("Pushing datapoint data to: %s", url)
+        response = thread_local.session.put(url, json=payload)
+        # Verify that the request returned OK.
+        if response.status_code != 200:
+            logger.error(
+                "Request failed (%s): %s", response.status_code, response.text
+            )
+            raise RuntimeError(
+                "Could not write datapoint data to url: %s" % url
+            )
+        for key in msg_stats:
+            msg_stats[key] += response.json()[key]
+    return msg_stats
 
 
 def restore_datapoint_messages(args, auth, dp_id_mapping):
     """
     Restore the value/setpoint/schedule messages for the requested dates.
 
+    The chunk files are read and parsed by the worker processes, while the
+    main process merges their messages into batches of up to
+    `--messages-per-request` messages, which may cover many datapoints
+    and chunks. At most `--requests-in-flight` batches are written at once,
+    each thread reusing the connection of its session.
+
+    The chunk files are verified against the checksums in the manifest,
+    if listed there. Restored chunks, i.e. all batches holding their
+    messages have been written, are recorded in the restore log and
+    skipped if the restore is repeated for the same target, e.g. after an
+    interruption. Delete the restore log to restore all chunks again.
+
     Arguments:
     ----------
     args : argparse.Namespace
@@ -414,10 +1288,22 @@ def restore_datapoint_messages(args, auth, dp_id_mapping):
             len(dp_id_mapping),
         )
 
+    manifest = {
+        entry["file"]: entry
+        for entry in read_manifest(args.data_directory / MANIFEST_FN)
+    }
+    restore_log_fnp = args.data_directory / RESTORE_LOG_FN
+    restored_chunks = {
+        (entry["file"], entry["sha256"])
+        for entry in read_manifest(restore_log_fnp)
+        if entry["target_url"] == args.target_url
+    }
+
     # Find all chunks relevant for the selected dates and datapoints.
     # Iterate over dates first as this supports the way the data is stored
     # in tables in timescaleDB.
     chunk_vars = []
+    skipped_chunks = 0
     date = args.start_date
     while date <= args.end_date:
         out_directory = args.data_directory / str(date)
@@ -431,35 +1317,183 @@ def restore_datapoint_messages(args, auth, dp_id_mapping):
                 )
                 chunk_fnp = out_directory / chunk_fn
                 if chunk_fnp.is_file():
-                    dp_id_api = dp_id_mapping[dp_id_file]
-                    dp_data_url = args.target_url
-                    dp_data_url += "/datapoint/{}/{}/"
-                    dp_data_url = dp_data_url.format(dp_id_api, message_type)
                     chunk_var = {
                         "chunk_fnp": chunk_fnp,
-                        "dp_data_url": dp_data_url,
-                        "auth": auth,
+                        "message_type": message_type,
+                        "dp_id_api": dp_id_mapping[dp_id_file],
                     }
                     chunk_vars.append(chunk_var)
+
+        # Chunks covering several datapoints and/or days are stored in the
+        # folder of their first day, see `chunk_file_name`.
+        for chunk_fnp in sorted(out_directory.glob("dpgroup_*.json.bz2")):
+            chunk_var = {
+                "chunk_fnp": chunk_fnp,
+                "message_type": chunk_fnp.name.split("_")[3],
+                "dp_id_mapping": dp_id_mapping,
+            }
+            chunk_vars.append(chunk_var)
         date += timedelta(days=1)
 
-    logger.info("Starting to process %s chunks", len(chunk_vars))
-    with Pool(processes=args.worker_process_number) as pool:
-        msgs_created_total = 0
-        msgs_updated_total = 0
-        for msg_stats in tqdm(
-            pool.imap_unordered(write_datapoint_message, chunk_vars),
-            total=len(chunk_vars),
-        ):
+    # Add the information of the manifest and skip restored chunks.
+    chunk_vars_to_restore = []
+    for chunk_var in chunk_vars:
+        chunk_file = "{}/{}".format(
+            chunk_var["chunk_fnp"].parent.name, chunk_var["chunk_fnp"].name
+        )
+        sha256 = manifest.get(chunk_file, {}).get("sha256")
+        if (chunk_file, sha256) in restored_chunks:
+            skipped_chunks += 1
+            continue
+        chunk_var["file"] = chunk_file
+        chunk_var["sha256"] = sha256
+        chunk_vars_to_restore.append(chunk_var)
+    chunk_vars = chunk_vars_to_restore
+
+    logger.info(
+        "Starting to process %s chunks. %s chunks have been restored already.",
+        *(len(chunk_vars), skipped_chunks)
+    )
+    message_types = sorted({cv["message_type"] for cv in chunk_vars})
+    multi_datapoint_put = {
+        message_type: supports_multi_datapoint_put(args, auth, message_type)
+        for message_type in message_types
+    }
+    # The number of messages is known for chunks listed in the manifest,
+    # which allows estimating the remaining time.
+    n_msgs_expected = None
+    if all(cv["file"] in manifest for cv in chunk_vars):
+        n_msgs_expected = sum(
+            manifest[cv["file"]]["n_msgs"] for cv in chunk_vars
+        )
+
+    msgs_created_total = 0
+    msgs_updated_total = 0
+    failed_chunks = 0
+    # The batches that are being filled, by message type.
+    open_batches = {}
+    # The batches being written, by their futures.
+    batches_in_flight = {}
+    # The number of batches holding messages of a chunk that haven't been
+    # written yet, by (file, sha256) of the chunk.
+    pending_batches_by_chunk = {}
+    started = time.monotonic()
+    with ProcessPoolExecutor(
+        max_workers=args.worker_process_number
+    ) as readers, ThreadPoolExecutor(
+        max_workers=args.requests_in_flight,
+        initializer=init_thread_session,
+        initargs=(auth,),
+    ) as writers, open_manifest(
+        restore_log_fnp
+    ) as restore_log_file, tqdm(
+        total=n_msgs_expected, unit="msgs", unit_scale=True
+    ) as progress:
+
+        def log_restored_chunk(chunk_key):
+            write_manifest_entry(
+                restore_log_file,
+                {
+                    "file": chunk_key[0],
+                    "sha256": chunk_key[1],
+                    "target_url": args.target_url,
+                },
+            )
+
+        def finish_batch(future):
+            nonlocal msgs_created_total, msgs_updated_total
+            batch = batches_in_flight.pop(future)
+            # Raises the RuntimeError if the batch could not be written.
+            msg_stats = future.result()
             msgs_created_total += msg_stats["msgs_created"]
             msgs_updated_total += msg_stats["msgs_updated"]
+            progress.update(batch["n_msgs"])
+            for chunk_key in batch["chunks"]:
+                pending_batches_by_chunk[chunk_key] -= 1
+                if pending_batches_by_chunk[chunk_key] == 0:
+                    del pending_batches_by_chunk[chunk_key]
+                    log_restored_chunk(chunk_key)
+
+        def submit_batch(batch):
+            # Wait for free capacity, the reads continue in the meantime.
+            while len(batches_in_flight) >= args.requests_in_flight:
+                done, _ = wait(batches_in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish_batch(future)
+            batches_in_flight[writers.submit(put_messages, batch)] = batch
+
+        # Read a bounded number of chunks ahead, in order of the dates.
+        chunk_vars_iter = iter(chunk_vars)
+        reads_in_flight = deque()
+        for chunk_var in chunk_vars_iter:
+            reads_in_flight.append(readers.submit(read_chunk_file, chunk_var))
+            if len(reads_in_flight) >= 2 * args.worker_process_number:
+                break
+
+        while reads_in_flight:
+            chunk = reads_in_flight.popleft().result()
+            chunk_var = next(chunk_vars_iter, None)
+            if chunk_var is not None:
+                reads_in_flight.append(
+                    readers.submit(read_chunk_file, chunk_var)
+                )
+            if not chunk["verified"]:
+                failed_chunks += 1
+                continue
 
-        logger.info("Finished loading %s chunks.", len(chunk_vars))
-        logger.info(
-            "Created %s and updated %s messages in total.",
-            msgs_created_total,
-            msgs_updated_total,
+            message_type = chunk["message_type"]
+            chunk_key = (chunk["file"], chunk["sha256"])
+            msgs_by_datapoint_id = chunk["msgs_by_datapoint_id"]
+            while msgs_by_datapoint_id:
+                if message_type not in open_batches:
+                    open_batches[message_type] = {
+                        "message_type": message_type,
+                        "target_url": args.target_url,
+                        "multi_datapoint_put": multi_datapoint_put[
+                            message_type
+                        ],
+                        "msgs_by_datapoint_id": {},
+                        "n_msgs": 0,
+                        "chunks": set(),
+                    }
+                batch = open_batches[message_type]
+                if chunk_key not in batch["chunks"]:
+                    batch["chunks"].add(chunk_key)
+                    pending_batches_by_chunk.setdefault(chunk_key, 0)
+                    pending_batches_by_chunk[chunk_key] += 1
+                msgs_by_datapoint_id = add_messages_to_batch(
+                    batch, msgs_by_datapoint_id, args.messages_per_request
+                )
+                if batch["n_msgs"] >= args.messages_per_request:
+                    submit_batch(open_batches.pop(message_type))
+
+            # Chunks without messages are restored right away.
+            if chunk_key not in pending_batches_by_chunk:
+                log_restored_chunk(chunk_key)
+
+        for batch in open_batches.values():
+            submit_batch(batch)
+        while batches_in_flight:
+            done, _ = wait(batches_in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish_batch(future)
+
+    logger.info(
+        "Finished loading %s chunks (%.0f msgs/s).",
+        len(chunk_vars),
+        progress.n / max(time.monotonic() - started, 1e-3),
+    )
+    if failed_chunks:
+        logger.error(
+            "%s chunks have not been restored as their checksum is "
+            "invalid.",
+            failed_chunks,
         )
+    logger.info(
+        "Created %s and updated %s messages in total.",
+        msgs_created_total,
+        msgs_updated_total,
+    )
 
 
 def main(args):
@@ -503,9 +1537,9 @@ def main(args):
         )
 
     if args.backup:
-        datapoint_ids = backup_datapoint_metadata(args=args, auth=auth)
+        datapoint_metadata = backup_datapoint_metadata(args=args, auth=auth)
         backup_datapoint_messages(
-            args=args, auth=auth, datapoint_ids=datapoint_ids
+            args=args, auth=auth, datapoint_metadata=datapoint_metadata
         )
 
 
@@ -606,6 +1640,26 @@ if __name__ == "__main__":
             "messages to actuator datapoints."
         ),
     )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help=(
+            "Backup only the messages newer than those of previous backups "
+            "into the data directory, as recorded in its manifest."
+        ),
+    )
+    parser.add_argument(
+        "-m",
+        "--messages-per-chunk",
+        type=int,
+        default=50000,
+        help=(
+            "The targeted number of messages per backup chunk. Datapoints "
+            "with fewer messages per day are backed up in chunks spanning "
+            "several days and datapoints."
+        ),
+    )
     parser.add_argument(
         "-w",
         "--worker-process-number",
@@ -613,7 +1667,28 @@ if __name__ == "__main__":
         default=4,
         help=(
             "The number of worker processes to use for interacting with API "
-            "service."
+            "service. While restoring, these read the chunk files."
+        ),
+    )
+    parser.add_argument(
+        "-n",
+        "--messages-per-request",
+        type=int,
+        default=10000,
+        help=(
+            "The maximum number of messages written per request while "
+            "restoring. Messages of several chunks and datapoints are merged "
+            "into one request."
+        ),
+    )
+    parser.add_argument(
+        "-q",
+        "--requests-in-flight",
+        type=int,
+        default=8,
+        help=(
+            "The maximum number of requests writing messages at once while "
+            "restoring."
         ),
     )
     args = parser.parse_args()
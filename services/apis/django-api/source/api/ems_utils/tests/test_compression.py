@@ -0,0 +1,78 @@
+import gzip
+
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory
+from django.test import SimpleTestCase
+from django.test import override_settings
+
+from ems_utils.compression import CompressionMiddleware
+from ems_utils.compression import select_encoder
+
+
+class FakeEncoder:
+    def __init__(self, encoding):
+        self.encoding = encoding
+
+
+class TestSelectEncoder(SimpleTestCase):
+    def setUp(self):
+        self.encoders = [FakeEncoder("zstd"), FakeEncoder("gzip")]
+
+    def test_server_preference_used_for_equal_qualities(self):
+        encoder = select_encoder("gzip, deflate, zstd", self.encoders)
+        self.assertEqual(encoder.encoding, "zstd")
+
+    def test_client_qualities_respected(self):
+        encoder = select_encoder("gzip;q=1.0, zstd;q=0.5", self.encoders)
+        self.assertEqual(encoder.encoding, "gzip")
+        self.assertIsNone(select_encoder("zstd;q=0, gzip;q=0", self.encoders))
+        self.assertIsNone(select_encoder("identity", self.encoders))
+        self.assertIsNone(select_encoder("", self.encoders))
+
+
+@override_settings(
+    RESPONSE_COMPRESSION_MIN_SIZE=100, RESPONSE_COMPRESSION_LEVELS={}
+)
+class TestCompressionMiddleware(SimpleTestCase):
+    def setUp(self):
+        self.request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+
+    def process(self, response):
+        middleware = CompressionMiddleware(lambda request: response)
+        return middleware(self.request)
+
+    def test_large_response_compressed(self):
+        content = b'{"value": "21.3", "timestamp": 1640995200000}' * 100
+        response = HttpResponse(content, content_type="application/json")
+        response["ETag"] = '"abc"'
+
+        response = self.process(response)
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["ETag"], 'W/"abc"')
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), content)
+
+    def test_small_and_binary_responses_not_compressed(self):
+        response = self.process(
+            HttpResponse(b"{}", content_type="application/json")
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+        response = self.process(
+            HttpResponse(b"\x00" * 1000, content_type="image/png")
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_streaming_response_compressed_part_by_part(self):
+        parts = [b"value,timestamp\r\n", b"21.3,1640995200000\r\n"]
+        response = StreamingHttpResponse(parts, content_type="text/csv")
+
+        response = self.process(response)
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        compressed_parts = list(response.streaming_content)
+        decompressed = gzip.decompress(b"".join(compressed_parts))
+        self.assertEqual(decompressed, b"".join(parts))
+        self.assertEqual(len(compressed_parts), len(parts) + 1)
@@ -0,0 +1,52 @@
+import numpy as np
+from django.test import TestCase
+
+from ..downsampling import lttb, minmax
+
+
+class TestLttb(TestCase):
+    def setUp(self):
+        self.x = np.arange(1000, dtype=float)
+        self.y = np.sin(self.x / 50)
+
+    def test_number_of_points_correct(self):
+        indices = lttb(self.x, self.y, 100)
+        self.assertEqual(len(indices), 100)
+        self.assertEqual(len(np.unique(indices)), 100)
+
+    def test_first_and_last_point_kept(self):
+        indices = lttb(self.x, self.y, 100)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 999)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_spike_preserved(self):
+        y = np.zeros(1000)
+        y[517] = 100.0
+        indices = lttb(self.x, y, 50)
+        self.assertIn(517, indices)
+
+    def test_short_series_returned_unchanged(self):
+        indices = lttb(self.x[:10], self.y[:10], 100)
+        np.testing.assert_array_equal(indices, np.arange(10))
+
+
+class TestMinmax(TestCase):
+    def setUp(self):
+        self.x = np.arange(1000, dtype=float)
+        self.y = np.sin(self.x / 50)
+
+    def test_number_of_points_bounded(self):
+        indices = minmax(self.x, self.y, 100)
+        self.assertLessEqual(len(indices), 100)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_extremes_preserved(self):
+        y = self.y.copy()
+        y[123] = 10.0
+        y[876] = -10.0
+        indices = minmax(self.x, y, 20)
+        self.assertIn(123, indices)
+        self.assertIn(876, indices)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 999)
@@ -0,0 +1,61 @@
+import io
+import json
+
+import pytest
+
+from ems_utils.message_format.parsers import CBORParser
+from ems_utils.message_format.parsers import MessagePackParser
+from ems_utils.message_format.renderers import CBORRenderer
+from ems_utils.message_format.renderers import MessagePackRenderer
+
+msgpack = pytest.importorskip("msgpack")
+cbor2 = pytest.importorskip("cbor2")
+
+# As the serializers would return it.
+VALUE_MSGS = [
+    {"value": json.dumps(21.5), "timestamp": 1585092224000},
+    {"value": json.dumps("on"), "timestamp": 1585092225000},
+    {"value": json.dumps(None), "timestamp": 1585092226000},
+]
+SETPOINT_MSG = {
+    "setpoint": [
+        {
+            "from_timestamp": None,
+            "to_timestamp": 1585092224000,
+            "preferred_value": json.dumps(21.0),
+            "acceptable_values": None,
+            "min_value": 20.0,
+            "max_value": 22.0,
+        }
+    ],
+    "timestamp": 1585092224000,
+}
+
+
+class TestBinaryFormats:
+    @pytest.mark.parametrize(
+        "renderer, loads",
+        [
+            (MessagePackRenderer(), msgpack.unpackb),
+            (CBORRenderer(), cbor2.loads),
+        ],
+    )
+    def test_values_rendered_natively(self, renderer, loads):
+        data = loads(renderer.render(VALUE_MSGS))
+        assert [msg["value"] for msg in data] == [21.5, "on", None]
+
+        data = loads(renderer.render(SETPOINT_MSG))
+        assert data["setpoint"][0]["preferred_value"] == 21.0
+        assert data["setpoint"][0]["max_value"] == 22.0
+
+    @pytest.mark.parametrize(
+        "renderer, parser",
+        [
+            (MessagePackRenderer(), MessagePackParser()),
+            (CBORRenderer(), CBORParser()),
+        ],
+    )
+    def test_parsed_data_equals_rendered_data(self, renderer, parser):
+        for data in [VALUE_MSGS, SETPOINT_MSG]:
+            stream = io.BytesIO(renderer.render(data))
+            assert parser.parse(stream) == data
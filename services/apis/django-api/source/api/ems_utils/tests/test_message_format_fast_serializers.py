@@ -0,0 +1,200 @@
+"""
+Verify that the fast serialization path of the history endpoints produces
+exactly the same bytes as the default DRF serializers and renderer.
+"""
+from django.db import connection, models
+from django.test import TransactionTestCase
+from rest_framework.renderers import JSONRenderer
+
+from ems_utils.message_format.models import DatapointTemplate
+from ems_utils.message_format.models import DatapointValueTemplate
+from ems_utils.message_format.models import DatapointScheduleTemplate
+from ems_utils.message_format.models import DatapointSetpointTemplate
+from ems_utils.message_format.renderers import FastJSONRenderer
+from ems_utils.message_format.renderers import OrjsonCompatibleList
+from ems_utils.message_format.serializers import DatapointValueSerializer
+from ems_utils.message_format.serializers import DatapointScheduleSerializer
+from ems_utils.message_format.serializers import DatapointSetpointSerializer
+from ems_utils.timestamp import datetime_from_timestamp
+
+
+# Values that are known to be tricky to encode identically.
+TEST_VALUES = [
+    0,
+    -0.0,
+    1,
+    2.2,
+    1e16,
+    1e-7,
+    123456789.123456789,
+    -1.5e-300,
+    True,
+    False,
+    None,
+    "",
+    "not a number",
+    "ümläutß €",
+    "line separator \u2028 paragraph separator \u2029",
+    "control \x00\x01\x1f\x7f chars \n\t\r\b\f",
+    'quotes " and \\ backslashes',
+    "🚀 astral plane",
+    {"nested": [1, 2.5, "json"]},
+    ["a", None, False],
+]
+
+
+class TestFastSerializersEquivalence(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Datapoint model is abstract, hence no table exists. Here we
+        # create a concrete model as child of datapoint and create a table
+        # on the fly for testing.
+        class Datapoint(DatapointTemplate):
+            class Meta:
+                app_label = "test_message_format_fast_serializers"
+
+        class DatapointValue(DatapointValueTemplate):
+            class Meta:
+                app_label = "test_message_format_fast_serializers"
+
+            datapoint = models.ForeignKey(Datapoint, on_delete=models.CASCADE)
+
+        class DatapointSchedule(DatapointScheduleTemplate):
+            class Meta:
+                app_label = "test_message_format_fast_serializers"
+
+            datapoint = models.ForeignKey(Datapoint, on_delete=models.CASCADE)
+
+        class DatapointSetpoint(DatapointSetpointTemplate):
+            class Meta:
+                app_label = "test_message_format_fast_serializers"
+
+            datapoint = models.ForeignKey(Datapoint, on_delete=models.CASCADE)
+
+        cls.Datapoint = Datapoint
+        cls.DatapointValue = DatapointValue
+        cls.DatapointSchedule = DatapointSchedule
+        cls.DatapointSetpoint = DatapointSetpoint
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(cls.Datapoint)
+            schema_editor.create_model(cls.DatapointValue)
+            schema_editor.create_model(cls.DatapointSchedule)
+            schema_editor.create_model(cls.DatapointSetpoint)
+
+        cls.datapoint = cls.Datapoint(type="sensor")
+        cls.datapoint.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        with connection.schema_editor() as schema_editor:
+            schema_editor.delete_model(cls.DatapointSetpoint)
+            schema_editor.delete_model(cls.DatapointSchedule)
+            schema_editor.delete_model(cls.DatapointValue)
+            schema_editor.delete_model(cls.Datapoint)
+
+    def tearDown(self):
+        self.DatapointValue.objects.all().delete()
+        self.DatapointSchedule.objects.all().delete()
+        self.DatapointSetpoint.objects.all().delete()
+
+    def assert_equivalent(self, serializer_class, queryset):
+        """
+        Check that fast and default serialization yield identical data
+        and identical bytes after rendering.
+        """
+        expected_data = serializer_class(queryset, many=True).data
+        expected_json = JSONRenderer().render(expected_data)
+
+        actual_data = serializer_class.to_representation_fast(queryset)
+        actual_json = FastJSONRenderer().render(actual_data)
+
+        self.assertEqual(expected_data, actual_data)
+        self.assertEqual(expected_json, actual_json)
+
+    def test_value_messages_equivalent(self):
+        # DatapointValueTemplate.save can't handle dicts and lists.
+        test_values = [
+            v for v in TEST_VALUES if not isinstance(v, (dict, list))
+        ]
+        timestamps = [
+            1612860152000 + i * 1001 for i in range(len(test_values))
+        ]
+        for value, timestamp in zip(test_values, timestamps):
+            self.DatapointValue.objects.create(
+                datapoint=self.datapoint,
+                value=value,
+                time=datetime_from_timestamp(timestamp),
+            )
+
+        queryset = self.DatapointValue.objects.order_by("time")
+        self.assert_equivalent(DatapointValueSerializer, queryset)
+        actual_data = DatapointValueSerializer.to_representation_fast(queryset)
+        self.assertIsInstance(actual_data, OrjsonCompatibleList)
+
+    def test_empty_queryset_equivalent(self):
+        queryset = self.DatapointValue.objects.all()
+        self.assert_equivalent(DatapointValueSerializer, queryset)
+
+    def test_schedule_messages_equivalent(self):
+        for i, value in enumerate(TEST_VALUES):
+            schedule = [
+                {
+                    "from_timestamp": None,
+                    "to_timestamp": 1612860152000 + i,
+                    "value": value,
+                },
+                {
+                    "from_timestamp": 1612860152000 + i,
+                    "to_timestamp": None,
+                    "value": value,
+                },
+            ]
+            self.DatapointSchedule.objects.create(
+                datapoint=self.datapoint,
+                schedule=schedule,
+                time=datetime_from_timestamp(1612860152000 + i * 1000),
+            )
+
+        queryset = self.DatapointSchedule.objects.order_by("-time")
+        self.assert_equivalent(DatapointScheduleSerializer, queryset)
+
+    def test_setpoint_messages_equivalent(self):
+        for i, value in enumerate(TEST_VALUES):
+            setpoint = [
+                {
+                    "from_timestamp": None,
+                    "to_timestamp": 1612860152000 + i,
+                    "preferred_value": value,
+                    "min_value": 1e-7,
+                    "max_value": 21.3,
+                },
+                {
+                    "from_timestamp": 1612860152000 + i,
+                    "to_timestamp": None,
+                    "preferred_value": value,
+                    "acceptable_values": [value, "€"],
+                },
+            ]
+            self.DatapointSetpoint.objects.create(
+                datapoint=self.datapoint,
+                setpoint=setpoint,
+                time=datetime_from_timestamp(1612860152000 + i * 1000),
+            )
+
+        queryset = self.DatapointSetpoint.objects.order_by("time")
+        self.assert_equivalent(DatapointSetpointSerializer, queryset)
+
+
+class TestFastJSONRenderer(TransactionTestCase):
+    def test_other_data_rendered_by_json_renderer(self):
+        data = {"value": 1.1, "list": [1e16, "\u2028"]}
+        expected_json = JSONRenderer().render(data)
+        actual_json = FastJSONRenderer().render(data)
+        self.assertEqual(expected_json, actual_json)
+
+    def test_indent_respected(self):
+        data = OrjsonCompatibleList([{"value": "1", "timestamp": 1}])
+        media_type = "application/json; indent=4"
+        expected_json = JSONRenderer().render(data, media_type)
+        actual_json = FastJSONRenderer().render(data, media_type)
+        self.assertEqual(expected_json, actual_json)
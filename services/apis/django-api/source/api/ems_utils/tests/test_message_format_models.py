@@ -1,6 +1,7 @@
 import pytz
 import json
 from datetime import datetime
+from unittest.mock import patch
 
 from django.conf import settings
 from django.db import connection, models
@@ -15,6 +16,7 @@ from ems_utils.message_format.models import DatapointSetpointTemplate
 from ems_utils.message_format.models import DatapointLastValueTemplate
 from ems_utils.message_format.models import DatapointLastScheduleTemplate
 from ems_utils.message_format.models import DatapointLastSetpointTemplate
+from ems_utils.message_format.models import bulk_upsert
 
 
 class TestDatapoint(TransactionTestCase):
@@ -583,6 +585,143 @@ class TestDatapointValue(TransactionTestCase):
 
         assert all_actual_values == all_expected_values
 
+    def test_bulk_upsert_groups_messages_by_fields(self):
+        """
+        Fields missing in a message must not be updated, i.e. messages with
+        different fields are written with separate statements. As this
+        works on PostgreSQL only the statements are recorded instead.
+        """
+
+        class RecordingCursor:
+            def __init__(self):
+                self.statements = []
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, sql, arrays):
+                self.statements.append((sql, arrays))
+
+            def fetchall(self):
+                # Report all messages as updated.
+                _, arrays = self.statements[-1]
+                return [(False,)] * len(arrays[0])
+
+        class RecordingConnection:
+            def __init__(self):
+                self.recording_cursor = RecordingCursor()
+
+            def __getattr__(self, name):
+                return getattr(connection, name)
+
+            def cursor(self):
+                return self.recording_cursor
+
+        recording_connection = RecordingConnection()
+        test_msgs = [
+            {
+                "datapoint": self.datapoint,
+                "time": datetime(2021, 1, 1, 12, 0, 0, tzinfo=pytz.utc),
+                "value": "a string",
+            },
+            {
+                "datapoint": self.datapoint,
+                "time": datetime(2021, 1, 1, 13, 0, 0, tzinfo=pytz.utc),
+                "_value_float": 21.0,
+            },
+            {
+                "datapoint": self.datapoint2,
+                "time": datetime(2021, 1, 1, 12, 0, 0, tzinfo=pytz.utc),
+                "value": "another string",
+            },
+        ]
+
+        with patch(
+            "ems_utils.message_format.models.connections",
+            {"default": recording_connection},
+        ):
+            msg_stats = bulk_upsert(
+                model=self.DatapointValue,
+                msgs=test_msgs,
+                unique_fields=["datapoint", "time"],
+            )
+
+        assert msg_stats == (0, 3)
+        statements = recording_connection.recording_cursor.statements
+        assert len(statements) == 2
+        update_clauses = [
+            sql.split("DO UPDATE SET")[1] for sql, _ in statements
+        ]
+        assert '"value" = EXCLUDED."value"' in update_clauses[0]
+        assert "_value_float" not in update_clauses[0]
+        assert len(statements[0][1][0]) == 2
+        assert '"value" = EXCLUDED."value"' not in update_clauses[1]
+        assert "_value_float" in update_clauses[1]
+        assert len(statements[1][1][0]) == 1
+
+    def test_bulk_update_or_create_last_duplicate_wins(self):
+        """
+        Several messages for the same datapoint and time must be counted
+        once, and the last one must be stored. Also check that an update
+        clears the hidden field used by the previous value.
+        """
+        dp_value = self.DatapointValue(
+            datapoint=self.datapoint,
+            time=datetime(2021, 1, 1, 12, 0, 0, tzinfo=pytz.utc),
+            value=True,
+        )
+        dp_value.save()
+
+        test_msgs = [
+            {
+                "datapoint": self.datapoint,
+                "time": datetime(2021, 1, 1, 12, 0, 0, tzinfo=pytz.utc),
+                "value": "first",
+            },
+            {
+                "datapoint": self.datapoint,
+                "time": datetime(2021, 1, 1, 12, 0, 0, tzinfo=pytz.utc),
+                "value": 21.0,
+            },
+            {
+                "datapoint": self.datapoint,
+                "time": datetime(2021, 1, 1, 13, 0, 0, tzinfo=pytz.utc),
+                "value": "first",
+            },
+            {
+                "datapoint": self.datapoint,
+                "time": datetime(2021, 1, 1, 13, 0, 0, tzinfo=pytz.utc),
+                "value": "second",
+            },
+        ]
+
+        msg_stats = self.DatapointValue.bulk_update_or_create(
+            model=self.DatapointValue, msgs=test_msgs
+        )
+
+        assert msg_stats == (1, 1)
+        stored_values = {
+            msg.time.hour: msg.value
+            for msg in self.DatapointValue.objects.filter(
+                datapoint=self.datapoint
+            )
+        }
+        assert stored_values == {12: 21.0, 13: "second"}
+        # Look the row up through the ORM, which handles the timezone for
+        # every DB engine, see test_bulk_update_or_create_stores_in_db.
+        raw_values = (
+            self.DatapointValue.objects.filter(
+                datapoint=self.datapoint,
+                time=datetime(2021, 1, 1, 12, 0, 0, tzinfo=pytz.utc),
+            )
+            .values_list("value", "_value_float", "_value_bool")
+            .get()
+        )
+        assert raw_values == (None, 21.0, None)
+
 
 class TestDatapointLastValue(TransactionTestCase):
     @classmethod
@@ -678,6 +817,65 @@ class TestDatapointLastValue(TransactionTestCase):
 
         self.generic_field_value_test(field_values=field_values)
 
+    def test_bulk_update_or_create_keeps_newer_messages(self):
+        """
+        Verify that bulk_update_or_create stores the newest message per
+        datapoint and doesn't replace stored messages by older ones.
+        """
+        stored_time = datetime(2021, 1, 1, 12, 0, 0, tzinfo=pytz.utc)
+        last_value = self.DatapointLastValue(
+            datapoint=self.datapoint, value=1.0, time=stored_time
+        )
+        last_value.save()
+        last_modified = last_value.last_modified
+
+        test_msgs = [
+            {
+                "datapoint": self.datapoint,
+                "time": datetime(2021, 1, 1, 11, 0, 0, tzinfo=pytz.utc),
+                "value": 0.0,
+            },
+            {
+                "datapoint": self.datapoint2,
+                "time": datetime(2021, 1, 1, 14, 0, 0, tzinfo=pytz.utc),
+                "value": "newest",
+            },
+            {
+                "datapoint": self.datapoint2,
+                "time": datetime(2021, 1, 1, 13, 0, 0, tzinfo=pytz.utc),
+                "value": "older",
+            },
+        ]
+        msg_stats = self.DatapointLastValue.bulk_update_or_create(
+            model=self.DatapointLastValue, msgs=test_msgs
+        )
+        assert msg_stats == (1, 0)
+
+        last_value.refresh_from_db()
+        assert last_value.value == 1.0
+        assert last_value.time == stored_time
+        assert last_value.last_modified == last_modified
+        last_value2 = self.DatapointLastValue.objects.get(
+            datapoint=self.datapoint2
+        )
+        assert last_value2.value == "newest"
+
+        test_msgs = [
+            {
+                "datapoint": self.datapoint,
+                "time": datetime(2021, 1, 1, 15, 0, 0, tzinfo=pytz.utc),
+                "value": 2.0,
+            },
+        ]
+        msg_stats = self.DatapointLastValue.bulk_update_or_create(
+            model=self.DatapointLastValue, msgs=test_msgs
+        )
+        assert msg_stats == (0, 1)
+
+        last_value.refresh_from_db()
+        assert last_value.value == 2.0
+        assert last_value.last_modified > last_modified
+
 
 class TestDatapointSchedule(TransactionTestCase):
     @classmethod
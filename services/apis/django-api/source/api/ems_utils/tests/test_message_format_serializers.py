@@ -441,6 +441,31 @@ class TestDatapointValueSerializer(TransactionTestCase):
             assert caught_execption.status_code == 400
             assert "value" in caught_execption.detail
 
+    def test_many_values_validated_like_single_values(self):
+        """
+        Check that validating many messages at once (which validates the
+        values vectorized) yields the same results as validating the
+        messages one by one.
+        """
+        dp = self.datapoint
+        dp.data_format = "continuous_numeric"
+        dp.min_value = 1.0
+        dp.max_value = 3.0
+        dp.save()
+
+        test_values = ["2", "0", "4", "null", '"text"', "true", "not json"]
+        test_data = [
+            {"value": v, "timestamp": timestamp_utc_now()} for v in test_values
+        ]
+
+        serializer = DatapointValueSerializer(dp, data=test_data, many=True)
+        assert not serializer.is_valid()
+
+        for test_msg, errors in zip(test_data, serializer.errors):
+            single_serializer = DatapointValueSerializer(dp, data=test_msg)
+            single_serializer.is_valid()
+            assert errors == single_serializer.errors
+
     def test_timestamp_validated(self):
         """
         Check that the serialzer doesn't accept unresonable low or high
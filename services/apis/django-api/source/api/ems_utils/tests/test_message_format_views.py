@@ -1,18 +1,25 @@
 import json
+import asyncio
 import logging
+import threading
 from unittest.mock import MagicMock
 from datetime import datetime, timezone
 
 import pytest
 from django.conf import settings
 from django.db import connection, models
+from django.template import engines
+from django.template.response import SimpleTemplateResponse
 from django.test import TransactionTestCase, RequestFactory
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
 
 from ems_utils.message_format.models import DatapointTemplate
 from ems_utils.message_format.models import DatapointValueTemplate
 from ems_utils.message_format.views import DatapointViewSetTemplate
 from ems_utils.message_format.views import ViewSetWithDatapointFK
+from ems_utils.message_format.views import async_view
 from ems_utils.message_format.serializers import DatapointSerializer
 from ems_utils.message_format.serializers import DatapointValueSerializer
 from ems_utils.timestamp import datetime_from_timestamp
@@ -312,6 +319,85 @@ class TestViewSetWithDatapointFK(TransactionTestCase):
         with pytest.raises(ValidationError):
             _ = dpvs.list(request, dp_id=dp_id)
 
+    def test_list_downsamples_to_max_points(self):
+        """
+        Verify that max_points reduces the number of returned messages and
+        keeps the first and the last message as well as spikes.
+        """
+        dp_id = self.datapoint.id
+        msgs = []
+        for i in range(200):
+            msgs.append(
+                {
+                    "datapoint": self.datapoint,
+                    "time": datetime_from_timestamp(1612860152000 + i * 1000),
+                    "value": 100.0 if i == 77 else float(i % 10),
+                }
+            )
+        self.DatapointValue.bulk_update_or_create(
+            model=self.DatapointValue, msgs=msgs
+        )
+
+        factory = RequestFactory()
+        for method in ["lttb", "minmax"]:
+            request = Request(
+                factory.get(
+                    "/datapoint/%s/value/" % dp_id,
+                    {"max_points": 20, "downsampling_method": method},
+                )
+            )
+            dpvs = self.DatapointValueViewSet(request=request)
+            dpvs.allow_downsampling = True
+            response = dpvs.list(request, dp_id=dp_id)
+            actual_data = response.data
+
+            assert response.status_code == 200
+            assert 4 <= len(actual_data) <= 20
+            assert actual_data[0]["timestamp"] == 1612860152000
+            assert actual_data[-1]["timestamp"] == 1612860152000 + 199000
+            assert {
+                "value": json.dumps(100.0),
+                "timestamp": 1612860152000 + 77000,
+            } in actual_data
+
+    def test_list_returns_all_values_below_max_points(self):
+        """
+        Nothing should be removed if there are less values then max_points.
+        """
+        dp_id = self.datapoint.id
+        dpv = self.DatapointValue(
+            datapoint=self.datapoint,
+            time=datetime(2021, 9, 6, 15, 0, 0, tzinfo=timezone.utc),
+            value="a string",
+        )
+        dpv.save()
+
+        factory = RequestFactory()
+        request = Request(
+            factory.get("/datapoint/%s/value/" % dp_id, {"max_points": 10})
+        )
+        dpvs = self.DatapointValueViewSet(request=request)
+        dpvs.allow_downsampling = True
+        response = dpvs.list(request, dp_id=dp_id)
+
+        assert response.data == [
+            {"value": json.dumps("a string"), "timestamp": 1630940400000}
+        ]
+
+    def test_list_rejects_invalid_max_points(self):
+        dp_id = self.datapoint.id
+        factory = RequestFactory()
+        for max_points in ["3", "many"]:
+            request = Request(
+                factory.get(
+                    "/datapoint/%s/value/" % dp_id, {"max_points": max_points}
+                )
+            )
+            dpvs = self.DatapointValueViewSet(request=request)
+            dpvs.allow_downsampling = True
+            with pytest.raises(ValidationError):
+                _ = dpvs.list(request, dp_id=dp_id)
+
     def test_update_many_writes_to_db(self):
         """
         Verify that we can use the update_many method to write several
@@ -394,3 +480,52 @@ class TestViewSetWithDatapointFK(TransactionTestCase):
         assert response.status_code == 200
         assert response.data["msgs_created"] == 0
         assert response.data["msgs_updated"] == 0
+
+
+class TestAsyncView:
+    def test_view_executed_in_other_thread_and_rendered(self):
+        """
+        The wrapped view must not run in the thread of the event loop and
+        the response must be rendered before it is returned.
+        """
+        caller_thread = threading.get_ident()
+        view_threads = []
+
+        @csrf_exempt
+        def view(request):
+            view_threads.append(threading.get_ident())
+            return SimpleTemplateResponse(
+                engines["django"].from_string("rendered")
+            )
+
+        wrapped_view = async_view(view)
+        assert asyncio.iscoroutinefunction(wrapped_view)
+        assert wrapped_view.csrf_exempt
+
+        request = RequestFactory().get("/")
+        response = asyncio.run(wrapped_view(request))
+
+        assert response.is_rendered
+        assert response.content == b"rendered"
+        assert view_threads[0] != caller_thread
+
+    def test_writes_executed_in_shared_thread(self):
+        """
+        Writes must be executed like sync views, i.e. all in the one
+        thread Django uses for sync views, and not in the pool.
+        """
+        view_threads = []
+
+        def view(request):
+            view_threads.append(threading.get_ident())
+            return SimpleTemplateResponse(
+                engines["django"].from_string("rendered")
+            )
+
+        wrapped_view = async_view(view)
+        for _ in range(2):
+            request = RequestFactory().post("/")
+            response = asyncio.run(wrapped_view(request))
+            assert response.content == b"rendered"
+
+        assert view_threads[0] == view_threads[1]
@@ -0,0 +1,51 @@
+import numpy as np
+from django.test import TestCase
+
+from ..resampling import fill_gaps, resample_to_grid
+
+
+class TestResampleToGrid(TestCase):
+    def test_averages_computed_per_bucket(self):
+        times = np.array([0.0, 10.0, 15.0, 35.0, 40.0])
+        values = np.array([1.0, 3.0, 5.0, np.nan, 7.0])
+
+        actual = resample_to_grid(
+            times, values, grid_start=0.0, interval=15.0, n_buckets=4
+        )
+
+        np.testing.assert_array_equal(actual, [2.0, 5.0, 7.0, np.nan])
+
+    def test_values_outside_grid_ignored(self):
+        times = np.array([-1.0, 0.0, 30.0])
+        values = np.array([100.0, 1.0, 100.0])
+
+        actual = resample_to_grid(
+            times, values, grid_start=0.0, interval=15.0, n_buckets=2
+        )
+
+        np.testing.assert_array_equal(actual, [1.0, np.nan])
+
+
+class TestFillGaps(TestCase):
+    def setUp(self):
+        self.values = np.array([np.nan, 1.0, np.nan, np.nan, 4.0, np.nan])
+
+    def test_locf(self):
+        actual = fill_gaps(self.values, "locf")
+        np.testing.assert_array_equal(
+            actual, [np.nan, 1.0, 1.0, 1.0, 4.0, 4.0]
+        )
+
+    def test_interpolate(self):
+        actual = fill_gaps(self.values, "interpolate")
+        np.testing.assert_array_equal(
+            actual, [np.nan, 1.0, 2.0, 3.0, 4.0, np.nan]
+        )
+
+    def test_none(self):
+        actual = fill_gaps(self.values, "none")
+        np.testing.assert_array_equal(actual, self.values)
+
+    def test_all_empty(self):
+        actual = fill_gaps(np.full(3, np.nan), "locf")
+        self.assertTrue(np.isnan(actual).all())
@@ -0,0 +1,356 @@
+import bz2
+import json
+import tempfile
+from datetime import date
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from ..simple_db_backup import add_messages_to_batch
+from ..simple_db_backup import chunk_file_name
+from ..simple_db_backup import chunk_url
+from ..simple_db_backup import date_to_timestamp
+from ..simple_db_backup import group_messages_by_datapoint_id
+from ..simple_db_backup import high_water_marks
+from ..simple_db_backup import iter_response_messages
+from ..simple_db_backup import open_manifest
+from ..simple_db_backup import plan_chunks
+from ..simple_db_backup import read_manifest
+from ..simple_db_backup import write_manifest_entry
+from ..simple_db_backup import write_messages
+
+
+class FakeResponse:
+    """
+    Just the parts of requests.Response used by iter_response_messages.
+    """
+
+    def __init__(self, content_type, content):
+        self.headers = {"Content-Type": content_type}
+        self.content = content
+
+    def iter_lines(self):
+        return iter(self.content.split(b"\n"))
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class TestIterResponseMessages(SimpleTestCase):
+    msgs = [
+        {"value": json.dumps(1.0), "timestamp": 1585092224000},
+        {"value": json.dumps("on"), "timestamp": 1585092225000},
+    ]
+
+    def test_ndjson_parsed_line_by_line(self):
+        content = b"\n".join(json.dumps(m).encode() for m in self.msgs)
+        response = FakeResponse(
+            "application/x-ndjson; charset=utf-8", content + b"\n"
+        )
+        self.assertEqual(list(iter_response_messages(response)), self.msgs)
+
+    def test_json_fallback(self):
+        response = FakeResponse(
+            "application/json", json.dumps(self.msgs).encode()
+        )
+        self.assertEqual(list(iter_response_messages(response)), self.msgs)
+
+
+class TestWriteMessages(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.out_fnp = Path(self.tmp_dir.name) / "chunk.json.bz2"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_file_readable_as_json_list(self):
+        msgs = [{"value": json.dumps(i), "timestamp": i} for i in range(3)]
+        n_msgs = write_messages(iter(msgs), self.out_fnp)
+        self.assertEqual(n_msgs, 3)
+        with bz2.open(self.out_fnp, "rb") as f:
+            self.assertEqual(json.loads(f.read().decode()), msgs)
+
+    def test_empty_chunk(self):
+        n_msgs = write_messages(iter([]), self.out_fnp)
+        self.assertEqual(n_msgs, 0)
+        with bz2.open(self.out_fnp, "rb") as f:
+            self.assertEqual(json.loads(f.read().decode()), [])
+
+    def test_no_file_left_on_error(self):
+        def failing_msgs():
+            yield {"value": json.dumps(1), "timestamp": 1}
+            raise ConnectionError("Connection lost")
+
+        with self.assertRaises(ConnectionError):
+            write_messages(failing_msgs(), self.out_fnp)
+        self.assertEqual(list(Path(self.tmp_dir.name).iterdir()), [])
+
+
+class TestPlanChunks(SimpleTestCase):
+    start_date = date(2021, 1, 1)
+    end_date = date(2021, 1, 31)
+
+    def statistics(self, message_rate, first_date=None, last_date=None):
+        first_date = first_date or self.start_date
+        last_date = last_date or self.end_date
+        return {
+            "count": 100,
+            "first_timestamp": date_to_timestamp(first_date),
+            "last_timestamp": date_to_timestamp(last_date),
+            "message_rate": message_rate,
+        }
+
+    def test_daily_chunks_without_statistics(self):
+        datapoint_metadata = [
+            {"id": 1, "type": "sensor"},
+            {"id": 2, "type": "actuator"},
+        ]
+        chunks = plan_chunks(
+            datapoint_metadata,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            messages_per_chunk=50000,
+        )
+        # Sensors have only value messages.
+        self.assertEqual(len(chunks), 31 * 4)
+        for chunk in chunks:
+            self.assertEqual(chunk["first_date"], chunk["last_date"])
+            self.assertEqual(len(chunk["datapoint_ids"]), 1)
+            if chunk["datapoint_ids"] == [1]:
+                self.assertEqual(chunk["message_type"], "value")
+
+    def test_sparse_datapoints_grouped(self):
+        datapoint_metadata = [{"id": i, "type": "sensor"} for i in range(10)]
+        chunks = plan_chunks(
+            datapoint_metadata,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            messages_per_chunk=50000,
+            value_statistics={i: self.statistics(1) for i in range(10)},
+        )
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0]["datapoint_ids"], list(range(10)))
+        self.assertEqual(chunks[0]["first_date"], self.start_date)
+        self.assertEqual(chunks[0]["last_date"], self.end_date)
+
+    def test_dense_datapoints_daily(self):
+        datapoint_metadata = [{"id": 1, "type": "sensor"}]
+        chunks = plan_chunks(
+            datapoint_metadata,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            messages_per_chunk=50000,
+            value_statistics={1: self.statistics(3600)},
+        )
+        self.assertEqual(len(chunks), 31)
+        self.assertEqual(chunks[0]["first_date"], chunks[0]["last_date"])
+
+    def test_days_without_messages_skipped(self):
+        datapoint_metadata = [
+            {"id": 1, "type": "sensor"},
+            {"id": 2, "type": "sensor"},
+        ]
+        chunks = plan_chunks(
+            datapoint_metadata,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            messages_per_chunk=50000,
+            value_statistics={
+                1: self.statistics(3600, first_date=date(2021, 1, 30)),
+                2: {
+                    "count": 0,
+                    "first_timestamp": None,
+                    "last_timestamp": None,
+                    "message_rate": None,
+                },
+            },
+        )
+        self.assertEqual(
+            [c["first_date"] for c in chunks],
+            [date(2021, 1, 30), date(2021, 1, 31)],
+        )
+
+    def test_setpoints_and_schedules_skipped_without_messages(self):
+        datapoint_metadata = [{"id": 1, "type": "actuator"}]
+        chunks = plan_chunks(
+            datapoint_metadata,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            messages_per_chunk=50000,
+            value_statistics={1: self.statistics(1)},
+            last_timestamps={
+                "setpoint": {},
+                "schedule": {1: date_to_timestamp(date(2021, 1, 2))},
+            },
+        )
+        message_types = [c["message_type"] for c in chunks]
+        self.assertEqual(message_types, ["value", "schedule", "schedule"])
+
+    def test_days_before_high_water_mark_skipped(self):
+        datapoint_metadata = [
+            {"id": 1, "type": "sensor"},
+            {"id": 2, "type": "sensor"},
+        ]
+        chunks = plan_chunks(
+            datapoint_metadata,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            messages_per_chunk=50000,
+            value_statistics={1: self.statistics(1), 2: self.statistics(1)},
+            high_water_marks={
+                ("value", 1): date_to_timestamp(date(2021, 1, 31)),
+                ("value", 2): date_to_timestamp(date(2021, 1, 20)),
+            },
+        )
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0]["datapoint_ids"], [1, 2])
+        self.assertEqual(chunks[0]["first_date"], date(2021, 1, 20))
+        self.assertEqual(chunks[0]["last_date"], self.end_date)
+
+
+class TestChunkFiles(SimpleTestCase):
+    def test_single_chunk(self):
+        chunk = {
+            "message_type": "value",
+            "datapoint_ids": [1],
+            "first_date": date(2021, 1, 1),
+            "last_date": date(2021, 1, 1),
+        }
+        self.assertEqual(
+            chunk_file_name(chunk), "dpdata_1_2021-01-01_value.json.bz2"
+        )
+        self.assertEqual(
+            chunk_url("http://localhost", chunk),
+            "http://localhost/datapoint/1/value/"
+            "?timestamp__gte=1609459200000&timestamp__lt=1609545600000",
+        )
+
+    def test_group_chunk(self):
+        chunk = {
+            "message_type": "setpoint",
+            "datapoint_ids": [1, 2],
+            "first_date": date(2021, 1, 1),
+            "last_date": date(2021, 1, 2),
+        }
+        self.assertTrue(
+            chunk_file_name(chunk).startswith(
+                "dpgroup_2021-01-01_2021-01-02_setpoint_"
+            )
+        )
+        self.assertEqual(
+            chunk_url("http://localhost", chunk),
+            "http://localhost/datapoint/setpoint/?datapoint__id__in=1,2"
+            "&timestamp__gte=1609459200000&timestamp__lt=1609632000000",
+        )
+
+    def test_group_messages_by_datapoint_id(self):
+        msgs = [
+            {"datapoint_id": 1, "value": "1.0", "timestamp": 1},
+            {"datapoint_id": 2, "value": "2.0", "timestamp": 1},
+            {"datapoint_id": 1, "value": "3.0", "timestamp": 2},
+        ]
+        data = group_messages_by_datapoint_id(msgs, dp_id_mapping={1: 11})
+        expected_data = {
+            "msgs_by_datapoint_id": {
+                "11": [
+                    {"value": "1.0", "timestamp": 1},
+                    {"value": "3.0", "timestamp": 2},
+                ]
+            }
+        }
+        self.assertEqual(data, expected_data)
+
+
+class TestManifest(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.manifest_fnp = Path(self.tmp_dir.name) / "backup_manifest.jsonl"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_missing_manifest_is_empty(self):
+        self.assertEqual(read_manifest(self.manifest_fnp), [])
+
+    def test_entries_appended_after_broken_line(self):
+        with open_manifest(self.manifest_fnp) as f:
+            write_manifest_entry(f, {"file": "a"})
+        # Simulates an interrupted write.
+        with open(self.manifest_fnp, "a") as f:
+            f.write('{"file": ')
+        with open_manifest(self.manifest_fnp) as f:
+            write_manifest_entry(f, {"file": "b"})
+
+        entries = read_manifest(self.manifest_fnp)
+        self.assertEqual(entries, [{"file": "a"}, {"file": "b"}])
+
+    def test_high_water_marks(self):
+        entries = [
+            {
+                "message_type": "value",
+                "datapoint_ids": [1, 2],
+                "high_water_mark": 200,
+            },
+            {
+                "message_type": "value",
+                "datapoint_ids": [1],
+                "high_water_mark": 100,
+            },
+            {
+                "message_type": "setpoint",
+                "datapoint_ids": [1],
+                "high_water_mark": 300,
+            },
+        ]
+        expected_high_water_marks = {
+            ("value", 1): 200,
+            ("value", 2): 200,
+            ("setpoint", 1): 300,
+        }
+        self.assertEqual(high_water_marks(entries), expected_high_water_marks)
+
+
+class TestAddMessagesToBatch(SimpleTestCase):
+    def setUp(self):
+        self.batch = {"msgs_by_datapoint_id": {}, "n_msgs": 0}
+
+    def test_messages_of_several_datapoints_merged(self):
+        remaining = add_messages_to_batch(
+            self.batch, {"1": [{"timestamp": 1}]}, messages_per_request=3
+        )
+        self.assertEqual(remaining, {})
+        remaining = add_messages_to_batch(
+            self.batch,
+            {"1": [{"timestamp": 2}], "2": [{"timestamp": 1}]},
+            messages_per_request=3,
+        )
+        self.assertEqual(remaining, {})
+
+        expected_batch = {
+            "msgs_by_datapoint_id": {
+                "1": [{"timestamp": 1}, {"timestamp": 2}],
+                "2": [{"timestamp": 1}],
+            },
+            "n_msgs": 3,
+        }
+        self.assertEqual(self.batch, expected_batch)
+
+    def test_messages_exceeding_batch_remaining(self):
+        msgs_by_datapoint_id = {
+            "1": [{"timestamp": 1}, {"timestamp": 2}],
+            "2": [{"timestamp": 1}],
+        }
+        remaining = add_messages_to_batch(
+            self.batch, msgs_by_datapoint_id, messages_per_request=1
+        )
+
+        self.assertEqual(
+            self.batch["msgs_by_datapoint_id"], {"1": [{"timestamp": 1}]}
+        )
+        self.assertEqual(self.batch["n_msgs"], 1)
+        expected_remaining = {
+            "1": [{"timestamp": 2}],
+            "2": [{"timestamp": 1}],
+        }
+        self.assertEqual(remaining, expected_remaining)
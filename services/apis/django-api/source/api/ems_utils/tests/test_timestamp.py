@@ -3,6 +3,7 @@ from datetime import datetime, timezone
 from django.test import TestCase
 
 from ..timestamp import datetime_from_timestamp, datetime_to_pretty_str
+from ..timestamp import timestamps_ms
 
 
 class TestDatetimeFromTimestamp(TestCase):
@@ -28,3 +29,22 @@ class TestDatetimeToPrettyStr(TestCase):
         expected_str = "2020-01-12 17:56:02"
         actual_str = datetime_to_pretty_str(dt)
         self.assertEqual(expected_str, actual_str)
+
+
+class TestTimestampsMs(TestCase):
+    def test_equal_to_rounded_timestamps(self):
+        datetimes = [
+            datetime(2021, 7, 9, 13, 30, 0, microsecond, tzinfo=timezone.utc)
+            for microsecond in range(0, 1000000, 499)
+        ]
+        expected_timestamps = [
+            round(datetime.timestamp(dt) * 1000) for dt in datetimes
+        ]
+        actual_timestamps = timestamps_ms(datetimes)
+        self.assertEqual(expected_timestamps, actual_timestamps)
+        self.assertIsInstance(actual_timestamps[0], int)
+
+    def test_none_items_kept(self):
+        dt = datetime(2020, 8, 1, tzinfo=timezone.utc)
+        self.assertEqual(timestamps_ms([dt, None]), [1596240000000, None])
+        self.assertEqual(timestamps_ms([]), [])
@@ -3,6 +3,8 @@ Utility functions for timestamps and datetime objects.
 """
 from datetime import datetime, timezone
 
+import numpy as np
+
 
 def datetime_from_timestamp(timestamp, tz_aware=True):
     """
@@ -42,6 +44,35 @@ def timestamp_utc_now():
     return round(datetime.now(tz=timezone.utc).timestamp() * 1000)
 
 
+def timestamps_ms(datetimes):
+    """
+    Convert many datetime objects to timestamps in milliseconds at once.
+
+    This computes exactly the same as `round(dt.timestamp() * 1000)` for
+    each item but is considerably faster for long lists.
+
+    Arguments:
+    ----------
+    datetimes: list of datetime objects
+        The datetimes to convert. Items may be None.
+
+    Returns:
+    --------
+    timestamps: list of int
+        The corresponding timestamps in milliseconds, None for None items.
+    """
+    if None in datetimes:
+        return [
+            round(datetime.timestamp(dt) * 1000) if dt is not None else None
+            for dt in datetimes
+        ]
+    timestamps = np.fromiter(
+        map(datetime.timestamp, datetimes), float, len(datetimes)
+    )
+    # numpy rounds half to even like the builtin `round` does.
+    return np.round(timestamps * 1000).astype(np.int64).tolist()
+
+
 def datetime_to_pretty_str(dt):
     """
     Convert datetime object to string similar to ISO 8601 but more compact.
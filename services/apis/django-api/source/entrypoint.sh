@@ -9,6 +9,20 @@ printf "\n\nCreating and applying migrations."
 python3 /source/api/manage.py makemigrations
 python3 /source/api/manage.py migrate
 
+# Create/Update the continuous aggregates if these should be used.
+if [ "${USE_CONTINUOUS_AGGREGATES:-FALSE}" == "TRUE" ]
+then
+    printf "\n\nCreating continuous aggregates."
+    python3 /source/api/manage.py continuous_aggregates
+fi
+
+# Create/Update the compression and retention policies if requested.
+if [ "${USE_STORAGE_POLICIES:-FALSE}" == "TRUE" ]
+then
+    printf "\n\nSetting storage policies."
+    python3 /source/api/manage.py storage_policies
+fi
+
 # Run prod deploy checks if not in devl.
 if [ "${DJANGO_DEBUG:-False}" != "TRUE" ]
 then